@@ -0,0 +1,70 @@
+"""Compare per-row crud.create_expense with crud.bulk_create_expenses.
+
+Run from the backend directory; use a file or server database so that the
+per-row commits cost what they cost in production:
+
+    python -m benchmarks.bench_bulk_import --rows 5000 --db-url sqlite:////tmp/bench.db
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+import crud
+import models
+import schemas
+from benchmarks.common import make_session_factory
+
+
+def make_rows(count: int, category_ids, tag_ids, seed: int = 7):
+    rng = random.Random(seed)
+    start = date.today() - timedelta(days=3 * 365)
+    return [
+        schemas.ExpenseCreate(
+            amount=round(rng.lognormvariate(3, 1), 2),
+            description=f"Imported {n}",
+            date=start + timedelta(days=rng.randrange(3 * 365)),
+            type="variable",
+            category_id=rng.choice(category_ids),
+            tag_ids=[rng.choice(tag_ids)] if rng.random() < 0.2 else []
+        )
+        for n in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db-url", default="sqlite:////tmp/budgetwise_bench_bulk.db")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument(
+        "--per-row-sample", type=int, default=500,
+        help="rows timed through the per-row path, extrapolated to --rows"
+    )
+    args = parser.parse_args()
+
+    engine, SessionLocal = make_session_factory(args.db_url)
+    db = SessionLocal()
+    user = models.User(name="Bench", email="bench@example.com", password_hash="x")
+    categories = [models.Category(name=f"Category {n}") for n in range(8)]
+    tags = [models.Tag(name=f"tag-{n}") for n in range(20)]
+    db.add_all([user, *categories, *tags])
+    db.commit()
+    rows = make_rows(args.rows, [c.id for c in categories], [t.id for t in tags])
+
+    sample = rows[:args.per_row_sample]
+    start = time.perf_counter()
+    for row in sample:
+        crud.create_expense(db, row, user.id)
+    per_row_rate = len(sample) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    inserted, errors = crud.bulk_create_expenses(db, rows, user.id)
+    bulk_rate = inserted / (time.perf_counter() - start)
+
+    print(f"per-row  {per_row_rate:12.0f} rows/s")
+    print(f"bulk     {bulk_rate:12.0f} rows/s  ({len(errors)} errors)")
+    print(f"speedup  {bulk_rate / per_row_rate:12.1f}x")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
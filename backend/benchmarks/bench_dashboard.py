@@ -0,0 +1,64 @@
+"""Compare queries and latency of the dashboard engine with the per-field path.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_dashboard --days 730 --repeat 50
+"""
+import argparse
+from datetime import datetime, date
+import models
+from services.budget_service import BudgetService
+from services.dashboard_engine import DashboardEngine
+from services import stats_cache
+from benchmarks.common import (
+    DEFAULT_DB_URL, make_session_factory, seed_ledger, QueryCounter, timed
+)
+
+
+def per_field_dashboard(db, user_id):
+    """The query-per-field composition get_dashboard_stats used before the engine"""
+    current_date = datetime.now()
+    budget = db.query(models.Budget).filter(
+        models.Budget.user_id == user_id,
+        models.Budget.month == f"{current_date.year}-{current_date.month:02d}"
+    ).first()
+    monthly_stats = BudgetService.get_monthly_stats(
+        db, user_id, current_date.year, current_date.month
+    )
+    BudgetService.get_category_stats(
+        db, user_id, date(current_date.year, current_date.month, 1), current_date.date()
+    )
+    BudgetService.calculate_current_balance(db, user_id)
+    return budget, monthly_stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db-url", default=DEFAULT_DB_URL)
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--per-day", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    # Measure the queries themselves, not the statistics cache
+    stats_cache.cache = stats_cache.NullCache()
+
+    engine, SessionLocal = make_session_factory(args.db_url)
+    db = SessionLocal()
+    user_id = seed_ledger(db, days=args.days, per_day=args.per_day)[0]
+
+    scenarios = {
+        "per-field": lambda: per_field_dashboard(db, user_id),
+        "engine": lambda: DashboardEngine.get_dashboard_stats(db, user_id),
+    }
+    for name, func in scenarios.items():
+        with QueryCounter(engine) as counter:
+            func()
+        mean = timed(func, args.repeat)
+        print(f"{name:10s} queries/request={counter.count:2d} mean={mean:8.2f} ms")
+
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
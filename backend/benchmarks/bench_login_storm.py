@@ -0,0 +1,108 @@
+"""Dashboard latency during a login storm, bcrypt on the threadpool vs the hasher pool.
+
+Seeds --db-url (dropped and recreated, never point it at real data), then
+starts one uvicorn with PASSWORD_HASH_WORKERS=0 (hashing on the threadpool,
+as the sync handlers did) and one with the dedicated process pool. Each run
+measures the dashboard alone and again under --login-clients concurrent
+logins. Run from the backend directory:
+
+    python -m benchmarks.bench_login_storm --login-clients 64
+"""
+import argparse
+import asyncio
+import httpx
+import crud
+import schemas
+from benchmarks.common import make_session_factory, seed_ledger
+from benchmarks.loadtest import auth_headers, run_scenario, spawn_server
+
+EMAIL = "storm@example.com"
+PASSWORD = "storm-password"
+
+
+async def measure(base_url: str, user_id: int, clients: int, requests: int,
+                  login_clients: int) -> dict:
+    stop = asyncio.Event()
+    logins = 0
+
+    async def login_worker(client):
+        nonlocal logins
+        while not stop.is_set():
+            try:
+                response = await client.post(
+                    "/auth/login", data={"email": EMAIL, "password": PASSWORD}
+                )
+            except httpx.HTTPError:
+                continue
+            if response.status_code == 200:
+                logins += 1
+
+    limits = httpx.Limits(max_connections=login_clients or 1)
+    client = httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120)
+    async with client:
+        storm = [
+            asyncio.create_task(login_worker(client)) for _ in range(login_clients)
+        ]
+        if storm:
+            await asyncio.sleep(1)  # let the storm build up
+        result = await run_scenario(
+            base_url, "/budgets/dashboard", clients, requests, auth_headers(user_id)
+        )
+        stop.set()
+        await asyncio.gather(*storm)
+    result["logins"] = logins
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db-url", default="sqlite:///./login_storm.db")
+    parser.add_argument(
+        "--clients", type=int, default=10, help="concurrent dashboard clients"
+    )
+    parser.add_argument(
+        "--requests", type=int, default=300, help="dashboard requests per measurement"
+    )
+    parser.add_argument("--login-clients", type=int, default=64)
+    parser.add_argument(
+        "--workers", type=int, default=2, help="hasher processes in the pooled run"
+    )
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    engine, SessionLocal = make_session_factory(args.db_url)
+    db = SessionLocal()
+    user_id = seed_ledger(db, days=365)[0]
+    crud.create_user(
+        db, schemas.UserCreate(name="Storm", email=EMAIL, password=PASSWORD)
+    )
+    db.close()
+    engine.dispose()
+
+    env = {"BCRYPT_ROUNDS": str(args.rounds), "STATS_CACHE_BACKEND": "none"}
+    runs = (("threadpool", 0), (f"pool x{args.workers}", args.workers))
+    for label, workers in runs:
+        process = spawn_server(
+            args.db_url, args.port, False,
+            {**env, "PASSWORD_HASH_WORKERS": str(workers)}
+        )
+        try:
+            base_url = f"http://127.0.0.1:{args.port}"
+            for storm in (0, args.login_clients):
+                result = asyncio.run(
+                    measure(base_url, user_id, args.clients, args.requests, storm)
+                )
+                print(
+                    f"{label:12s} logins in flight={storm:3d} "
+                    f"dashboard p50={result['p50_ms']:8.1f} ms "
+                    f"p99={result['p99_ms']:8.1f} ms rps={result['rps']:7.1f} "
+                    f"logins done={result['logins']}"
+                )
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
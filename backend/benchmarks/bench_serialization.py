@@ -0,0 +1,81 @@
+"""Compare listing serialization paths: time and bytes on the wire.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_serialization --rows 1000 10000
+"""
+import argparse
+import gzip
+from typing import List
+from pydantic import TypeAdapter
+import crud
+import models
+import schemas
+from services import fast_json
+from benchmarks.common import DEFAULT_DB_URL, make_session_factory, seed_ledger, timed
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def model_path(db, user_id, limit):
+    """What the default route does: ORM rows, Pydantic validation, JSON"""
+    expenses, _ = crud.get_expenses_page(db, user_id, limit=limit)
+    adapter = TypeAdapter(List[schemas.Expense])
+    return adapter.dump_json(adapter.validate_python(expenses))
+
+
+def fast_path(db, user_id, limit):
+    body, _ = fast_json.expense_page(db, user_id, limit=limit)
+    return body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db-url", default=DEFAULT_DB_URL)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine, SessionLocal = make_session_factory(args.db_url)
+    db = SessionLocal()
+    per_day = 10
+    user_id = seed_ledger(db, days=max(args.rows) // per_day + 1, per_day=per_day)[0]
+
+    # Two tags on every other expense, as a realistic share of tagged rows
+    tags = [models.Tag(name="work"), models.Tag(name="travel")]
+    db.add_all(tags)
+    db.flush()
+    expense_ids = [
+        row.id for row in
+        db.query(models.Expense.id).filter(models.Expense.user_id == user_id)
+    ]
+    db.execute(models.expense_tag_table.insert(), [
+        {"expense_id": expense_id, "tag_id": tag.id}
+        for expense_id in expense_ids[::2] for tag in tags
+    ])
+    db.commit()
+
+    expected = TypeAdapter(List[schemas.Expense])
+    for rows in args.rows:
+        # The route caps a page at 1000 rows; larger payloads call the page
+        # functions directly
+        for name, func in (("pydantic", model_path), ("fast", fast_path)):
+            db.expire_all()
+            body = func(db, user_id, rows)
+            assert len(expected.validate_json(body)) == rows
+            mean = timed(
+                lambda: (db.expire_all(), func(db, user_id, rows)), args.repeat
+            )
+            sizes = f"raw={len(body):9d} B gzip={len(gzip.compress(body, 9)):8d} B"
+            if brotli is not None:
+                sizes += f" brotli={len(brotli.compress(body)):8d} B"
+            print(f"{rows:6d} rows {name:9s} mean={mean:8.2f} ms {sizes}")
+
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
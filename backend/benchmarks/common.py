@@ -0,0 +1,87 @@
+import random
+import time
+from datetime import date, timedelta
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+from database import Base, create_db_engine
+import models
+from services import rollup
+
+DEFAULT_DB_URL = "sqlite://"
+
+
+def make_session_factory(db_url: str = DEFAULT_DB_URL):
+    """Create a fresh schema on db_url and return (engine, sessionmaker)"""
+    engine = create_db_engine(db_url, echo=False)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+class QueryCounter:
+    """Counts the SQL statements sent to an engine while active"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self)
+
+
+def seed_ledger(db, users: int = 1, days: int = 365, per_day: int = 3, seed: int = 42):
+    """Insert users with a daily ledger ending today and return their ids"""
+    rng = random.Random(seed)
+    categories = [
+        models.Category(name=name)
+        for name in ("Food", "Rent", "Transport", "Leisure", "Health")
+    ]
+    db.add_all(categories)
+    db.flush()
+
+    today = date.today()
+    user_ids = []
+    for n in range(users):
+        user = models.User(
+            name=f"Bench {n}", email=f"bench{n}@example.com", password_hash="x"
+        )
+        db.add(user)
+        db.flush()
+        user_ids.append(user.id)
+
+        db.add(models.Budget(
+            user_id=user.id, month=today.strftime("%Y-%m"), amount=2000.0
+        ))
+        for offset in range(days):
+            day = today - timedelta(days=offset)
+            if day.day == 1:
+                db.add(models.Revenue(
+                    user_id=user.id, amount=3000.0, source="Salary", date=day
+                ))
+            for _ in range(per_day):
+                db.add(models.Expense(
+                    user_id=user.id,
+                    amount=round(rng.lognormvariate(3, 1), 2),
+                    description="Bench expense",
+                    category_id=rng.choice(categories).id,
+                    date=day,
+                    type="variable"
+                ))
+    db.commit()
+    rollup.rebuild(db)
+    return user_ids
+
+
+def timed(func, repeat: int):
+    """Run func repeat times and return the mean wall time in milliseconds"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) * 1000 / repeat
@@ -0,0 +1,153 @@
+"""Load test the dashboard and listing endpoints, sync handlers against async.
+
+Against a server that is already running:
+
+    python -m benchmarks.loadtest --base-url http://127.0.0.1:8000 --user-id 1
+
+Or seed a database and start one uvicorn per mode (DB_ASYNC off, then on) and
+compare them; --db-url is dropped and recreated, so never point it at real data:
+
+    python -m benchmarks.loadtest --spawn --db-url sqlite:///./loadtest.db --clients 200
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import httpx
+from benchmarks.common import make_session_factory, seed_ledger
+from services.auth import create_access_token
+
+SCENARIOS = {
+    "dashboard": "/budgets/dashboard",
+    "expenses": "/expenses/?limit=50",
+    "revenues": "/revenues/?limit=50",
+}
+
+
+def auth_headers(user_id: int) -> dict:
+    # Signed with this process's SECRET_KEY, which a server started from the
+    # same .env shares
+    return {"Authorization": f"Bearer {create_access_token(user_id)}"}
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def run_scenario(base_url: str, path: str, clients: int, requests: int,
+                       headers: dict = None) -> dict:
+    """Send requests GETs to path from clients concurrent workers"""
+    latencies = []
+    failures = 0
+    remaining = requests
+
+    async def worker(client):
+        nonlocal remaining, failures
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                response = await client.get(path)
+                if response.status_code != 200:
+                    failures += 1
+            except httpx.HTTPError:
+                failures += 1
+            latencies.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    client = httpx.AsyncClient(
+        base_url=base_url, limits=limits, headers=headers, timeout=60
+    )
+    async with client:
+        await client.get(path)  # warm up
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "rps": len(latencies) / elapsed,
+        "failures": failures,
+    }
+
+
+def report(label: str, base_url: str, user_id: int, clients: int, requests: int):
+    for name, path in SCENARIOS.items():
+        result = asyncio.run(
+            run_scenario(base_url, path, clients, requests, auth_headers(user_id))
+        )
+        print(
+            f"{label:6s} {name:10s} p50={result['p50_ms']:8.1f} ms "
+            f"p99={result['p99_ms']:8.1f} ms "
+            f"rps={result['rps']:8.1f} failures={result['failures']}"
+        )
+
+
+def spawn_server(db_url: str, port: int, use_async: bool,
+                 extra_env: dict = None) -> subprocess.Popen:
+    env = dict(
+        os.environ, DB_URL=db_url, DB_ASYNC="true" if use_async else "false",
+        DB_ECHO="false"
+    )
+    env.update(extra_env or {})
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+         "--log-level", "warning"],
+        env=env
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/openapi.json", timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("uvicorn did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--user-id", type=int, default=1)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument(
+        "--requests", type=int, default=2000, help="requests per scenario"
+    )
+    parser.add_argument(
+        "--spawn", action="store_true",
+        help="seed --db-url and start sync and async servers"
+    )
+    parser.add_argument("--db-url", default="sqlite:///./loadtest.db")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    if not args.spawn:
+        report("server", args.base_url, args.user_id, args.clients, args.requests)
+        return
+
+    engine, SessionLocal = make_session_factory(args.db_url)
+    db = SessionLocal()
+    user_id = seed_ledger(db, days=args.days)[0]
+    db.close()
+    engine.dispose()
+
+    for label, use_async in (("sync", False), ("async", True)):
+        process = spawn_server(args.db_url, args.port, use_async)
+        try:
+            report(
+                label, f"http://127.0.0.1:{args.port}", user_id, args.clients,
+                args.requests
+            )
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""Timed API scenarios over a synthetic ledger, written as JSON.
+
+Seeds a fresh database with benchmarks.synthetic, then drives the real
+routes in-process (dashboard, listings, statistics, export, bulk import)
+and records per scenario the latency percentiles, SQL statements per
+request and response size. The statistics cache is disabled unless
+--cache is given, so the numbers track crud and BudgetService.
+
+Run from the backend directory; --db-url is dropped and recreated:
+
+    python -m benchmarks.suite --users 20 --years 2 --output bench.json
+    python -m benchmarks.suite --output after.json --compare bench.json
+
+With --compare, scenarios whose p50 grew by more than --tolerance against
+the baseline are reported and the exit status is 1.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+import sqlalchemy
+from benchmarks.common import QueryCounter, make_session_factory
+from benchmarks.loadtest import percentile
+from benchmarks.synthetic import generate_ledger
+
+DEFAULT_DB_URL = "sqlite:////tmp/budgetwise_bench_suite.db"
+BULK_ROWS = 1000
+
+
+def scenarios(ledger: dict, bulk_rows: int):
+    """name: (method, path and query, JSON body factory or None)"""
+    end = ledger["end_date"]
+    month_start = end.replace(day=1)
+    year_ago = end - timedelta(days=365)
+    category_id = ledger["category_ids"][-1]
+    last_year = f"start_date={year_ago}&end_date={end}"
+
+    def bulk_body():
+        return [
+            {
+                "amount": 12.5, "description": f"Bench import {n}",
+                "date": (end - timedelta(days=n % 90)).isoformat(),
+                "type": "variable", "category_id": category_id,
+            }
+            for n in range(bulk_rows)
+        ]
+
+    return {
+        "dashboard": ("GET", "/budgets/dashboard", None),
+        "expenses_page": ("GET", "/expenses/?limit=100", None),
+        "expenses_month": (
+            "GET", f"/expenses/?limit=500&start_date={month_start}&end_date={end}", None
+        ),
+        "expenses_category": (
+            "GET", f"/expenses/?limit=100&category_id={category_id}", None
+        ),
+        "revenues_page": ("GET", "/revenues/?limit=100", None),
+        "stats_monthly": (
+            "GET",
+            f"/stats/monthly?start_month={year_ago:%Y-%m}&end_month={end:%Y-%m}", None
+        ),
+        "stats_categories": ("GET", f"/stats/categories?{last_year}", None),
+        "stats_types": ("GET", f"/stats/types?{last_year}", None),
+        "stats_timeseries_weeks": (
+            "GET", f"/stats/timeseries?{last_year}&granularity=week", None
+        ),
+        "export_expenses_csv": ("GET", "/export/expenses?format=csv", None),
+        # Writes last, so they do not change what the reads see
+        "bulk_import": ("POST", "/expenses/bulk", bulk_body),
+    }
+
+
+def run_scenario(client, engine, method: str, path: str, body_factory,
+                 user_headers, repeat: int) -> dict:
+    """Send repeat requests, cycling through the users, and summarize them"""
+    latencies, queries, sizes, failures = [], 0, 0, 0
+    for n in range(repeat):
+        headers = user_headers[n % len(user_headers)]
+        body = body_factory() if body_factory else None
+        with QueryCounter(engine) as counter:
+            start = time.perf_counter()
+            response = client.request(method, path, json=body, headers=headers)
+            latencies.append((time.perf_counter() - start) * 1000)
+        queries += counter.count
+        sizes += len(response.content)
+        if response.status_code != 200:
+            failures += 1
+    return {
+        "requests": repeat,
+        "failures": failures,
+        "mean_ms": round(sum(latencies) / len(latencies), 3),
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "max_ms": round(max(latencies), 3),
+        "queries_per_request": round(queries / repeat, 2),
+        "bytes_per_response": sizes // repeat,
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Scenarios whose p50 is more than tolerance (a ratio) slower than in baseline"""
+    regressions = []
+    for name, current in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before or not before["p50_ms"]:
+            continue
+        ratio = current["p50_ms"] / before["p50_ms"]
+        if ratio > tolerance:
+            regressions.append(
+                f"{name}: p50 {before['p50_ms']:.2f} -> {current['p50_ms']:.2f} ms "
+                f"({ratio:.2f}x)"
+            )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db-url", default=DEFAULT_DB_URL)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--years", type=float, default=2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--bulk-rows", type=int, default=BULK_ROWS)
+    parser.add_argument(
+        "--scenario", action="append", help="run only these scenarios (repeatable)"
+    )
+    parser.add_argument(
+        "--cache", action="store_true", help="keep the statistics cache enabled"
+    )
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument(
+        "--compare", help="baseline JSON file to check the results against"
+    )
+    parser.add_argument("--tolerance", type=float, default=1.25)
+    args = parser.parse_args(argv)
+
+    # Imported here so the application only loads once the arguments are valid
+    from fastapi.testclient import TestClient
+    from database import get_db
+    from main import app
+    from services import stats_cache
+    from services.auth import create_access_token
+
+    if not args.cache:
+        stats_cache.cache = stats_cache.NullCache()
+
+    engine, SessionLocal = make_session_factory(args.db_url)
+    db = SessionLocal()
+    seed_start = time.perf_counter()
+    ledger = generate_ledger(db, users=args.users, years=args.years, seed=args.seed)
+    seed_seconds = time.perf_counter() - seed_start
+    db.close()
+
+    def bench_db():
+        session = SessionLocal()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app.dependency_overrides[get_db] = bench_db
+    user_headers = [
+        {"Authorization": f"Bearer {create_access_token(user_id)}"}
+        for user_id in ledger["user_ids"]
+    ]
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "sqlalchemy": sqlalchemy.__version__,
+            "database": engine.url.get_backend_name(),
+            "users": args.users,
+            "years": args.years,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "stats_cache": args.cache,
+            "rows": ledger["rows"],
+            "seed_seconds": round(seed_seconds, 2),
+        },
+        "scenarios": {},
+    }
+    # Without the lifespan: the schema is already there and background jobs are
+    # not measured
+    client = TestClient(app)
+    try:
+        for name, scenario in scenarios(ledger, args.bulk_rows).items():
+            if args.scenario and name not in args.scenario:
+                continue
+            method, path, body_factory = scenario
+            # One unmeasured request to warm the caches of the database and the
+            # process
+            client.request(
+                method, path, json=body_factory() if body_factory else None,
+                headers=user_headers[0]
+            )
+            summary = run_scenario(
+                client, engine, method, path, body_factory, user_headers, args.repeat
+            )
+            results["scenarios"][name] = summary
+            print(
+                f"{name:24s} p50={summary['p50_ms']:9.2f} ms  "
+                f"p95={summary['p95_ms']:9.2f} ms  "
+                f"queries={summary['queries_per_request']:6.1f}  "
+                f"failures={summary['failures']}"
+            )
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+        engine.dispose()
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2, default=str)
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""Generate a reproducible synthetic ledger for benchmarks.
+
+Every user gets a monthly salary that grows a little each year, occasional
+extra revenues, fixed monthly charges (rent, utilities, subscriptions) and
+variable purchases whose daily count follows a Poisson law, busier on
+weekends for leisure, with log-normal amounts per category. About one
+expense in five carries tags, and every month has a budget close to the
+user's typical spend. The same seed always produces the same ledger,
+relative to its end date.
+
+Rows go through Core executemany and the rollups are rebuilt once at the
+end, so millions of rows load in minutes. Run from the backend directory;
+the database is dropped and recreated:
+
+    python -m benchmarks.synthetic --users 50 --years 3 \
+        --db-url sqlite:////tmp/budgetwise_bench.db
+"""
+import argparse
+import math
+import random
+import time
+from datetime import date, timedelta
+from sqlalchemy import func, insert
+import models
+from services import rollup
+from benchmarks.common import make_session_factory
+
+# name: (type, purchases per week, log-normal mu and sigma of the amount,
+# weekend factor)
+VARIABLE_CATEGORIES = {
+    "Food": ("variable", 4.0, 3.2, 0.6, 1.2),
+    "Transport": ("variable", 3.0, 2.5, 0.7, 0.6),
+    "Leisure": ("variable", 1.5, 3.5, 0.9, 2.5),
+    "Health": ("variable", 0.3, 3.8, 0.8, 0.5),
+    "Shopping": ("variable", 0.8, 3.9, 1.0, 1.8),
+}
+FIXED_CATEGORIES = ("Rent", "Utilities", "Subscriptions")
+TAG_NAMES = (
+    "work", "family", "holiday", "gift", "urgent", "online", "cash", "shared",
+    "refund-pending", "weekend", "car", "kids", "pet", "home", "health-insurance",
+)
+TAGGED_SHARE = 0.2
+INSERT_CHUNK_SIZE = 5000
+
+
+def poisson(rng: random.Random, mean: float) -> int:
+    """Knuth's method, fine for the small daily means used here"""
+    threshold = math.exp(-mean)
+    count, product = 0, rng.random()
+    while product > threshold:
+        count += 1
+        product *= rng.random()
+    return count
+
+
+def month_starts(start: date, end: date):
+    day = date(start.year, start.month, 1)
+    while day <= end:
+        yield day
+        if day.month == 12:
+            day = date(day.year + 1, 1, 1)
+        else:
+            day = date(day.year, day.month + 1, 1)
+
+
+def _user_ledger(rng: random.Random, user_id: int, start: date, end: date,
+                 categories: dict, tag_ids: list, next_expense_id):
+    """Revenue rows, expense rows, (expense_id, tag_id) pairs and budgets of one user"""
+    revenues, expenses, expense_tags, budgets = [], [], [], []
+    salary = rng.lognormvariate(7.9, 0.35)
+    rent = rng.uniform(450, 1400)
+    subscriptions = [round(rng.uniform(5, 20), 2) for _ in range(rng.randint(1, 4))]
+    # Some users spend more often than others
+    activity = rng.uniform(0.6, 1.5)
+
+    def add_expense(amount, description, category, kind, day):
+        expense_id = next_expense_id()
+        expenses.append({
+            "id": expense_id, "user_id": user_id, "amount": round(amount, 2),
+            "description": description, "category_id": categories[category],
+            "date": day, "type": kind,
+        })
+        if tag_ids and rng.random() < TAGGED_SHARE:
+            for tag_id in rng.sample(tag_ids, rng.randint(1, 2)):
+                expense_tags.append({"expense_id": expense_id, "tag_id": tag_id})
+
+    for month in month_starts(start, end):
+        years_in = (month - start).days / 365.0
+        monthly_spend = 0.0
+        for day, description, amount, category in (
+            (rng.randint(1, 5), "Loyer", rent, "Rent"),
+            (10, "Électricité et eau", rng.lognormvariate(4.2, 0.3), "Utilities"),
+            *((15, "Abonnement", amount, "Subscriptions") for amount in subscriptions),
+        ):
+            monthly_spend += amount
+            due = month.replace(day=day)
+            if start <= due <= end:
+                add_expense(amount, description, category, "fixed", due)
+
+        payday = month.replace(day=rng.randint(25, 28))
+        if start <= payday <= end:
+            revenues.append({
+                "user_id": user_id, "amount": round(salary * 1.02 ** int(years_in), 2),
+                "source": "Salaire", "date": payday,
+            })
+        if rng.random() < 0.5:
+            extra_day = month.replace(day=rng.randint(1, 28))
+            if start <= extra_day <= end:
+                revenues.append({
+                    "user_id": user_id,
+                    "amount": round(rng.lognormvariate(5.0, 1.0), 2),
+                    "source": rng.choice(("Remboursement", "Freelance", "Vente")),
+                    "date": extra_day,
+                })
+
+        for _, per_week, mu, sigma, _ in VARIABLE_CATEGORIES.values():
+            # Expected monthly spend of the category: count times the log-normal mean
+            monthly_spend += per_week * activity * 4.3 * math.exp(mu + sigma ** 2 / 2)
+        budgets.append({
+            "user_id": user_id, "month": rollup.month_key(month),
+            "amount": round(monthly_spend * rng.uniform(0.9, 1.2), -1),
+        })
+
+    day = start
+    while day <= end:
+        weekend = day.weekday() >= 5
+        for name, spec in VARIABLE_CATEGORIES.items():
+            kind, per_week, mu, sigma, weekend_factor = spec
+            mean = per_week * activity / 7 * (weekend_factor if weekend else 1.0)
+            for _ in range(poisson(rng, mean)):
+                add_expense(rng.lognormvariate(mu, sigma), name, name, kind, day)
+        day += timedelta(days=1)
+
+    return revenues, expenses, expense_tags, budgets
+
+
+def _insert(db, table, rows):
+    for offset in range(0, len(rows), INSERT_CHUNK_SIZE):
+        db.execute(insert(table), rows[offset:offset + INSERT_CHUNK_SIZE])
+
+
+def generate_ledger(db, users: int = 10, years: float = 2, seed: int = 42,
+                    end: date = None, email_prefix: str = "synthetic") -> dict:
+    """Insert users with years of ledger ending on end (today)
+
+    Returns the ids, date range and row counts of what was created.
+    """
+    rng = random.Random(seed)
+    end = end or date.today()
+    start = end - timedelta(days=int(years * 365))
+
+    categories = {}
+    for name in (*FIXED_CATEGORIES, *VARIABLE_CATEGORIES):
+        category = db.query(models.Category).filter(
+            models.Category.name == name
+        ).first()
+        if category is None:
+            category = models.Category(name=name)
+            db.add(category)
+            db.flush()
+        categories[name] = category.id
+    tags = []
+    for name in TAG_NAMES:
+        tag = db.query(models.Tag).filter(models.Tag.name == name).first()
+        if tag is None:
+            tag = models.Tag(name=name)
+            db.add(tag)
+            db.flush()
+        tags.append(tag.id)
+
+    # Expense ids are assigned here so their tags can be inserted in bulk too
+    last_id = [db.query(func.max(models.Expense.id)).scalar() or 0]
+
+    def next_expense_id():
+        last_id[0] += 1
+        return last_id[0]
+
+    user_ids = []
+    counts = {"revenues": 0, "expenses": 0, "expense_tags": 0, "budgets": 0}
+    for n in range(users):
+        user = models.User(
+            name=f"Synthetic {n}", email=f"{email_prefix}{n}@example.com",
+            password_hash="x"
+        )
+        db.add(user)
+        db.flush()
+        user_ids.append(user.id)
+
+        revenues, expenses, expense_tags, budgets = _user_ledger(
+            rng, user.id, start, end, categories, tags, next_expense_id
+        )
+        _insert(db, models.Revenue, revenues)
+        _insert(db, models.Expense, expenses)
+        _insert(db, models.expense_tag_table, expense_tags)
+        _insert(db, models.Budget, budgets)
+        counts["revenues"] += len(revenues)
+        counts["expenses"] += len(expenses)
+        counts["expense_tags"] += len(expense_tags)
+        counts["budgets"] += len(budgets)
+        db.commit()
+
+    rollup.rebuild(db)
+    return {
+        "user_ids": user_ids,
+        "category_ids": list(categories.values()),
+        "tag_ids": tags,
+        "start_date": start,
+        "end_date": end,
+        "rows": counts,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db-url", default="sqlite:////tmp/budgetwise_bench.db")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--years", type=float, default=2)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    engine, SessionLocal = make_session_factory(args.db_url)
+    db = SessionLocal()
+    started = time.perf_counter()
+    ledger = generate_ledger(db, users=args.users, years=args.years, seed=args.seed)
+    elapsed = time.perf_counter() - started
+    rows = ", ".join(f"{count} {name}" for name, count in ledger["rows"].items())
+    print(f"{len(ledger['user_ids'])} users, {rows} in {elapsed:.1f} s")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,121 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
 
+def env_flag(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
 class Settings:
     DB_URL = os.getenv("DB_URL", "mysql+pymysql://root@localhost:3306/budget_db")
     SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
     ALGORITHM = "HS256"
-    ACCESS_TOKEN_EXPIRE_MINUTES = 30
+    ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+    REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+    # Verified access tokens kept in memory, 0 to verify every request
+    TOKEN_CLAIM_CACHE_SIZE = int(os.getenv("TOKEN_CLAIM_CACHE_SIZE", "10000"))
+    # Shared secret for /internal and /metrics (X-Internal-Token header or
+    # bearer token); left empty, those endpoints answer 403
+    INTERNAL_API_TOKEN = os.getenv("INTERNAL_API_TOKEN", "")
+
+    # Database engine and connection pool
+    DB_ECHO = env_flag("DB_ECHO", False)
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    # Recycle connections before MySQL's wait_timeout drops them server side
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING = env_flag("DB_POOL_PRE_PING", True)
+    # Serve the dashboard and listings from async handlers on DB_ASYNC_URL
+    # (defaults to DB_URL with its async driver, e.g. mysql+aiomysql)
+    DB_ASYNC = env_flag("DB_ASYNC", False)
+    DB_ASYNC_URL = os.getenv("DB_ASYNC_URL")
+    # Per-statement limit in milliseconds, 0 to disable
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+
+    # Request instrumentation: per-route timings on /metrics, statements slower
+    # than SLOW_QUERY_MS logged with their parameters (0 to disable), and a
+    # Server-Timing header for requests sending X-Server-Timing: 1
+    METRICS_ENABLED = env_flag("METRICS_ENABLED", True)
+    SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+    # Log slow queries' parameter values, not just their types (they include
+    # personal data)
+    SLOW_QUERY_LOG_PARAMETERS = env_flag("SLOW_QUERY_LOG_PARAMETERS", False)
+    SERVER_TIMING = env_flag("SERVER_TIMING", False)
+
+    # Statistics cache: "memory" (per process), "redis" (shared) or "none"
+    STATS_CACHE_BACKEND = os.getenv("STATS_CACHE_BACKEND", "memory")
+    STATS_CACHE_TTL = int(os.getenv("STATS_CACHE_TTL", "300"))
+    STATS_CACHE_MAX_ENTRIES = int(os.getenv("STATS_CACHE_MAX_ENTRIES", "10000"))
+    REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    # Ledgers held as NumPy arrays for the analytics endpoints, in rows across
+    # all users
+    ANALYTICS_CACHE_MAX_ROWS = int(os.getenv("ANALYTICS_CACHE_MAX_ROWS", "5000000"))
+    # Without the redis backend, seconds before a ledger is reloaded anyway
+    # (0: every read)
+    ANALYTICS_CACHE_TTL = float(os.getenv("ANALYTICS_CACHE_TTL", "30"))
+    # Spending forecast: smoothing of the daily variable and monthly fixed
+    # spend (higher follows recent changes faster), and fitted models kept
+    FORECAST_ALPHA = float(os.getenv("FORECAST_ALPHA", "0.05"))
+    FORECAST_MONTHLY_ALPHA = float(os.getenv("FORECAST_MONTHLY_ALPHA", "0.5"))
+    FORECAST_CACHE_SIZE = int(os.getenv("FORECAST_CACHE_SIZE", "10000"))
+
+    # Categories and tags snapshots: reload interval in the server (seconds)
+    # and browser max-age on /categories and /tags
+    REFERENCE_CACHE_TTL = float(os.getenv("REFERENCE_CACHE_TTL", "60"))
+    # Minimum seconds between the reloads triggered by ids missing from a snapshot
+    REFERENCE_CACHE_MIN_RELOAD = float(os.getenv("REFERENCE_CACHE_MIN_RELOAD", "1"))
+    REFERENCE_CACHE_MAX_AGE = int(os.getenv("REFERENCE_CACHE_MAX_AGE", "300"))
+
+    # Encode /expenses and /revenues pages straight from row tuples with orjson
+    FAST_JSON_LISTINGS = env_flag("FAST_JSON_LISTINGS", False)
+    # Response compression: "gzip", "brotli" (needs brotli-asgi) or "none"
+    COMPRESSION = os.getenv("COMPRESSION", "gzip")
+    COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+    # Longest NDJSON line accepted by the bulk imports, in bytes
+    BULK_IMPORT_MAX_LINE_BYTES = int(os.getenv("BULK_IMPORT_MAX_LINE_BYTES", "65536"))
+
+    # Password hashing: bcrypt cost (stored hashes are upgraded at login when
+    # it changes), dedicated worker processes (0 runs on the threadpool) and
+    # how many requests may queue for them before getting a 503
+    BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+    PASSWORD_HASH_MAX_WAITING = int(os.getenv("PASSWORD_HASH_MAX_WAITING", "64"))
+
+    # Budget alerts: percentages of the monthly budget that raise an alert
+    ALERT_THRESHOLDS = [
+        int(p) for p in os.getenv("ALERT_THRESHOLDS", "80,100").split(",") if p.strip()
+    ]
+    ALERT_SWEEP_CHUNK_SIZE = int(os.getenv("ALERT_SWEEP_CHUNK_SIZE", "1000"))
+
+    # Users per set-based statement of the batched dashboards
+    # (GET /internal/dashboards, nightly report)
+    DASHBOARD_BATCH_CHUNK_SIZE = int(os.getenv("DASHBOARD_BATCH_CHUNK_SIZE", "500"))
+
+    # Background jobs run in-process by every API worker that has JOBS_ENABLED
+    JOBS_ENABLED = env_flag("JOBS_ENABLED", True)
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+    # Per-type limits, e.g. "statement_import=2,rollup_rebuild=1"; unlisted
+    # types keep their default
+    JOB_CONCURRENCY = {
+        name.strip(): int(limit)
+        for name, _, limit in (
+            item.partition("=") for item in os.getenv("JOB_CONCURRENCY", "").split(",")
+        )
+        if name.strip()
+    }
+    JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+    JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", "5"))
+    JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "60"))
+    JOB_SPOOL_DIR = os.getenv(
+        "JOB_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "budgetwise-jobs")
+    )
+
+    # Recurring transactions: rules written to the ledger per transaction by
+    # the materializer
+    RECURRING_MATERIALIZE_CHUNK_SIZE = int(
+        os.getenv("RECURRING_MATERIALIZE_CHUNK_SIZE", "500")
+    )
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
@@ -1,10 +1,24 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, extract
-from typing import List, Optional
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import and_, insert, select
+from typing import List, Optional, Tuple
 from datetime import date
 import models
 import schemas
 from services.auth import get_password_hash
+from services.rollup import RollupDelta
+from services import alerts, reference_cache, stats_cache
+from pagination import after_cursor, split_page
+
+BULK_CHUNK_SIZE = 1000
+
+def _keyset_page(query, model, limit: int, cursor: Optional[str] = None, skip: int = 0):
+    """Return one page of query, newest first, and the cursor of the following page"""
+    query = query.order_by(model.date.desc(), model.id.desc())
+    if cursor:
+        query = query.filter(after_cursor(model, cursor))
+    elif skip:
+        query = query.offset(skip)
+    return split_page(query.limit(limit + 1).all(), limit)
 
 # --- User ---
 def get_user(db: Session, user_id: int):
@@ -16,8 +30,10 @@ def get_user_by_email(db: Session, email: str):
 def get_users(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.User).offset(skip).limit(limit).all()
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = get_password_hash(user.password)
+def create_user(db: Session, user: schemas.UserCreate,
+                hashed_password: Optional[str] = None):
+    if hashed_password is None:
+        hashed_password = get_password_hash(user.password)
     db_user = models.User(
         email=user.email,
         name=user.name,
@@ -28,6 +44,12 @@ def create_user(db: Session, user: schemas.UserCreate):
     db.refresh(db_user)
     return db_user
 
+def update_password_hash(db: Session, user_id: int, hashed_password: str):
+    db.query(models.User).filter(models.User.id == user_id).update(
+        {models.User.password_hash: hashed_password}, synchronize_session=False
+    )
+    db.commit()
+
 # --- Budget ---
 def get_budget(db: Session, budget_id: int):
     return db.query(models.Budget).filter(models.Budget.id == budget_id).first()
@@ -42,19 +64,20 @@ def get_budget_by_month(db: Session, user_id: int, month: str):
 
 def create_budget(db: Session, budget: schemas.BudgetCreate, user_id: int):
     # Check if budget already exists for this month
-    existing_budget = get_budget_by_month(db, user_id, budget.month)
-    if existing_budget:
-        existing_budget.amount = budget.amount
-        db.commit()
-        db.refresh(existing_budget)
-        return existing_budget
-    
-    db_budget = models.Budget(
-        user_id=user_id,
-        month=budget.month,
-        amount=budget.amount
-    )
-    db.add(db_budget)
+    db_budget = get_budget_by_month(db, user_id, budget.month)
+    stats_cache.mark_dirty(db, user_id)
+    if db_budget:
+        db_budget.amount = budget.amount
+    else:
+        db_budget = models.Budget(
+            user_id=user_id,
+            month=budget.month,
+            amount=budget.amount
+        )
+        db.add(db_budget)
+    # Lowering or setting the budget can put the month's spend past a threshold
+    db.flush()
+    alerts.evaluate(db, [(user_id, budget.month)])
     db.commit()
     db.refresh(db_budget)
     return db_budget
@@ -66,6 +89,8 @@ def get_revenue(db: Session, revenue_id: int):
 def get_revenues_by_user(db: Session, user_id: int, skip: int = 0, limit: int = 100):
     return db.query(models.Revenue).filter(
         models.Revenue.user_id == user_id
+    ).order_by(
+        models.Revenue.date.desc(), models.Revenue.id.desc()
     ).offset(skip).limit(limit).all()
 
 def get_revenues_by_date_range(db: Session, user_id: int, start_date: date, end_date: date):
@@ -75,7 +100,46 @@ def get_revenues_by_date_range(db: Session, user_id: int, start_date: date, end_
             models.Revenue.date >= start_date,
             models.Revenue.date <= end_date
         )
-    ).all()
+    ).order_by(models.Revenue.date.desc(), models.Revenue.id.desc()).all()
+
+def _revenue_filters(user_id: int, start_date: Optional[date] = None,
+                     end_date: Optional[date] = None) -> list:
+    filters = [models.Revenue.user_id == user_id]
+    if start_date:
+        filters.append(models.Revenue.date >= start_date)
+    if end_date:
+        filters.append(models.Revenue.date <= end_date)
+    return filters
+
+def get_revenues_page(
+    db: Session,
+    user_id: int,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+) -> Tuple[List[models.Revenue], Optional[str]]:
+    query = db.query(models.Revenue).filter(
+        *_revenue_filters(user_id, start_date, end_date)
+    )
+    return _keyset_page(query, models.Revenue, limit, cursor, skip)
+
+def get_revenue_rows_page(
+    db: Session,
+    user_id: int,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+):
+    """get_revenues_page as plain column rows"""
+    r = models.Revenue
+    query = db.query(r.amount, r.source, r.date, r.id, r.user_id).filter(
+        *_revenue_filters(user_id, start_date, end_date)
+    )
+    return _keyset_page(query, r, limit, cursor, skip)
 
 def create_revenue(db: Session, revenue: schemas.RevenueCreate, user_id: int):
     db_revenue = models.Revenue(
@@ -85,13 +149,44 @@ def create_revenue(db: Session, revenue: schemas.RevenueCreate, user_id: int):
         date=revenue.date
     )
     db.add(db_revenue)
+
+    delta = RollupDelta()
+    delta.add_revenue(user_id, revenue.date, revenue.amount)
+    delta.apply(db)
+
     db.commit()
     db.refresh(db_revenue)
     return db_revenue
 
+def bulk_create_revenues(db: Session, revenues: List[schemas.RevenueCreate],
+                         user_id: int, commit: bool = True):
+    """Insert revenues with chunked executemany
+
+    Returns (inserted, [(position, error)]).
+    """
+    delta = RollupDelta()
+    for start in range(0, len(revenues), BULK_CHUNK_SIZE):
+        chunk = revenues[start:start + BULK_CHUNK_SIZE]
+        db.execute(insert(models.Revenue), [
+            {"user_id": user_id, "amount": r.amount, "source": r.source, "date": r.date}
+            for r in chunk
+        ])
+        for r in chunk:
+            delta.add_revenue(user_id, r.date, r.amount)
+    delta.apply(db)
+
+    if commit:
+        db.commit()
+    return len(revenues), []
+
 def update_revenue(db: Session, revenue_id: int, revenue: schemas.RevenueCreate):
     db_revenue = get_revenue(db, revenue_id)
     if db_revenue:
+        delta = RollupDelta()
+        delta.remove_revenue(db_revenue.user_id, db_revenue.date, db_revenue.amount)
+        delta.add_revenue(db_revenue.user_id, revenue.date, revenue.amount)
+        delta.apply(db)
+
         db_revenue.amount = revenue.amount
         db_revenue.source = revenue.source
         db_revenue.date = revenue.date
@@ -102,34 +197,109 @@ def update_revenue(db: Session, revenue_id: int, revenue: schemas.RevenueCreate)
 def delete_revenue(db: Session, revenue_id: int):
     db_revenue = get_revenue(db, revenue_id)
     if db_revenue:
+        delta = RollupDelta()
+        delta.remove_revenue(db_revenue.user_id, db_revenue.date, db_revenue.amount)
+        delta.apply(db)
+
         db.delete(db_revenue)
         db.commit()
     return db_revenue
 
 # --- Expense ---
+def _resolve_tags(db: Session, tag_ids) -> List[models.Tag]:
+    # Tags come from the reference cache; merge(load=False) attaches them
+    # without a SELECT
+    tags = reference_cache.tags.resolve(db, tag_ids)
+    return [db.merge(tag, load=False) for tag in tags]
+
+def _expense_query(db: Session):
+    # schemas.Expense serializes category and tags, load them with the rows
+    return db.query(models.Expense).options(
+        joinedload(models.Expense.category),
+        selectinload(models.Expense.tags)
+    )
+
 def get_expense(db: Session, expense_id: int):
-    return db.query(models.Expense).filter(models.Expense.id == expense_id).first()
+    return _expense_query(db).filter(models.Expense.id == expense_id).first()
 
 def get_expenses_by_user(db: Session, user_id: int, skip: int = 0, limit: int = 100):
-    return db.query(models.Expense).filter(
+    return _expense_query(db).filter(
         models.Expense.user_id == user_id
+    ).order_by(
+        models.Expense.date.desc(), models.Expense.id.desc()
     ).offset(skip).limit(limit).all()
 
 def get_expenses_by_date_range(db: Session, user_id: int, start_date: date, end_date: date):
-    return db.query(models.Expense).filter(
+    return _expense_query(db).filter(
         and_(
             models.Expense.user_id == user_id,
             models.Expense.date >= start_date,
             models.Expense.date <= end_date
         )
-    ).all()
+    ).order_by(models.Expense.date.desc(), models.Expense.id.desc()).all()
 
 def get_expenses_by_category(db: Session, user_id: int, category_id: int):
-    return db.query(models.Expense).filter(
+    return _expense_query(db).filter(
         and_(
             models.Expense.user_id == user_id,
             models.Expense.category_id == category_id
         )
+    ).order_by(models.Expense.date.desc(), models.Expense.id.desc()).all()
+
+def _expense_filters(user_id: int, start_date: Optional[date] = None,
+                     end_date: Optional[date] = None,
+                     category_id: Optional[int] = None) -> list:
+    filters = [models.Expense.user_id == user_id]
+    if start_date:
+        filters.append(models.Expense.date >= start_date)
+    if end_date:
+        filters.append(models.Expense.date <= end_date)
+    if category_id:
+        filters.append(models.Expense.category_id == category_id)
+    return filters
+
+def get_expenses_page(
+    db: Session,
+    user_id: int,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    category_id: Optional[int] = None
+) -> Tuple[List[models.Expense], Optional[str]]:
+    query = _expense_query(db).filter(
+        *_expense_filters(user_id, start_date, end_date, category_id)
+    )
+    return _keyset_page(query, models.Expense, limit, cursor, skip)
+
+def get_expense_rows_page(
+    db: Session,
+    user_id: int,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    category_id: Optional[int] = None
+):
+    """get_expenses_page as plain column rows, without category or tags"""
+    e = models.Expense
+    query = db.query(
+        e.amount, e.description, e.date, e.type, e.category_id, e.id, e.user_id
+    ).filter(
+        *_expense_filters(user_id, start_date, end_date, category_id)
+    )
+    return _keyset_page(query, e, limit, cursor, skip)
+
+def get_expense_tag_ids(db: Session, expense_ids: List[int]) -> List[Tuple[int, int]]:
+    """(expense_id, tag_id) pairs for the given expenses, ordered by tag id"""
+    if not expense_ids:
+        return []
+    return db.execute(
+        select(models.expense_tag_table.c.expense_id, models.expense_tag_table.c.tag_id)
+        .where(models.expense_tag_table.c.expense_id.in_(expense_ids))
+        .order_by(models.expense_tag_table.c.tag_id)
     ).all()
 
 def create_expense(db: Session, expense: schemas.ExpenseCreate, user_id: int):
@@ -144,17 +314,84 @@ def create_expense(db: Session, expense: schemas.ExpenseCreate, user_id: int):
     
     # Add tags if provided
     if expense.tag_ids:
-        tags = db.query(models.Tag).filter(models.Tag.id.in_(expense.tag_ids)).all()
-        db_expense.tags = tags
+        db_expense.tags = _resolve_tags(db, expense.tag_ids)
     
     db.add(db_expense)
+
+    delta = RollupDelta()
+    delta.add_expense(user_id, expense.date, expense.category_id, expense.amount)
+    alerts.evaluate(db, delta.apply(db))
+
     db.commit()
     db.refresh(db_expense)
     return db_expense
 
+def bulk_create_expenses(db: Session, expenses: List[schemas.ExpenseCreate],
+                         user_id: int, commit: bool = True):
+    """Insert expenses with chunked executemany
+
+    Returns (inserted, [(position, error)]).
+    """
+    # Resolve categories and tags once for the whole batch
+    category_ids = {e.category_id for e in expenses}
+    known_categories = {
+        category.id
+        for category in reference_cache.categories.resolve(db, category_ids)
+    }
+    tag_ids = {tag_id for e in expenses for tag_id in (e.tag_ids or [])}
+    tags = {tag.id: tag for tag in _resolve_tags(db, tag_ids)} if tag_ids else {}
+
+    errors = []
+    plain, tagged = [], []
+    delta = RollupDelta()
+    for position, e in enumerate(expenses):
+        if e.category_id not in known_categories:
+            errors.append((position, f"Unknown category {e.category_id}"))
+            continue
+        row = {
+            "user_id": user_id,
+            "amount": e.amount,
+            "description": e.description,
+            "category_id": e.category_id,
+            "date": e.date,
+            "type": e.type
+        }
+        row_tags = [tags[tag_id] for tag_id in (e.tag_ids or []) if tag_id in tags]
+        if row_tags:
+            tagged.append((row, row_tags))
+        else:
+            plain.append(row)
+        delta.add_expense(user_id, e.date, e.category_id, e.amount)
+
+    # Untagged rows need no generated ids, so they go through Core executemany;
+    # tagged rows are flushed by the ORM, which also batches the association rows
+    for start in range(0, len(plain), BULK_CHUNK_SIZE):
+        db.execute(insert(models.Expense), plain[start:start + BULK_CHUNK_SIZE])
+    for start in range(0, len(tagged), BULK_CHUNK_SIZE):
+        db.add_all(
+            models.Expense(**row, tags=row_tags)
+            for row, row_tags in tagged[start:start + BULK_CHUNK_SIZE]
+        )
+        db.flush()
+    alerts.evaluate(db, delta.apply(db))
+
+    if commit:
+        db.commit()
+    return len(plain) + len(tagged), errors
+
 def update_expense(db: Session, expense_id: int, expense: schemas.ExpenseCreate):
     db_expense = get_expense(db, expense_id)
     if db_expense:
+        delta = RollupDelta()
+        delta.remove_expense(
+            db_expense.user_id, db_expense.date, db_expense.category_id,
+            db_expense.amount
+        )
+        delta.add_expense(
+            db_expense.user_id, expense.date, expense.category_id, expense.amount
+        )
+        alerts.evaluate(db, delta.apply(db))
+
         db_expense.amount = expense.amount
         db_expense.description = expense.description
         db_expense.category_id = expense.category_id
@@ -163,8 +400,7 @@ def update_expense(db: Session, expense_id: int, expense: schemas.ExpenseCreate)
         
         # Update tags
         if expense.tag_ids:
-            tags = db.query(models.Tag).filter(models.Tag.id.in_(expense.tag_ids)).all()
-            db_expense.tags = tags
+            db_expense.tags = _resolve_tags(db, expense.tag_ids)
         else:
             db_expense.tags = []
             
@@ -175,10 +411,49 @@ def update_expense(db: Session, expense_id: int, expense: schemas.ExpenseCreate)
 def delete_expense(db: Session, expense_id: int):
     db_expense = get_expense(db, expense_id)
     if db_expense:
+        delta = RollupDelta()
+        delta.remove_expense(
+            db_expense.user_id, db_expense.date, db_expense.category_id,
+            db_expense.amount
+        )
+        delta.apply(db)
+
         db.delete(db_expense)
         db.commit()
     return db_expense
 
+# --- Recurring ---
+def get_recurring(db: Session, recurring_id: int):
+    return db.query(models.RecurringTransaction).filter(
+        models.RecurringTransaction.id == recurring_id
+    ).first()
+
+def get_recurring_by_user(db: Session, user_id: int):
+    return db.query(models.RecurringTransaction).filter(
+        models.RecurringTransaction.user_id == user_id
+    ).order_by(models.RecurringTransaction.id).all()
+
+def create_recurring(db: Session, rule: schemas.RecurringTransactionCreate,
+                     user_id: int):
+    # Nothing is written to the ledger here, services.recurring.materialize
+    # does it
+    db_rule = models.RecurringTransaction(**rule.model_dump(), user_id=user_id)
+    db.add(db_rule)
+    # Its upcoming occurrences count in the statistics straight away
+    stats_cache.mark_dirty(db, user_id)
+    db.commit()
+    db.refresh(db_rule)
+    return db_rule
+
+def delete_recurring(db: Session, recurring_id: int):
+    # Occurrences already materialized stay in the ledger
+    db_rule = get_recurring(db, recurring_id)
+    if db_rule:
+        stats_cache.mark_dirty(db, db_rule.user_id)
+        db.delete(db_rule)
+        db.commit()
+    return db_rule
+
 # --- Category ---
 def get_category(db: Session, category_id: int):
     return db.query(models.Category).filter(models.Category.id == category_id).first()
@@ -190,6 +465,7 @@ def create_category(db: Session, category: schemas.CategoryCreate):
     db_category = models.Category(name=category.name)
     db.add(db_category)
     db.commit()
+    reference_cache.categories.invalidate()
     db.refresh(db_category)
     return db_category
 
@@ -204,6 +480,7 @@ def create_tag(db: Session, tag: schemas.TagCreate):
     db_tag = models.Tag(name=tag.name)
     db.add(db_tag)
     db.commit()
+    reference_cache.tags.invalidate()
     db.refresh(db_tag)
     return db_tag
 
@@ -212,7 +489,9 @@ def get_alert(db: Session, alert_id: int):
     return db.query(models.Alert).filter(models.Alert.id == alert_id).first()
 
 def get_alerts_by_user(db: Session, user_id: int):
-    return db.query(models.Alert).filter(models.Alert.user_id == user_id).all()
+    return db.query(models.Alert).filter(models.Alert.user_id == user_id).order_by(
+        models.Alert.trigger_date.desc(), models.Alert.id.desc()
+    ).all()
 
 def create_alert(db: Session, alert: schemas.AlertCreate, user_id: int):
     db_alert = models.Alert(
@@ -221,6 +500,7 @@ def create_alert(db: Session, alert: schemas.AlertCreate, user_id: int):
         trigger_date=alert.trigger_date
     )
     db.add(db_alert)
+    stats_cache.mark_dirty(db, user_id)
     db.commit()
     db.refresh(db_alert)
     return db_alert
\ No newline at end of file
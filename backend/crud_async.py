@@ -0,0 +1,72 @@
+"""AsyncSession counterparts of the crud reads used by routes/async_api.py.
+
+Written against select() and awaited directly. The async routes only read;
+writes go through the sync routes and crud, where the rollup bookkeeping is.
+"""
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+from typing import List, Optional, Tuple
+from datetime import date
+import models
+from pagination import after_cursor, split_page
+
+
+async def _keyset_page(db: AsyncSession, stmt, model, limit: int,
+                       cursor: Optional[str] = None, skip: int = 0):
+    """Async version of crud._keyset_page for a select() statement"""
+    stmt = stmt.order_by(model.date.desc(), model.id.desc())
+    if cursor:
+        stmt = stmt.where(after_cursor(model, cursor))
+    elif skip:
+        stmt = stmt.offset(skip)
+    rows = (await db.scalars(stmt.limit(limit + 1))).unique().all()
+    return split_page(list(rows), limit)
+
+
+# --- Revenue ---
+async def get_revenues_page(
+    db: AsyncSession,
+    user_id: int,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+) -> Tuple[List[models.Revenue], Optional[str]]:
+    stmt = select(models.Revenue).where(models.Revenue.user_id == user_id)
+    if start_date:
+        stmt = stmt.where(models.Revenue.date >= start_date)
+    if end_date:
+        stmt = stmt.where(models.Revenue.date <= end_date)
+    return await _keyset_page(db, stmt, models.Revenue, limit, cursor, skip)
+
+
+# --- Expense ---
+def _expense_select():
+    # Same eager loading as crud._expense_query; lazy loads are not allowed on
+    # AsyncSession
+    return select(models.Expense).options(
+        joinedload(models.Expense.category),
+        selectinload(models.Expense.tags)
+    )
+
+
+async def get_expenses_page(
+    db: AsyncSession,
+    user_id: int,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    category_id: Optional[int] = None
+) -> Tuple[List[models.Expense], Optional[str]]:
+    stmt = _expense_select().where(models.Expense.user_id == user_id)
+    if start_date:
+        stmt = stmt.where(models.Expense.date >= start_date)
+    if end_date:
+        stmt = stmt.where(models.Expense.date <= end_date)
+    if category_id:
+        stmt = stmt.where(models.Expense.category_id == category_id)
+    return await _keyset_page(db, stmt, models.Expense, limit, cursor, skip)
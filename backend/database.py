@@ -1,9 +1,226 @@
-from sqlalchemy import create_engine
+import threading
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 from config import settings
 
-engine = create_engine(settings.DB_URL, echo=True)
+
+class PoolMetrics:
+    """Checkout wait statistics collected by MeteredQueuePool"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float, timed_out: bool = False):
+        with self.lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": round(self.total_wait, 6),
+                "wait_seconds_avg": (
+                    round(self.total_wait / attempts, 6) if attempts else 0.0
+                ),
+                "wait_seconds_max": round(self.max_wait, 6),
+            }
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool that times how long each checkout waits for a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.metrics.record(time.perf_counter() - start)
+        return connection
+
+
+class MeteredAsyncQueuePool(MeteredQueuePool, AsyncAdaptedQueuePool):
+    """MeteredQueuePool for asyncio engines"""
+
+
+# Async driver used for each backend when DB_ASYNC_URL is not set
+ASYNC_DRIVERS = {"mysql": "aiomysql", "sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+
+def async_url(url: str):
+    """Swap the driver of a sync database URL for its asyncio counterpart"""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver known for {backend}")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+
+
+def _set_statement_timeout(engine, timeout_ms: int):
+    backend = engine.url.get_backend_name()
+    if backend == "mysql":
+        # Only applies to read-only SELECTs, which is where runaway queries come from
+        statement = f"SET SESSION MAX_EXECUTION_TIME = {int(timeout_ms)}"
+    elif backend == "postgresql":
+        statement = f"SET statement_timeout = {int(timeout_ms)}"
+    else:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_timeout(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(statement)
+        finally:
+            cursor.close()
+
+
+def _engine_options(url, poolclass, overrides: dict) -> dict:
+    options = {"echo": settings.DB_ECHO}
+
+    # In-memory SQLite lives in a single connection, so it keeps its own pool
+    in_memory = (
+        url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+    )
+    if not in_memory and "poolclass" not in overrides:
+        options.update(
+            poolclass=poolclass,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+        )
+    options.update(overrides)
+    return options
+
+
+def create_db_engine(url: str = None, **overrides):
+    """Create an engine configured from settings, with keyword overrides"""
+    url = make_url(url or settings.DB_URL)
+    statement_timeout_ms = overrides.pop(
+        "statement_timeout_ms", settings.DB_STATEMENT_TIMEOUT_MS
+    )
+
+    new_engine = create_engine(url, **_engine_options(url, MeteredQueuePool, overrides))
+    if statement_timeout_ms:
+        _set_statement_timeout(new_engine, statement_timeout_ms)
+    return new_engine
+
+
+def create_async_db_engine(url: str = None, **overrides):
+    """Create an asyncio engine configured from settings, with keyword overrides"""
+    url = make_url(url or settings.DB_ASYNC_URL or async_url(settings.DB_URL))
+    statement_timeout_ms = overrides.pop(
+        "statement_timeout_ms", settings.DB_STATEMENT_TIMEOUT_MS
+    )
+
+    options = _engine_options(url, MeteredAsyncQueuePool, overrides)
+    new_engine = create_async_engine(url, **options)
+    if statement_timeout_ms:
+        _set_statement_timeout(new_engine.sync_engine, statement_timeout_ms)
+    return new_engine
+
+
+def pool_status(db_engine=None) -> dict:
+    """Current pool occupancy and checkout wait statistics"""
+    pool = (db_engine or engine).pool
+    status = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0),
+        })
+    if isinstance(pool, MeteredQueuePool):
+        status.update(pool.metrics.snapshot())
+    return status
+
+
+# INSERT constructs with the dialect's own conflict clauses
+DIALECT_INSERTS = {
+    "mysql": mysql.insert, "postgresql": postgresql.insert, "sqlite": sqlite.insert
+}
+
+
+def _dialect_insert(db, table):
+    backend = db.get_bind().dialect.name
+    if backend not in DIALECT_INSERTS:
+        raise NotImplementedError(f"No conflict-aware INSERT for {backend}")
+    return backend, DIALECT_INSERTS[backend](table)
+
+
+def insert_ignoring_duplicates(db, table, row: dict, key_columns) -> bool:
+    """Insert row unless a row with the same unique key_columns exists
+
+    Returns True if it was inserted. Atomic in the database, so concurrent
+    writers cannot both insert. Other errors (NOT NULL, foreign keys,
+    truncation) still raise: MySQL gets ON DUPLICATE KEY UPDATE id = id rather
+    than INSERT IGNORE, which turns them into warnings.
+
+    On MySQL the table needs an auto-increment id. The drivers connect with
+    CLIENT_FOUND_ROWS, so the no-op update also reports one row; only an
+    inserted row reports a new id.
+    """
+    backend, statement = _dialect_insert(db, table)
+    statement = statement.values(**row)
+    if backend == "mysql":
+        statement = statement.on_duplicate_key_update(id=table.c.id)
+        return bool(db.execute(statement).lastrowid)
+    statement = statement.on_conflict_do_nothing(index_elements=list(key_columns))
+    return db.execute(statement).rowcount == 1
+
+
+def upsert_adding(db, table, rows, key_columns, added_columns):
+    """Insert rows, adding added_columns onto any row stored under key_columns
+
+    A single INSERT ... ON CONFLICT / ON DUPLICATE KEY statement, so concurrent
+    writers to a new key both land instead of one failing on the primary key.
+    """
+    if not rows:
+        return
+    backend, statement = _dialect_insert(db, table)
+    if backend == "mysql":
+        statement = statement.on_duplicate_key_update({
+            column: table.c[column] + statement.inserted[column]
+            for column in added_columns
+        })
+    else:
+        statement = statement.on_conflict_do_update(
+            index_elements=list(key_columns),
+            set_={
+                column: table.c[column] + statement.excluded[column]
+                for column in added_columns
+            }
+        )
+    db.execute(statement, rows)
+
+
+engine = create_db_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -13,4 +230,22 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# The async engine is only created when first used, so the async driver is
+# not needed unless DB_ASYNC is enabled
+async_engine = None
+AsyncSessionLocal = None
+
+def get_async_sessionmaker():
+    global async_engine, AsyncSessionLocal
+    if AsyncSessionLocal is None:
+        async_engine = create_async_db_engine()
+        AsyncSessionLocal = async_sessionmaker(
+            async_engine, autoflush=False, expire_on_commit=False
+        )
+    return AsyncSessionLocal
+
+async def get_async_db():
+    async with get_async_sessionmaker()() as db:
+        yield db
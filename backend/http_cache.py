@@ -0,0 +1,58 @@
+import hashlib
+from typing import Optional
+from fastapi import Request, Response
+from services import stats_cache
+
+# User data must be revalidated on every use, and never stored by shared caches
+USER_DATA_CACHE_CONTROL = "private, no-cache"
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match already names this representation"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    candidates = {value.strip().removeprefix("W/") for value in header.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+def set_validators(response: Response, etag: str, cache_control: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    response = Response(status_code=304)
+    set_validators(response, etag, cache_control)
+    return response
+
+
+def user_etag(request: Request, user_id: int, *extra) -> str:
+    """ETag for user_id's data as returned by this path and query string"""
+    version = stats_cache.cache.data_version(user_id)
+    variant = "|".join(
+        [request.url.path, request.url.query, *(str(value) for value in extra)]
+    )
+    return f'W/"{version}-{hashlib.sha1(variant.encode()).hexdigest()[:12]}"'
+
+
+def conditional_get(request: Request, response: Response, user_id: int,
+                    *extra) -> Optional[Response]:
+    """Return a 304 if the client's copy is current, else set the validators
+
+    Call it before querying: the version is read first, so a commit landing
+    during the query can only make the ETag older than the body, never newer.
+    Without a shared stats cache backend no ETag is sent and the client
+    refetches.
+    """
+    if not stats_cache.cache.versions_shared:
+        response.headers["Cache-Control"] = USER_DATA_CACHE_CONTROL
+        return None
+    etag = user_etag(request, user_id, *extra)
+    if etag_matches(request, etag):
+        return not_modified(etag, USER_DATA_CACHE_CONTROL)
+    set_validators(response, etag, USER_DATA_CACHE_CONTROL)
+    return None
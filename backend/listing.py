@@ -0,0 +1,26 @@
+"""Listing helpers shared by the sync routes and their twins in routes/async_api.py"""
+from contextlib import contextmanager
+from typing import Optional
+from fastapi import HTTPException, Response
+from services import fast_json
+
+
+@contextmanager
+def rejected_cursor_as_400():
+    """Turn the ValueError of a malformed cursor or filter into a 400"""
+    try:
+        yield
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+def page_response(response: Response, rows, next_cursor: Optional[str]):
+    """Expose the next page's cursor and return rows
+
+    JSON already encoded by fast_json is wrapped in a Response.
+    """
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    if isinstance(rows, bytes):
+        return fast_json.json_response(rows, response)
+    return rows
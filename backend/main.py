@@ -1,18 +1,46 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 import models
-from database import engine
-from routes import auth, budget, expenses, revenues, categories, tags
+from config import settings
+from database import engine, SessionLocal
+from services import jobs
+from services.metrics import InstrumentationMiddleware
+from services.auth import password_hasher
+from routes import (
+    auth, budget, expenses, revenues, categories, tags, stats, imports, export,
+    internal, async_api, alerts, recurring
+)
+from routes import jobs as jobs_routes
+from routes import metrics as metrics_routes
+
+def _backfill_rollups():
+    db = SessionLocal()
+    try:
+        jobs.schedule_rollup_backfill(db)
+    finally:
+        db.close()
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create database tables at startup rather than when main is imported
+    await run_in_threadpool(models.Base.metadata.create_all, bind=engine)
+    await run_in_threadpool(_backfill_rollups)
+    if settings.JOBS_ENABLED:
+        await jobs.runner.start(SessionLocal)
+    yield
+    await jobs.runner.stop()
+    password_hasher.shutdown()
 
 app = FastAPI(
     title="BudgetWise API",
     description="A comprehensive budget management application",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -22,15 +50,42 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Compress responses above the size threshold; brotli falls back to gzip if missing
+if settings.COMPRESSION == "brotli":
+    try:
+        from brotli_asgi import BrotliMiddleware
+        app.add_middleware(BrotliMiddleware, minimum_size=settings.COMPRESSION_MIN_SIZE)
+    except ImportError:
+        app.add_middleware(GZipMiddleware, minimum_size=settings.COMPRESSION_MIN_SIZE)
+elif settings.COMPRESSION == "gzip":
+    app.add_middleware(GZipMiddleware, minimum_size=settings.COMPRESSION_MIN_SIZE)
+
+# Added last so it wraps the others and its wall time covers compression
+if settings.METRICS_ENABLED:
+    app.add_middleware(InstrumentationMiddleware)
+
 # Include routers
+if settings.DB_ASYNC:
+    # Registered first so its async handlers take over the hot read paths
+    app.include_router(async_api.router)
 app.include_router(auth.router)
 app.include_router(budget.router)
+app.include_router(alerts.router)
 app.include_router(expenses.router)
 app.include_router(revenues.router)
+app.include_router(recurring.router)
 app.include_router(categories.router)
 app.include_router(tags.router)
+app.include_router(stats.router)
+app.include_router(imports.router)
+app.include_router(export.router)
+app.include_router(jobs_routes.router)
+app.include_router(internal.router)
+if settings.METRICS_ENABLED:
+    app.include_router(metrics_routes.router)
 
 # Serve static files
 app.mount("/static", StaticFiles(directory="../frontend"), name="static")
@@ -40,13 +95,21 @@ async def read_root():
     with open("../frontend/index.html", "r") as f:
         return HTMLResponse(content=f.read(), status_code=200)
 
+# Handlers must return a Response; detail keeps the route's own message
 @app.exception_handler(404)
 async def not_found_handler(request, exc):
-    return {"error": "Resource not found", "status_code": 404}
+    return JSONResponse(
+        status_code=404,
+        content={"error": "Resource not found", "status_code": 404,
+                 "detail": getattr(exc, "detail", None)}
+    )
 
 @app.exception_handler(500)
 async def internal_error_handler(request, exc):
-    return {"error": "Internal server error", "status_code": 500}
+    return JSONResponse(
+        status_code=500,
+        content={"error": "Internal server error", "status_code": 500}
+    )
 
 if __name__ == "__main__":
     import uvicorn
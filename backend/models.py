@@ -1,4 +1,7 @@
-from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, Table
+from sqlalchemy import (
+    Column, Integer, String, Float, Date, DateTime, ForeignKey, Table, Index, Text,
+    UniqueConstraint
+)
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -33,6 +36,10 @@ class Budget(Base):
 
     user = relationship("User", back_populates="budgets")
 
+    __table_args__ = (
+        Index("ix_budgets_user_month", "user_id", "month"),
+    )
+
 class Revenue(Base):
     __tablename__ = "revenues"
 
@@ -44,6 +51,12 @@ class Revenue(Base):
 
     user = relationship("User", back_populates="revenues")
 
+    # Index couvrant pour les sommes par période, et index de pagination (date, id)
+    __table_args__ = (
+        Index("ix_revenues_user_date", "user_id", "date", "amount"),
+        Index("ix_revenues_user_date_id", "user_id", "date", "id"),
+    )
+
 class Expense(Base):
     __tablename__ = "expenses"
 
@@ -59,6 +72,13 @@ class Expense(Base):
     category = relationship("Category", back_populates="expenses")
     tags = relationship("Tag", secondary=expense_tag_table, back_populates="expenses")
 
+    # Index couvrant pour les sommes par période, et index de pagination (date, id)
+    __table_args__ = (
+        Index("ix_expenses_user_date", "user_id", "date", "category_id", "amount"),
+        Index("ix_expenses_user_date_id", "user_id", "date", "id"),
+        Index("ix_expenses_user_category_date", "user_id", "category_id", "date", "id"),
+    )
+
 class Category(Base):
     __tablename__ = "categories"
 
@@ -82,5 +102,99 @@ class Alert(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     message = Column(String(255))
     trigger_date = Column(Date)
+    # Renseignés par le moteur d'alertes (voir services/alerts.py) : un seul
+    # déclenchement par utilisateur, mois et seuil
+    month = Column(String(7))
+    threshold = Column(Integer)  # Pourcentage du budget
 
     user = relationship("User", back_populates="alerts")
+
+    __table_args__ = (
+        UniqueConstraint(
+            "user_id", "month", "threshold", name="uq_alerts_user_month_threshold"
+        ),
+    )
+
+# Agrégats mensuels maintenus par crud à chaque écriture (voir services/rollup.py)
+class MonthlyRollup(Base):
+    __tablename__ = "monthly_rollups"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    month = Column(String(7), primary_key=True)  # Format YYYY-MM
+    total_revenue = Column(Float, nullable=False, default=0.0)
+    total_expenses = Column(Float, nullable=False, default=0.0)
+
+class CategoryRollup(Base):
+    __tablename__ = "category_rollups"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    month = Column(String(7), primary_key=True)  # Format YYYY-MM
+    category_id = Column(Integer, ForeignKey("categories.id"), primary_key=True)
+    total_amount = Column(Float, nullable=False, default=0.0)
+    expense_count = Column(Integer, nullable=False, default=0)
+
+# Règles de transactions récurrentes (voir services/recurring.py) : les
+# occurrences passées sont écrites dans expenses ou revenues jusqu'à
+# materialized_through, les suivantes sont calculées à la lecture
+class RecurringTransaction(Base):
+    __tablename__ = "recurring_transactions"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    kind = Column(String(10), nullable=False)  # expense ou revenue
+    amount = Column(Float, nullable=False)
+    label = Column(String(255))  # description d'une dépense, source d'un revenu
+    category_id = Column(Integer, ForeignKey("categories.id"))
+    type = Column(String(50))
+    frequency = Column(String(10), nullable=False)  # monthly ou weekly
+    # Tous les N mois ou N semaines
+    interval = Column(Integer, nullable=False, default=1)
+    # Jour du mois (1-31) ou de la semaine (0 = lundi)
+    day = Column(Integer, nullable=False)
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date)
+    materialized_through = Column(Date)
+
+# Suivi et point de reprise des imports de relevés bancaires
+# (voir services/statement_import.py)
+class StatementImport(Base):
+    __tablename__ = "statement_imports"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    filename = Column(String(255))
+    format = Column(String(10))  # csv ou ofx
+    status = Column(String(20), default="running")  # queued, running, completed, failed
+    lines_read = Column(Integer, default=0)  # dernière ligne validée, point de reprise
+    inserted = Column(Integer, default=0)
+    duplicates = Column(Integer, default=0)
+    errors = Column(Integer, default=0)
+    last_error = Column(String(255))
+    started_at = Column(DateTime)
+    updated_at = Column(DateTime)
+
+# Tâches de fond exécutées par services/jobs.py
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True)
+    type = Column(String(50), nullable=False)
+    # Vide pour les tâches globales
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    # queued, running, succeeded ou failed
+    status = Column(String(20), nullable=False, default="queued")
+    payload = Column(Text)  # JSON
+    result = Column(Text)  # JSON
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    last_error = Column(String(255))
+    run_after = Column(DateTime)  # prochaine tentative
+    # Une tâche running dont le bail expire est reprise
+    lease_expires_at = Column(DateTime)
+    created_at = Column(DateTime)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_jobs_status_run_after", "status", "run_after"),
+    )
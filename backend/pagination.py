@@ -0,0 +1,35 @@
+import base64
+import binascii
+from datetime import date
+from typing import Tuple
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(day: date, row_id: int) -> str:
+    """Encode the (date, id) position of the last row of a page as an opaque token"""
+    raw = f"{day.isoformat()}:{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[date, int]:
+    """Decode a token from encode_cursor, raising ValueError if it is malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        day, row_id = base64.urlsafe_b64decode(padded.encode()).decode().split(":")
+        return date.fromisoformat(day), int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+
+def after_cursor(model, cursor: str):
+    """Filter for the rows that come after cursor in (date desc, id desc) order"""
+    day, row_id = decode_cursor(cursor)
+    return or_(model.date < day, and_(model.date == day, model.id < row_id))
+
+
+def split_page(rows: list, limit: int):
+    """Split limit + 1 fetched rows into the page and the cursor of the next one"""
+    if len(rows) <= limit:
+        return rows, None
+    last = rows[limit - 1]
+    return rows[:limit], encode_cursor(last.date, last.id)
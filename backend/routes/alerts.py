@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Depends, Request, Response
+from sqlalchemy.orm import Session
+from typing import List
+import crud
+import schemas
+from database import get_db
+from services.auth import get_current_user_id
+from services.metrics import TimedRoute
+from http_cache import conditional_get
+
+router = APIRouter(prefix="/alerts", tags=["alerts"], route_class=TimedRoute)
+
+
+@router.get("/", response_model=List[schemas.Alert])
+def get_alerts(
+    request: Request,
+    response: Response,
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+):
+    not_modified = conditional_get(request, response, user_id)
+    if not_modified:
+        return not_modified
+    return crud.get_alerts_by_user(db, user_id=user_id)
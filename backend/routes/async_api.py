@@ -0,0 +1,110 @@
+"""Async handlers for the hot read endpoints.
+
+Included ahead of the sync routers when settings.DB_ASYNC is set, so these
+paths are served from an AsyncSession instead of the threadpool. The stats
+cache calls (data versions, cached dashboards) are blocking network calls
+with the redis backend, so they still go through the threadpool.
+"""
+from fastapi import APIRouter, Depends, Query, Request, Response
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import date, datetime
+import crud_async
+import schemas
+from http_cache import conditional_get
+from listing import page_response, rejected_cursor_as_400
+from config import settings
+from database import get_async_db
+from services.auth import get_current_user_id
+from services import fast_json
+from services import forecast as forecast_service
+from services.async_budget_service import AsyncBudgetService
+from services.metrics import TimedRoute
+
+router = APIRouter(tags=["async"], include_in_schema=False, route_class=TimedRoute)
+
+
+async def _read_page(db: AsyncSession, fast_page, async_page, user_id: int, **filters):
+    """A listing page, encoded through run_sync with FAST_JSON_LISTINGS, else awaited"""
+    if settings.FAST_JSON_LISTINGS:
+        return await db.run_sync(fast_page, user_id, **filters)
+    return await async_page(db, user_id, **filters)
+
+
+@router.get("/budgets/dashboard", response_model=schemas.DashboardStats)
+async def get_dashboard_stats(
+    request: Request,
+    response: Response,
+    user_id: int = Depends(get_current_user_id),
+    forecast: bool = False,
+    db: AsyncSession = Depends(get_async_db)
+):
+    # The month in progress changes at midnight even without writes
+    today = datetime.now().date()
+    not_modified = await run_in_threadpool(
+        conditional_get, request, response, user_id, today
+    )
+    if not_modified:
+        return not_modified
+    stats = await AsyncBudgetService.get_dashboard_stats(db, user_id, today)
+    if forecast:
+        stats = await db.run_sync(forecast_service.with_forecast, stats, user_id, today)
+    return stats
+
+
+@router.get("/expenses/", response_model=List[schemas.Expense])
+async def get_expenses(
+    request: Request,
+    response: Response,
+    user_id: int = Depends(get_current_user_id),
+    skip: int = Query(0, ge=0, deprecated=True),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    category_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    not_modified = await run_in_threadpool(
+        conditional_get, request, response, user_id
+    )
+    if not_modified:
+        return not_modified
+
+    # Only the page read differs from routes/expenses.py
+    with rejected_cursor_as_400():
+        expenses, next_cursor = await _read_page(
+            db, fast_json.expense_page, crud_async.get_expenses_page, user_id,
+            limit=limit, cursor=cursor, skip=skip,
+            start_date=start_date, end_date=end_date, category_id=category_id
+        )
+    return page_response(response, expenses, next_cursor)
+
+
+@router.get("/revenues/", response_model=List[schemas.Revenue])
+async def get_revenues(
+    request: Request,
+    response: Response,
+    user_id: int = Depends(get_current_user_id),
+    skip: int = Query(0, ge=0, deprecated=True),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    not_modified = await run_in_threadpool(
+        conditional_get, request, response, user_id
+    )
+    if not_modified:
+        return not_modified
+
+    # Only the page read differs from routes/revenues.py
+    with rejected_cursor_as_400():
+        revenues, next_cursor = await _read_page(
+            db, fast_json.revenue_page, crud_async.get_revenues_page, user_id,
+            limit=limit, cursor=cursor, skip=skip,
+            start_date=start_date, end_date=end_date
+        )
+    return page_response(response, revenues, next_cursor)
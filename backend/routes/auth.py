@@ -1,36 +1,54 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, Form, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 import crud
 import schemas
 from database import get_db
-from services.auth import verify_password, get_password_hash
+from services.auth import credentials_error, decode_token, issue_tokens, password_hasher
+from services.metrics import TimedRoute
 
-router = APIRouter(prefix="/auth", tags=["authentication"])
+router = APIRouter(prefix="/auth", tags=["authentication"], route_class=TimedRoute)
 
+# Async handlers: bcrypt runs on the password hasher's process pool and the
+# database calls on the threadpool, so a login burst cannot occupy every
+# threadpool worker
 @router.post("/register", response_model=schemas.User)
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_email(db, email=user.email)
+async def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
+    db_user = await run_in_threadpool(crud.get_user_by_email, db, user.email)
+    # Hand the connection back to the pool while bcrypt runs
+    await run_in_threadpool(db.close)
     if db_user:
         raise HTTPException(
             status_code=400,
             detail="Email already registered"
         )
-    return crud.create_user(db=db, user=user)
+    hashed_password = await password_hasher.hash(user.password)
+    return await run_in_threadpool(crud.create_user, db, user, hashed_password)
 
-@router.post("/login")
-def login(email: str = Query(...), password: str = Query(...), db: Session = Depends(get_db)):
-    user = crud.get_user_by_email(db, email)
-    if not user or not verify_password(password, user.password_hash):
+@router.post("/login", response_model=schemas.LoginResponse)
+async def login(email: str = Form(...), password: str = Form(...),
+                db: Session = Depends(get_db)):
+    user = await run_in_threadpool(crud.get_user_by_email, db, email)
+    # Hand the connection back to the pool while bcrypt runs
+    await run_in_threadpool(db.close)
+    valid, new_hash = await password_hasher.verify_and_update(
+        password, user.password_hash if user else None
+    )
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
+    if new_hash:
+        # BCRYPT_ROUNDS changed since this hash was stored
+        await run_in_threadpool(crud.update_password_hash, db, user.id, new_hash)
     
-    return {
-        "message": "Login successful",
-        "user": {
-            "id": user.id,
-            "name": user.name,
-            "email": user.email
-        }
-    }
\ No newline at end of file
+    return {"message": "Login successful", "user": user, **issue_tokens(user.id)}
+
+@router.post("/refresh", response_model=schemas.Token)
+def refresh(body: schemas.TokenRefresh, db: Session = Depends(get_db)):
+    # The only token check that reads the database: deleted accounts stop refreshing
+    user_id, _ = decode_token(body.refresh_token, "refresh")
+    if crud.get_user(db, user_id) is None:
+        raise credentials_error()
+    return issue_tokens(user_id)
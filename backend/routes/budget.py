@@ -1,36 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from datetime import datetime
 import crud
 import schemas
 from database import get_db
+from services.auth import get_current_user_id
+from http_cache import conditional_get
+from services import forecast as forecast_service
+from services.rollup import month_key
 from services.budget_service import BudgetService
+from services.metrics import TimedRoute
 
-router = APIRouter(prefix="/budgets", tags=["budgets"])
+router = APIRouter(prefix="/budgets", tags=["budgets"], route_class=TimedRoute)
 
 @router.post("/", response_model=schemas.Budget)
 def create_budget(
     budget: schemas.BudgetCreate,
+    user_id: int = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
-    # Get user_id from request body
-    user_id = getattr(budget, 'user_id', None)
-    if not user_id:
-        raise HTTPException(status_code=400, detail="User ID is required")
-    
     return crud.create_budget(db=db, budget=budget, user_id=user_id)
 
 @router.get("/", response_model=List[schemas.Budget])
 def get_budgets(
-    user_id: int = Query(...),
+    request: Request,
+    response: Response,
+    user_id: int = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
+    not_modified = conditional_get(request, response, user_id)
+    if not_modified:
+        return not_modified
     return crud.get_budgets_by_user(db, user_id=user_id)
 
 @router.get("/month/{month}", response_model=schemas.Budget)
 def get_budget_by_month(
     month: str,
-    user_id: int = Query(...),
+    user_id: int = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     budget = crud.get_budget_by_month(db, user_id=user_id, month=month)
@@ -40,7 +47,34 @@ def get_budget_by_month(
 
 @router.get("/dashboard", response_model=schemas.DashboardStats)
 def get_dashboard_stats(
-    user_id: int = Query(...),
+    request: Request,
+    response: Response,
+    user_id: int = Depends(get_current_user_id),
+    forecast: bool = False,
     db: Session = Depends(get_db)
 ):
-    return BudgetService.get_dashboard_stats(db, user_id)
\ No newline at end of file
+    # The month in progress changes at midnight even without writes
+    today = datetime.now().date()
+    not_modified = conditional_get(request, response, user_id, today)
+    if not_modified:
+        return not_modified
+    stats = BudgetService.get_dashboard_stats(db, user_id, today)
+    if forecast:
+        stats = forecast_service.with_forecast(db, stats, user_id, today)
+    return stats
+
+@router.get("/forecast", response_model=schemas.BudgetForecast)
+def get_budget_forecast(
+    request: Request,
+    response: Response,
+    user_id: int = Depends(get_current_user_id),
+    month: Optional[str] = Query(None, pattern=r"^\d{4}-(0[1-9]|1[0-2])$"),
+    db: Session = Depends(get_db)
+):
+    today = datetime.now().date()
+    not_modified = conditional_get(request, response, user_id, today)
+    if not_modified:
+        return not_modified
+    return forecast_service.forecast_month(
+        db, user_id, month or month_key(today), today
+    )
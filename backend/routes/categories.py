@@ -1,23 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from typing import List
 import crud
 import schemas
 from database import get_db
+from http_cache import etag_matches, not_modified, set_validators
+from services import reference_cache
+from services.metrics import TimedRoute
 
-router = APIRouter(prefix="/categories", tags=["categories"])
+router = APIRouter(prefix="/categories", tags=["categories"], route_class=TimedRoute)
 
 @router.post("/", response_model=schemas.Category)
 def create_category(category: schemas.CategoryCreate, db: Session = Depends(get_db)):
     return crud.create_category(db=db, category=category)
 
 @router.get("/", response_model=List[schemas.Category])
-def get_categories(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_categories(db, skip=skip, limit=limit)
+def get_categories(request: Request, response: Response, skip: int = 0,
+                   limit: int = 100, db: Session = Depends(get_db)):
+    # Served from the reference cache; the database is only read after a change
+    snapshot = reference_cache.categories.snapshot(db)
+    etag = snapshot.etag(skip, limit)
+    if etag_matches(request, etag):
+        return not_modified(etag, reference_cache.CACHE_CONTROL)
+    set_validators(response, etag, reference_cache.CACHE_CONTROL)
+    return snapshot.items[skip:skip + limit]
 
 @router.get("/{category_id}", response_model=schemas.Category)
 def get_category(category_id: int, db: Session = Depends(get_db)):
-    category = crud.get_category(db, category_id=category_id)
+    category = reference_cache.categories.get(db, category_id)
     if category is None:
         raise HTTPException(status_code=404, detail="Category not found")
     return category
\ No newline at end of file
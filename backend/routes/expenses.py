@@ -1,46 +1,76 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import date
 import crud
 import schemas
+from http_cache import conditional_get
+from listing import page_response, rejected_cursor_as_400
+from config import settings
 from database import get_db
+from services.auth import get_current_user_id
+from services import bulk_import, fast_json
+from services.metrics import TimedRoute
 
-router = APIRouter(prefix="/expenses", tags=["expenses"])
+router = APIRouter(prefix="/expenses", tags=["expenses"], route_class=TimedRoute)
 
 @router.post("/", response_model=schemas.Expense)
 def create_expense(
     expense: schemas.ExpenseCreate,
+    user_id: int = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
-    # Get user_id from request body
-    user_id = getattr(expense, 'user_id', None)
-    if not user_id:
-        raise HTTPException(status_code=400, detail="User ID is required")
-    
     return crud.create_expense(db=db, expense=expense, user_id=user_id)
 
+@router.post("/bulk", response_model=schemas.BulkImportResult)
+async def bulk_create_expenses(
+    request: Request,
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+):
+    # Accepts a JSON array or an application/x-ndjson stream, written in one transaction
+    try:
+        return await bulk_import.import_rows(
+            request, db, schemas.ExpenseCreate, crud.bulk_create_expenses, user_id
+        )
+    except bulk_import.LineTooLong as exc:
+        raise HTTPException(status_code=413, detail=str(exc))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
 @router.get("/", response_model=List[schemas.Expense])
 def get_expenses(
-    user_id: int = Query(...),
-    skip: int = 0,
-    limit: int = 100,
+    request: Request,
+    response: Response,
+    user_id: int = Depends(get_current_user_id),
+    skip: int = Query(0, ge=0, deprecated=True),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
     category_id: Optional[int] = None,
     db: Session = Depends(get_db)
 ):
-    if start_date and end_date:
-        return crud.get_expenses_by_date_range(db, user_id, start_date, end_date)
-    elif category_id:
-        return crud.get_expenses_by_category(db, user_id, category_id)
+    not_modified = conditional_get(request, response, user_id)
+    if not_modified:
+        return not_modified
+
+    # Newest first; follow X-Next-Cursor for the next page
+    if settings.FAST_JSON_LISTINGS:
+        page = fast_json.expense_page
     else:
-        return crud.get_expenses_by_user(db, user_id, skip, limit)
+        page = crud.get_expenses_page
+    with rejected_cursor_as_400():
+        expenses, next_cursor = page(
+            db, user_id, limit=limit, cursor=cursor, skip=skip,
+            start_date=start_date, end_date=end_date, category_id=category_id
+        )
+    return page_response(response, expenses, next_cursor)
 
 @router.get("/{expense_id}", response_model=schemas.Expense)
 def get_expense(
     expense_id: int,
-    user_id: int = Query(...),
+    user_id: int = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     expense = crud.get_expense(db, expense_id=expense_id)
@@ -52,7 +82,7 @@ def get_expense(
 def update_expense(
     expense_id: int,
     expense: schemas.ExpenseCreate,
-    user_id: int = Query(...),
+    user_id: int = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     db_expense = crud.get_expense(db, expense_id=expense_id)
@@ -64,7 +94,7 @@ def update_expense(
 @router.delete("/{expense_id}")
 def delete_expense(
     expense_id: int,
-    user_id: int = Query(...),
+    user_id: int = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     db_expense = crud.get_expense(db, expense_id=expense_id)
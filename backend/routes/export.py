@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from typing import Optional
+from datetime import date
+from database import get_db
+from services.auth import get_current_user_id
+from services import ledger_export
+from services.metrics import TimedRoute
+
+router = APIRouter(prefix="/export", tags=["export"], route_class=TimedRoute)
+
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def stream_export(db: Session, stmt, columns, name: str,
+                  format: str) -> StreamingResponse:
+    rows = ledger_export.iter_rows(db, stmt)
+    if format == "csv":
+        encode = ledger_export.encode_csv
+    else:
+        encode = ledger_export.encode_ndjson
+    return StreamingResponse(
+        encode(rows, columns),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{format}"'}
+    )
+
+
+@router.get("/expenses")
+def export_expenses(
+    user_id: int = Depends(get_current_user_id),
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: Session = Depends(get_db)
+):
+    stmt = ledger_export.expense_statement(user_id, start_date, end_date)
+    return stream_export(db, stmt, ledger_export.EXPENSE_COLUMNS, "expenses", format)
+
+
+@router.get("/revenues")
+def export_revenues(
+    user_id: int = Depends(get_current_user_id),
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: Session = Depends(get_db)
+):
+    stmt = ledger_export.revenue_statement(user_id, start_date, end_date)
+    return stream_export(db, stmt, ledger_export.REVENUE_COLUMNS, "revenues", format)
@@ -0,0 +1,64 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, File, UploadFile
+from sqlalchemy.orm import Session
+from typing import Optional
+import models
+import schemas
+from database import get_db
+from services.auth import get_current_user_id
+from services import jobs, statement_import
+from services.metrics import TimedRoute
+
+router = APIRouter(prefix="/imports", tags=["imports"], route_class=TimedRoute)
+
+
+@router.post("/statement", response_model=schemas.StatementImport)
+def import_statement(
+    file: UploadFile = File(...),
+    user_id: int = Depends(get_current_user_id),
+    category_id: int = Query(..., description="Category given to imported expenses"),
+    resume_id: Optional[int] = Query(None, description="Statement import to resume"),
+    background: bool = Query(
+        False, description="Queue the import as a job and return at once"
+    ),
+    db: Session = Depends(get_db)
+):
+    if resume_id:
+        record = db.get(models.StatementImport, resume_id)
+        if record is None or record.user_id != user_id:
+            raise HTTPException(status_code=404, detail="Statement import not found")
+        if record.status == "completed":
+            return statement_import.describe(record)
+    else:
+        fmt = statement_import.detect_format(file.filename)
+        record = statement_import.start_import(db, user_id, file.filename, fmt)
+
+    if background:
+        # Follow it on GET /jobs/{job_id}; a retried job resumes from the last batch
+        record.status = "queued"
+        payload = {
+            "import_id": record.id, "category_id": category_id,
+            "spool_id": jobs.spool_upload(file.file)
+        }
+        job = jobs.enqueue(db, "statement_import", payload, user_id=user_id)
+        progress = statement_import.describe(record)
+        progress.job_id = job.id
+        return progress
+
+    try:
+        stream = statement_import.open_text(file.file)
+        statement_import.run_import(db, record, stream, category_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return statement_import.describe(record)
+
+
+@router.get("/{import_id}", response_model=schemas.StatementImport)
+def get_statement_import(
+    import_id: int,
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+):
+    record = db.get(models.StatementImport, import_id)
+    if record is None or record.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Statement import not found")
+    return statement_import.describe(record)
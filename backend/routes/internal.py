@@ -0,0 +1,105 @@
+from fastapi import APIRouter, Body, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from typing import List, Optional
+import database
+import models
+import schemas
+from database import get_db
+from services import analytics, forecast, jobs, stats_cache
+from services.auth import password_hasher, require_internal_access, token_claims
+from services.dashboard_engine import DashboardEngine, encode_ndjson
+from services.metrics import TimedRoute
+
+router = APIRouter(
+    prefix="/internal", tags=["internal"], route_class=TimedRoute,
+    dependencies=[Depends(require_internal_access)]
+)
+
+
+@router.get("/pool")
+def get_pool_status():
+    status = database.pool_status()
+    if database.async_engine is not None:
+        status["async"] = database.pool_status(database.async_engine.sync_engine)
+    return status
+
+
+@router.get("/cache")
+def get_cache_stats():
+    return stats_cache.cache.stats()
+
+
+@router.get("/analytics")
+def get_analytics_cache_stats():
+    return {
+        **analytics.ledgers.stats(), "forecast_models": forecast.models_cache.stats()
+    }
+
+
+@router.get("/dashboards")
+def stream_dashboards(
+    user_id: Optional[List[int]] = Query(None),
+    chunk_size: Optional[int] = Query(None, ge=1, le=10000),
+    db: Session = Depends(get_db)
+):
+    # Every user by default, for reports; one NDJSON line per user
+    stats = DashboardEngine.iter_dashboard_stats(db, user_id, chunk_size=chunk_size)
+    return StreamingResponse(encode_ndjson(stats), media_type="application/x-ndjson")
+
+
+@router.get("/password-hashing")
+def get_password_hashing_stats():
+    return password_hasher.stats()
+
+
+@router.get("/tokens")
+def get_token_cache_stats():
+    return token_claims.stats()
+
+
+@router.get("/jobs")
+def get_job_stats(db: Session = Depends(get_db)):
+    stats = jobs.runner.stats()
+    counts = db.query(models.Job.type, models.Job.status, func.count()).group_by(
+        models.Job.type, models.Job.status
+    )
+    stats["queue"] = {}
+    for job_type, status, count in counts:
+        stats["queue"].setdefault(job_type, {})[status] = count
+    return stats
+
+
+# Jobs that span every user, with the payload each accepts
+GLOBAL_JOB_PAYLOADS = {
+    "rollup_rebuild": schemas.RollupRebuildPayload,
+    "alert_sweep": schemas.AlertSweepPayload,
+}
+
+
+@router.post("/jobs/{job_type}", response_model=schemas.Job, status_code=202)
+def enqueue_job(
+    job_type: str, payload: Optional[dict] = Body(None), db: Session = Depends(get_db)
+):
+    # E.g. a nightly alert_sweep or a rollup_rebuild of every user
+    payload_schema = GLOBAL_JOB_PAYLOADS.get(job_type)
+    if payload_schema is None:
+        raise HTTPException(
+            status_code=404, detail=f"Unknown global job type {job_type}"
+        )
+    try:
+        validated = payload_schema.model_validate(payload or {})
+    except ValidationError as exc:
+        raise HTTPException(status_code=422, detail=exc.errors(include_url=False))
+    job = jobs.enqueue(db, job_type, validated.model_dump(exclude_none=True))
+    return jobs.describe(job)
+
+
+@router.get("/jobs/{job_id}", response_model=schemas.Job)
+def get_any_job(job_id: int, db: Session = Depends(get_db)):
+    job = db.get(models.Job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return jobs.describe(job)
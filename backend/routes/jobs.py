@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+import models
+import schemas
+from database import get_db
+from services.auth import get_current_user_id
+from services import jobs
+from services.metrics import TimedRoute
+
+router = APIRouter(prefix="/jobs", tags=["jobs"], route_class=TimedRoute)
+
+
+@router.post("/rollup-rebuild", response_model=schemas.Job, status_code=202)
+def rebuild_my_rollups(
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+):
+    # A rebuild already waiting or running covers this request too
+    job = jobs.enqueue_once(
+        db, "rollup_rebuild", {"user_id": user_id}, user_id=user_id
+    )
+    return jobs.describe(job)
+
+
+@router.get("/{job_id}", response_model=schemas.Job)
+def get_job(
+    job_id: int,
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+):
+    job = db.get(models.Job, job_id)
+    if job is None or job.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return jobs.describe(job)
@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+import database
+from services import metrics, stats_cache
+from services.auth import require_internal_access
+from services.jobs import runner
+from services.metrics import TimedRoute
+
+router = APIRouter(
+    tags=["internal"], include_in_schema=False, route_class=TimedRoute,
+    dependencies=[Depends(require_internal_access)]
+)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    # Prometheus text format; the gauges mirror /internal/pool, /internal/cache
+    # and /internal/jobs
+    pool = database.pool_status()
+    cache = stats_cache.cache.stats()
+    jobs = runner.stats()
+    gauges = {
+        "db_pool_checked_out": pool.get("checked_out", 0),
+        "db_pool_overflow": pool.get("overflow", 0),
+        "db_pool_wait_seconds_total": pool.get("wait_seconds_total", 0.0),
+        "db_pool_timeouts_total": pool.get("timeouts", 0),
+        "stats_cache_hits_total": cache.get("hits", 0),
+        "stats_cache_misses_total": cache.get("misses", 0),
+        "jobs_running": sum(jobs["running"].values()),
+        "jobs_succeeded_total": jobs["succeeded"],
+        "jobs_failed_total": jobs["failed"],
+    }
+    return PlainTextResponse(
+        metrics.registry.render(gauges),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
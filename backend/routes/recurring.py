@@ -0,0 +1,78 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from datetime import date
+import crud
+import schemas
+from database import get_db
+from http_cache import conditional_get
+from services.auth import get_current_user_id
+from services import jobs, recurring
+from services.metrics import TimedRoute
+
+router = APIRouter(prefix="/recurring", tags=["recurring"], route_class=TimedRoute)
+
+
+@router.post("/", response_model=schemas.RecurringTransaction)
+def create_recurring(
+    rule: schemas.RecurringTransactionCreate,
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+):
+    try:
+        recurring.validate(rule)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if rule.category_id is not None and crud.get_category(db, rule.category_id) is None:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown category {rule.category_id}"
+        )
+
+    db_rule = crud.create_recurring(db=db, rule=rule, user_id=user_id)
+    if db_rule.start_date <= date.today():
+        # Occurrences already due are written in the background
+        jobs.enqueue(db, "recurring_materialize", {"user_id": user_id}, user_id=user_id)
+    return db_rule
+
+
+@router.get("/", response_model=List[schemas.RecurringTransaction])
+def get_recurring(
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+):
+    return crud.get_recurring_by_user(db, user_id=user_id)
+
+
+@router.get("/occurrences", response_model=List[schemas.RecurringOccurrence])
+def get_occurrences(
+    request: Request,
+    response: Response,
+    start_date: date,
+    end_date: date,
+    kind: Optional[str] = None,
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+):
+    # Only occurrences not yet in the ledger; the materialized ones are regular
+    # expenses and revenues
+    not_modified = conditional_get(request, response, user_id)
+    if not_modified:
+        return not_modified
+    try:
+        return recurring.project(db, user_id, start_date, end_date, kind)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@router.delete("/{recurring_id}")
+def delete_recurring(
+    recurring_id: int,
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+):
+    db_rule = crud.get_recurring(db, recurring_id=recurring_id)
+    if db_rule is None or db_rule.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Recurring transaction not found")
+
+    crud.delete_recurring(db=db, recurring_id=recurring_id)
+    return {"message": "Recurring transaction deleted successfully"}
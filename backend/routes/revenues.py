@@ -1,43 +1,75 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import date
 import crud
 import schemas
+from http_cache import conditional_get
+from listing import page_response, rejected_cursor_as_400
+from config import settings
 from database import get_db
+from services.auth import get_current_user_id
+from services import bulk_import, fast_json
+from services.metrics import TimedRoute
 
-router = APIRouter(prefix="/revenues", tags=["revenues"])
+router = APIRouter(prefix="/revenues", tags=["revenues"], route_class=TimedRoute)
 
 @router.post("/", response_model=schemas.Revenue)
 def create_revenue(
     revenue: schemas.RevenueCreate,
+    user_id: int = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
-    # Get user_id from request body
-    user_id = getattr(revenue, 'user_id', None)
-    if not user_id:
-        raise HTTPException(status_code=400, detail="User ID is required")
-    
     return crud.create_revenue(db=db, revenue=revenue, user_id=user_id)
 
+@router.post("/bulk", response_model=schemas.BulkImportResult)
+async def bulk_create_revenues(
+    request: Request,
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+):
+    # Accepts a JSON array or an application/x-ndjson stream, written in one transaction
+    try:
+        return await bulk_import.import_rows(
+            request, db, schemas.RevenueCreate, crud.bulk_create_revenues, user_id
+        )
+    except bulk_import.LineTooLong as exc:
+        raise HTTPException(status_code=413, detail=str(exc))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
 @router.get("/", response_model=List[schemas.Revenue])
 def get_revenues(
-    user_id: int = Query(...),
-    skip: int = 0,
-    limit: int = 100,
+    request: Request,
+    response: Response,
+    user_id: int = Depends(get_current_user_id),
+    skip: int = Query(0, ge=0, deprecated=True),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
     db: Session = Depends(get_db)
 ):
-    if start_date and end_date:
-        return crud.get_revenues_by_date_range(db, user_id, start_date, end_date)
+    not_modified = conditional_get(request, response, user_id)
+    if not_modified:
+        return not_modified
+
+    # Newest first; follow X-Next-Cursor for the next page
+    if settings.FAST_JSON_LISTINGS:
+        page = fast_json.revenue_page
     else:
-        return crud.get_revenues_by_user(db, user_id, skip, limit)
+        page = crud.get_revenues_page
+    with rejected_cursor_as_400():
+        revenues, next_cursor = page(
+            db, user_id, limit=limit, cursor=cursor, skip=skip,
+            start_date=start_date, end_date=end_date
+        )
+    return page_response(response, revenues, next_cursor)
 
 @router.get("/{revenue_id}", response_model=schemas.Revenue)
 def get_revenue(
     revenue_id: int,
-    user_id: int = Query(...),
+    user_id: int = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     revenue = crud.get_revenue(db, revenue_id=revenue_id)
@@ -49,7 +81,7 @@ def get_revenue(
 def update_revenue(
     revenue_id: int,
     revenue: schemas.RevenueCreate,
-    user_id: int = Query(...),
+    user_id: int = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     db_revenue = crud.get_revenue(db, revenue_id=revenue_id)
@@ -61,7 +93,7 @@ def update_revenue(
 @router.delete("/{revenue_id}")
 def delete_revenue(
     revenue_id: int,
-    user_id: int = Query(...),
+    user_id: int = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     db_revenue = crud.get_revenue(db, revenue_id=revenue_id)
@@ -0,0 +1,137 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from datetime import date
+import schemas
+from database import get_db
+from services.auth import get_current_user_id
+from services import analytics
+from services.budget_service import BudgetService
+from services.metrics import TimedRoute
+
+router = APIRouter(prefix="/stats", tags=["statistics"], route_class=TimedRoute)
+
+MONTH_PATTERN = r"^\d{4}-(0[1-9]|1[0-2])$"
+
+
+def check_range(start, end):
+    if end < start:
+        raise HTTPException(status_code=400, detail="End of range is before its start")
+
+
+@router.get("/monthly", response_model=List[schemas.MonthlyStats])
+def get_monthly_stats(
+    user_id: int = Depends(get_current_user_id),
+    start_month: str = Query(..., pattern=MONTH_PATTERN),
+    end_month: str = Query(..., pattern=MONTH_PATTERN),
+    db: Session = Depends(get_db)
+):
+    check_range(start_month, end_month)
+    try:
+        return BudgetService.get_monthly_series(db, user_id, start_month, end_month)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@router.get("/categories", response_model=List[schemas.CategoryStats])
+def get_category_stats(
+    user_id: int = Depends(get_current_user_id),
+    start_date: date = Query(...),
+    end_date: date = Query(...),
+    db: Session = Depends(get_db)
+):
+    check_range(start_date, end_date)
+    return BudgetService.get_category_stats(db, user_id, start_date, end_date)
+
+
+@router.get("/types", response_model=List[schemas.TypeStats])
+def get_type_stats(
+    user_id: int = Depends(get_current_user_id),
+    start_date: date = Query(...),
+    end_date: date = Query(...),
+    db: Session = Depends(get_db)
+):
+    check_range(start_date, end_date)
+    return BudgetService.get_type_stats(db, user_id, start_date, end_date)
+
+
+@router.get("/timeseries", response_model=List[schemas.TimeSeriesPoint])
+def get_timeseries(
+    user_id: int = Depends(get_current_user_id),
+    start_date: date = Query(...),
+    end_date: date = Query(...),
+    granularity: str = Query("month", pattern=r"^(day|week|month|year)$"),
+    db: Session = Depends(get_db)
+):
+    check_range(start_date, end_date)
+    try:
+        return BudgetService.get_timeseries(
+            db, user_id, start_date, end_date, granularity
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@router.get("/rolling", response_model=List[schemas.RollingPoint])
+def get_rolling_expenses(
+    user_id: int = Depends(get_current_user_id),
+    start_date: date = Query(...),
+    end_date: date = Query(...),
+    window: int = Query(30, ge=1, le=analytics.MAX_ROLLING_WINDOW),
+    type: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    check_range(start_date, end_date)
+    try:
+        return analytics.rolling_expenses(
+            db, user_id, start_date, end_date, window, type
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@router.get("/category-distribution", response_model=List[schemas.CategoryDistribution])
+def get_category_distribution(
+    user_id: int = Depends(get_current_user_id),
+    start_date: date = Query(...),
+    end_date: date = Query(...),
+    percentiles: List[float] = Query([50, 90]),
+    type: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    check_range(start_date, end_date)
+    try:
+        return analytics.category_distribution(
+            db, user_id, start_date, end_date, percentiles, type
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@router.get("/month-over-month", response_model=List[schemas.MonthOverMonth])
+def get_month_over_month(
+    user_id: int = Depends(get_current_user_id),
+    start_month: str = Query(..., pattern=MONTH_PATTERN),
+    end_month: str = Query(..., pattern=MONTH_PATTERN),
+    db: Session = Depends(get_db)
+):
+    check_range(start_month, end_month)
+    try:
+        return analytics.month_over_month(db, user_id, start_month, end_month)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@router.get("/balance", response_model=List[schemas.BalancePoint])
+def get_balance_curve(
+    user_id: int = Depends(get_current_user_id),
+    start_date: date = Query(...),
+    end_date: date = Query(...),
+    granularity: str = Query("day", pattern=r"^(day|week|month)$"),
+    db: Session = Depends(get_db)
+):
+    check_range(start_date, end_date)
+    try:
+        return analytics.balance_curve(db, user_id, start_date, end_date, granularity)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
@@ -1,23 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from typing import List
 import crud
 import schemas
 from database import get_db
+from http_cache import etag_matches, not_modified, set_validators
+from services import reference_cache
+from services.metrics import TimedRoute
 
-router = APIRouter(prefix="/tags", tags=["tags"])
+router = APIRouter(prefix="/tags", tags=["tags"], route_class=TimedRoute)
 
 @router.post("/", response_model=schemas.Tag)
 def create_tag(tag: schemas.TagCreate, db: Session = Depends(get_db)):
     return crud.create_tag(db=db, tag=tag)
 
 @router.get("/", response_model=List[schemas.Tag])
-def get_tags(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_tags(db, skip=skip, limit=limit)
+def get_tags(request: Request, response: Response, skip: int = 0,
+             limit: int = 100, db: Session = Depends(get_db)):
+    # Served from the reference cache; the database is only read after a change
+    snapshot = reference_cache.tags.snapshot(db)
+    etag = snapshot.etag(skip, limit)
+    if etag_matches(request, etag):
+        return not_modified(etag, reference_cache.CACHE_CONTROL)
+    set_validators(response, etag, reference_cache.CACHE_CONTROL)
+    return snapshot.items[skip:skip + limit]
 
 @router.get("/{tag_id}", response_model=schemas.Tag)
 def get_tag(tag_id: int, db: Session = Depends(get_db)):
-    tag = crud.get_tag(db, tag_id=tag_id)
+    tag = reference_cache.tags.get(db, tag_id)
     if tag is None:
         raise HTTPException(status_code=404, detail="Tag not found")
     return tag
\ No newline at end of file
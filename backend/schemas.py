@@ -1,6 +1,6 @@
-from pydantic import BaseModel, EmailStr
-from typing import List, Optional
-from datetime import date
+from pydantic import BaseModel, EmailStr, Field
+from typing import Dict, List, Optional
+from datetime import date, datetime
 
 # Base schemas
 class UserBase(BaseModel):
@@ -101,10 +101,111 @@ class Expense(ExpenseBase):
 class Alert(AlertBase):
     id: int
     user_id: int
+    month: Optional[str] = None
+    threshold: Optional[int] = None
     
     class Config:
         from_attributes = True
 
+# Authentication schemas
+class Token(BaseModel):
+    access_token: str
+    refresh_token: str
+    token_type: str = "bearer"
+    expires_in: int
+
+class LoginResponse(Token):
+    message: str
+    user: User
+
+class TokenRefresh(BaseModel):
+    refresh_token: str
+
+# Bulk import schemas
+class BulkRowError(BaseModel):
+    index: int
+    error: str
+
+class BulkImportResult(BaseModel):
+    inserted: int
+    errors: List[BulkRowError]
+
+class StatementImport(BaseModel):
+    id: int
+    user_id: int
+    filename: Optional[str] = None
+    format: str
+    status: str
+    lines_read: int
+    inserted: int
+    duplicates: int
+    errors: int
+    last_error: Optional[str] = None
+    started_at: datetime
+    updated_at: datetime
+    rows_per_second: float = 0.0
+    job_id: Optional[int] = None
+
+    class Config:
+        from_attributes = True
+
+# Recurring transaction schemas
+class RecurringTransactionCreate(BaseModel):
+    kind: str  # expense or revenue
+    amount: float
+    label: str
+    category_id: Optional[int] = None
+    type: Optional[str] = "fixed"
+    frequency: str  # monthly or weekly
+    interval: int = 1
+    day: int  # day of month (1-31) or weekday (0 = Monday)
+    start_date: date
+    end_date: Optional[date] = None
+
+class RecurringTransaction(RecurringTransactionCreate):
+    id: int
+    user_id: int
+    materialized_through: Optional[date] = None
+
+    class Config:
+        from_attributes = True
+
+class RecurringOccurrence(BaseModel):
+    recurring_id: int
+    kind: str
+    date: date
+    amount: float
+    label: str
+    category_id: Optional[int] = None
+    type: Optional[str] = None
+
+# Background job schemas
+class RollupRebuildPayload(BaseModel):
+    user_id: Optional[int] = None  # every user when omitted
+
+    class Config:
+        extra = "forbid"
+
+class AlertSweepPayload(BaseModel):
+    chunk_size: Optional[int] = Field(None, ge=1)
+
+    class Config:
+        extra = "forbid"
+
+class Job(BaseModel):
+    id: int
+    type: str
+    user_id: Optional[int] = None
+    status: str
+    attempts: int
+    max_attempts: int
+    result: Optional[dict] = None
+    last_error: Optional[str] = None
+    run_after: Optional[datetime] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
 # Statistics schemas
 class MonthlyStats(BaseModel):
     month: str
@@ -116,6 +217,60 @@ class CategoryStats(BaseModel):
     category_name: str
     total_amount: float
     percentage: float
+    transaction_count: int = 0
+
+class TypeStats(BaseModel):
+    type: str
+    total_amount: float
+    percentage: float
+
+class TimeSeriesPoint(BaseModel):
+    period: str
+    start_date: date
+    total_revenue: float
+    total_expenses: float
+    balance: float
+
+class RollingPoint(BaseModel):
+    date: date
+    total_expenses: float
+    rolling_average: float
+
+class CategoryDistribution(BaseModel):
+    category_id: Optional[int] = None
+    category_name: str
+    transaction_count: int
+    total_amount: float
+    mean: float
+    percentiles: Dict[str, float]
+
+class MonthOverMonth(MonthlyStats):
+    expenses_delta: Optional[float] = None
+    expenses_change_pct: Optional[float] = None
+    year_over_year_pct: Optional[float] = None
+
+class BalancePoint(BaseModel):
+    date: date
+    balance: float
+
+class CategoryForecast(BaseModel):
+    category_id: Optional[int] = None
+    category_name: str
+    spent_to_date: float
+    projected_total: float
+
+class BudgetForecast(BaseModel):
+    month: str
+    as_of: date
+    monthly_budget: float
+    spent_to_date: float
+    projected_total: float
+    projected_remaining: float
+    daily_burn_rate: float
+    # What may still be spent per day without going over the budget
+    safe_daily_spend: Optional[float] = None
+    overspend_expected: bool
+    categories: List[CategoryForecast]
 
 class DashboardStats(BaseModel):
     current_balance: float
@@ -123,4 +278,6 @@ class DashboardStats(BaseModel):
     budget_remaining: float
     total_expenses_this_month: float
     total_revenue_this_month: float
-    top_categories: List[CategoryStats]
\ No newline at end of file
+    top_categories: List[CategoryStats]
+    # Only with ?forecast=true
+    forecast: Optional[BudgetForecast] = None
@@ -0,0 +1,150 @@
+"""Budget alerts raised from the monthly rollups.
+
+An alert is raised the first time a user's expenses for the current month
+reach a threshold (settings.ALERT_THRESHOLDS, in percent) of that month's
+budget. The spend is read from monthly_rollups, which crud keeps current, so
+a check never re-sums the ledger. Each (user, month, threshold) fires once,
+enforced by a unique key on alerts.
+
+crud evaluates the months an expense write grew, in the same transaction.
+The nightly sweep covers every user in chunks, e.g. after a rollup rebuild
+or a threshold change, from the backend directory:
+
+    python -m services.alerts sweep [--chunk-size N]
+"""
+import argparse
+import sys
+from datetime import date
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from config import settings
+from database import insert_ignoring_duplicates
+import models
+from services import stats_cache
+from services.rollup import month_key
+
+
+def crossed_thresholds(spent: float, budget: Optional[float],
+                       thresholds: Iterable[int]) -> List[int]:
+    """Thresholds, in percent of budget, that spent has reached"""
+    if not budget or budget <= 0:
+        return []
+    return [threshold for threshold in thresholds if spent >= budget * threshold / 100]
+
+
+def alert_message(threshold: int, month: str, spent: float, budget: float) -> str:
+    if threshold >= 100:
+        return f"Budget de {month} dépassé : {spent:.2f} dépensés sur {budget:.2f}"
+    return (
+        f"{threshold}% du budget de {month} atteint : "
+        f"{spent:.2f} dépensés sur {budget:.2f}"
+    )
+
+
+def _spend_against_budget(db: Session, month: str, user_ids=None,
+                          after_user_id: int = 0, limit: int = None):
+    """(user_id, spent, budget) for users with a budget in month, by user id"""
+    query = db.query(
+        models.Budget.user_id, models.MonthlyRollup.total_expenses, models.Budget.amount
+    ).join(
+        models.MonthlyRollup,
+        (models.MonthlyRollup.user_id == models.Budget.user_id)
+        & (models.MonthlyRollup.month == models.Budget.month)
+    ).filter(models.Budget.month == month)
+    if user_ids is not None:
+        query = query.filter(models.Budget.user_id.in_(user_ids))
+    else:
+        query = query.filter(models.Budget.user_id > after_user_id)
+    query = query.order_by(models.Budget.user_id)
+    return query.limit(limit).all() if limit else query.all()
+
+
+def _raise_alerts(db: Session, month: str, rows, today: date) -> int:
+    """Add the alerts rows have crossed that were not raised yet, without committing"""
+    thresholds = settings.ALERT_THRESHOLDS
+    pending = {
+        (user_id, threshold): (spent, budget)
+        for user_id, spent, budget in rows
+        for threshold in crossed_thresholds(spent or 0.0, budget, thresholds)
+    }
+    if not pending:
+        return 0
+
+    raised = db.query(models.Alert.user_id, models.Alert.threshold).filter(
+        models.Alert.user_id.in_({user_id for user_id, _ in pending}),
+        models.Alert.month == month
+    )
+    for key in raised:
+        pending.pop(tuple(key), None)
+
+    # A concurrent write or sweep may raise the same alert since the check above:
+    # the unique key lets only one of them insert it
+    inserted = 0
+    for (user_id, threshold), (spent, budget) in pending.items():
+        if insert_ignoring_duplicates(db, models.Alert.__table__, {
+            "user_id": user_id, "month": month, "threshold": threshold,
+            "trigger_date": today,
+            "message": alert_message(threshold, month, spent, budget),
+        }, ("user_id", "month", "threshold")):
+            stats_cache.mark_dirty(db, user_id)
+            inserted += 1
+    return inserted
+
+
+def evaluate(db: Session, keys: Iterable[Tuple[int, str]],
+             today: Optional[date] = None) -> int:
+    """Raise the alerts due for the (user_id, month) keys, without committing
+
+    The rollups must already be flushed. Keys of other months than the
+    current one are ignored, so backfilling past expenses never raises alerts.
+    """
+    today = today or date.today()
+    month = month_key(today)
+    user_ids = {user_id for user_id, key_month in keys if key_month == month}
+    if not user_ids:
+        return 0
+    rows = _spend_against_budget(db, month, user_ids=user_ids)
+    return _raise_alerts(db, month, rows, today)
+
+
+def sweep(db: Session, chunk_size: int = None, today: Optional[date] = None) -> int:
+    """Evaluate every user with a budget this month, committing per chunk
+
+    Returns the number of alerts raised.
+    """
+    chunk_size = chunk_size or settings.ALERT_SWEEP_CHUNK_SIZE
+    today = today or date.today()
+    month = month_key(today)
+    raised = 0
+    last_user_id = 0
+    while True:
+        rows = _spend_against_budget(
+            db, month, after_user_id=last_user_id, limit=chunk_size
+        )
+        if not rows:
+            return raised
+        raised += _raise_alerts(db, month, rows, today)
+        db.commit()
+        last_user_id = rows[-1][0]
+
+
+def main(argv=None):
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(
+        description="Raise the budget alerts due this month"
+    )
+    parser.add_argument("command", choices=["sweep"])
+    parser.add_argument("--chunk-size", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        print(f"Raised {sweep(db, args.chunk_size)} alerts")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,357 @@
+"""Vectorized multi-year statistics over a user's whole ledger.
+
+LedgerArrays holds a user's expenses and revenues as NumPy columns (date
+ordinal, month index, amount, category id, type code), sorted by date. A
+ledger of years of daily expenses fits in a few hundred kilobytes, and
+rolling windows, per-category percentiles, month-over-month deltas and
+balance curves become a handful of array operations instead of SQL
+gymnastics or a loop over ORM objects.
+
+The arrays are kept in an in-process LRU, bounded by total rows, and are
+tagged with the stats_cache data version of their user. Every committed
+write changes that version, so the next read reloads the ledger; no write
+path needs to know about this module. That version only sees the writes of
+other worker processes with the redis backend; with a per-process backend
+entries also expire after ANALYTICS_CACHE_TTL seconds, which bounds how long
+such a write can go unseen.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Iterable, List, Optional
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from config import settings
+import models
+import schemas
+from services import reference_cache, stats_cache
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+MAX_ROLLING_WINDOW = 365
+MAX_POINTS = 3660
+
+
+def _month_index(ordinals: np.ndarray) -> np.ndarray:
+    """Months since 1970-01 of an array of date ordinals"""
+    days = (ordinals - EPOCH_ORDINAL).astype("datetime64[D]")
+    return days.astype("datetime64[M]").astype(np.int32)
+
+
+def _month_index_of(month: str) -> int:
+    year, month_number = (int(part) for part in month.split("-"))
+    return (year - 1970) * 12 + month_number - 1
+
+
+def _month_label(index: int) -> str:
+    year, month = divmod(int(index), 12)
+    return f"{year + 1970}-{month + 1:02d}"
+
+
+class LedgerArrays:
+    """Columns of one user's ledger, each sorted by date then id"""
+
+    def __init__(self, expenses: list, revenues: list):
+        types = sorted({row.type or "" for row in expenses})
+        type_codes = {name: code for code, name in enumerate(types)}
+        self.types: List[str] = types
+
+        def column(rows, value, dtype):
+            return np.fromiter(map(value, rows), dtype, len(rows))
+
+        def ordinal(row):
+            return row.date.toordinal()
+
+        def amount(row):
+            return row.amount or 0.0
+
+        self.expense_day = column(expenses, ordinal, np.int32)
+        self.expense_amount = column(expenses, amount, np.float64)
+        self.expense_category = column(
+            expenses, lambda row: -1 if row.category_id is None else row.category_id,
+            np.int32
+        )
+        self.expense_type = column(
+            expenses, lambda row: type_codes[row.type or ""], np.int8
+        )
+        self.expense_month = _month_index(self.expense_day)
+
+        self.revenue_day = column(revenues, ordinal, np.int32)
+        self.revenue_amount = column(revenues, amount, np.float64)
+        self.revenue_month = _month_index(self.revenue_day)
+
+    @classmethod
+    def load(cls, db: Session, user_id: int) -> "LedgerArrays":
+        expenses = db.execute(
+            select(
+                models.Expense.date, models.Expense.amount,
+                models.Expense.category_id, models.Expense.type
+            )
+            .where(models.Expense.user_id == user_id, models.Expense.date.isnot(None))
+            .order_by(models.Expense.date, models.Expense.id)
+        ).all()
+        revenues = db.execute(
+            select(models.Revenue.date, models.Revenue.amount)
+            .where(models.Revenue.user_id == user_id, models.Revenue.date.isnot(None))
+            .order_by(models.Revenue.date, models.Revenue.id)
+        ).all()
+        return cls(expenses, revenues)
+
+    @property
+    def rows(self) -> int:
+        return len(self.expense_day) + len(self.revenue_day)
+
+    def fixed_mask(self) -> np.ndarray:
+        """Boolean mask of the expenses of the fixed type"""
+        if "fixed" not in self.types:
+            return np.zeros(len(self.expense_type), dtype=bool)
+        return self.expense_type == self.types.index("fixed")
+
+    def expense_mask(self, start: date, end: date,
+                     expense_type: Optional[str] = None) -> np.ndarray:
+        """Boolean mask of the expenses in [start, end], optionally of one type"""
+        days = self.expense_day
+        mask = (days >= start.toordinal()) & (days <= end.toordinal())
+        if expense_type is not None:
+            if expense_type not in self.types:
+                return np.zeros_like(mask)
+            mask &= self.expense_type == self.types.index(expense_type)
+        return mask
+
+
+class LedgerCache:
+    """LRU of LedgerArrays by user, bounded by the total rows held"""
+
+    def __init__(self, max_rows: int, ttl: float = 0):
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self.entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self.rows = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, db: Session, user_id: int) -> LedgerArrays:
+        # Read the version first: a commit during the load then only makes the
+        # entry look stale
+        version = stats_cache.cache.data_version(user_id)
+        shared = stats_cache.cache.versions_shared
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(user_id)
+            fresh = entry is not None and (shared or now - entry[2] < self.ttl)
+            if fresh and entry[0] == version:
+                self.entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        ledger = LedgerArrays.load(db, user_id)
+        with self.lock:
+            previous = self.entries.pop(user_id, None)
+            if previous is not None:
+                self.rows -= previous[1].rows
+            if ledger.rows <= self.max_rows:
+                self.entries[user_id] = (version, ledger, now)
+                self.rows += ledger.rows
+                while self.rows > self.max_rows:
+                    _, (_, evicted, _) = self.entries.popitem(last=False)
+                    self.rows -= evicted.rows
+        return ledger
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.rows = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "users": len(self.entries),
+                "rows": self.rows,
+                "max_rows": self.max_rows,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+ledgers = LedgerCache(settings.ANALYTICS_CACHE_MAX_ROWS, settings.ANALYTICS_CACHE_TTL)
+
+
+def _daily_totals(days: np.ndarray, amounts: np.ndarray, first: int,
+                  last: int) -> np.ndarray:
+    """Sum of amounts per day ordinal in [first, last], zero-filled"""
+    inside = (days >= first) & (days <= last)
+    return np.bincount(
+        days[inside] - first, weights=amounts[inside], minlength=last - first + 1
+    )
+
+
+def rolling_expenses(db: Session, user_id: int, start_date: date, end_date: date,
+                     window: int = 30,
+                     expense_type: Optional[str] = None) -> List[schemas.RollingPoint]:
+    """Daily expenses with their trailing window-day average
+
+    The average of the first days also looks back before start_date.
+    """
+    if not 1 <= window <= MAX_ROLLING_WINDOW:
+        raise ValueError(f"window must be between 1 and {MAX_ROLLING_WINDOW} days")
+    if (end_date - start_date).days >= MAX_POINTS:
+        raise ValueError(f"More than {MAX_POINTS} days, shorten the range")
+    ledger = ledgers.get(db, user_id)
+    first, last = start_date.toordinal() - window + 1, end_date.toordinal()
+    mask = ledger.expense_mask(date.fromordinal(first), end_date, expense_type)
+    daily = np.bincount(
+        ledger.expense_day[mask] - first, weights=ledger.expense_amount[mask],
+        minlength=last - first + 1
+    )
+
+    cumulative = np.concatenate(([0.0], np.cumsum(daily)))
+    averages = (cumulative[window:] - cumulative[:-window]) / window
+    return [
+        schemas.RollingPoint(
+            date=date.fromordinal(first + window - 1 + offset),
+            total_expenses=float(total), rolling_average=float(average)
+        )
+        for offset, (total, average) in enumerate(zip(daily[window - 1:], averages))
+    ]
+
+
+def category_distribution(
+    db: Session, user_id: int, start_date: date, end_date: date,
+    percentiles: Iterable[float] = (50, 90), expense_type: Optional[str] = None
+) -> List[schemas.CategoryDistribution]:
+    """Count, total, mean and amount percentiles of each category's expenses
+
+    Largest total first.
+    """
+    percentiles = sorted(set(percentiles))
+    if any(not 0 <= p <= 100 for p in percentiles):
+        raise ValueError("percentiles must be between 0 and 100")
+    ledger = ledgers.get(db, user_id)
+    mask = ledger.expense_mask(start_date, end_date, expense_type)
+    categories, amounts = ledger.expense_category[mask], ledger.expense_amount[mask]
+
+    # Group by category with one sort, amounts ascending within each group
+    order = np.lexsort((amounts, categories))
+    categories, amounts = categories[order], amounts[order]
+    category_ids, starts, counts = np.unique(
+        categories, return_index=True, return_counts=True
+    )
+    totals = np.add.reduceat(amounts, starts) if len(amounts) else np.array([])
+
+    known = reference_cache.categories.resolve(
+        db, [int(c) for c in category_ids if c >= 0]
+    )
+    names = {category.id: category.name for category in known}
+    distribution = []
+    for category_id, begin, count, total in zip(category_ids, starts, counts, totals):
+        group = amounts[begin:begin + count]
+        values = np.percentile(group, percentiles) if percentiles else []
+        distribution.append(schemas.CategoryDistribution(
+            category_id=int(category_id) if category_id >= 0 else None,
+            category_name=names.get(int(category_id), ""),
+            transaction_count=int(count),
+            total_amount=float(total),
+            mean=float(total / count),
+            percentiles={
+                f"p{p:g}": float(value) for p, value in zip(percentiles, values)
+            },
+        ))
+    distribution.sort(key=lambda item: item.total_amount, reverse=True)
+    return distribution
+
+
+def month_over_month(db: Session, user_id: int, start_month: str,
+                     end_month: str) -> List[schemas.MonthOverMonth]:
+    """Monthly totals with their change from the previous month and a year before"""
+    # Twelve extra months so the first months of the range have a comparison too
+    first, last = _month_index_of(start_month) - 12, _month_index_of(end_month)
+    if last - first - 12 >= MAX_POINTS:
+        raise ValueError(f"More than {MAX_POINTS} months, shorten the range")
+    ledger = ledgers.get(db, user_id)
+
+    def monthly(months, amounts):
+        inside = (months >= first) & (months <= last)
+        return np.bincount(
+            months[inside] - first, weights=amounts[inside], minlength=last - first + 1
+        )
+
+    revenue = monthly(ledger.revenue_month, ledger.revenue_amount)
+    expenses = monthly(ledger.expense_month, ledger.expense_amount)
+    previous = np.concatenate(([np.nan], expenses[:-1]))
+    year_before = np.concatenate((np.full(12, np.nan), expenses[:-12]))
+    deltas = expenses - previous
+
+    def change(current, reference):
+        if np.isnan(reference) or reference == 0:
+            return None
+        return round(float((current - reference) / reference * 100), 2)
+
+    return [
+        schemas.MonthOverMonth(
+            month=_month_label(first + offset),
+            total_revenue=float(revenue[offset]),
+            total_expenses=float(expenses[offset]),
+            balance=float(revenue[offset] - expenses[offset]),
+            expenses_delta=None if np.isnan(deltas[offset]) else float(deltas[offset]),
+            expenses_change_pct=change(expenses[offset], previous[offset]),
+            year_over_year_pct=change(expenses[offset], year_before[offset]),
+        )
+        for offset in range(12, last - first + 1)
+    ]
+
+
+def balance_curve(db: Session, user_id: int, start_date: date, end_date: date,
+                  granularity: str = "day") -> List[schemas.BalancePoint]:
+    """Running balance (all revenue minus all expenses so far)
+
+    Taken at the end of each day, week or month.
+    """
+    first, last = start_date.toordinal(), end_date.toordinal()
+    # Counted before the ledger and the per-day arrays are built
+    if granularity == "day":
+        points = last - first + 1
+    elif granularity == "week":
+        points = last // 7 - (first - 1) // 7 + (last % 7 != 0)
+    elif granularity == "month":
+        points = (
+            (end_date.year - start_date.year) * 12
+            + end_date.month - start_date.month + 1
+        )
+    else:
+        raise ValueError(f"Unknown granularity {granularity!r}")
+    if points > MAX_POINTS:
+        raise ValueError(f"More than {MAX_POINTS} points, use a coarser granularity")
+
+    ledger = ledgers.get(db, user_id)
+    opening = (
+        ledger.revenue_amount[ledger.revenue_day < first].sum()
+        - ledger.expense_amount[ledger.expense_day < first].sum()
+    )
+    net = (
+        _daily_totals(ledger.revenue_day, ledger.revenue_amount, first, last)
+        - _daily_totals(ledger.expense_day, ledger.expense_amount, first, last)
+    )
+    balance = opening + np.cumsum(net)
+
+    # Periods end on Sundays (ordinals divisible by 7) or month ends, and the
+    # range's last day closes the last one
+    days = np.arange(first, last + 1, dtype=np.int32)
+    if granularity == "day":
+        ends = days
+    elif granularity == "week":
+        ends = days[(days % 7 == 0) | (days == last)]
+    else:
+        months = _month_index(np.arange(first, last + 2, dtype=np.int32))
+        ends = days[(months[1:] != months[:-1]) | (days == last)]
+
+    return [
+        schemas.BalancePoint(
+            date=date.fromordinal(int(day)),
+            balance=round(float(balance[day - first]), 2)
+        )
+        for day in ends
+    ]
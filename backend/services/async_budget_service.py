@@ -0,0 +1,48 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from datetime import datetime, date
+from typing import Optional
+import schemas
+from services import stats_cache
+from services.budget_service import BudgetService, DASHBOARD_ADAPTER
+from services.dashboard_engine import DashboardEngine
+
+
+class AsyncBudgetService:
+    """BudgetService for AsyncSession
+
+    Only the dashboard has a native async path: its totals statement is
+    awaited directly. Other statistics are reached with
+    db.run_sync(BudgetService.<method>, ...), which still awaits the driver
+    instead of blocking a worker thread. The stats cache is read and written
+    from the threadpool, its redis backend would block the event loop.
+    """
+
+    @staticmethod
+    async def get_dashboard_stats(
+        db: AsyncSession, user_id: int, today: Optional[date] = None
+    ) -> schemas.DashboardStats:
+        """Get dashboard statistics with a totals, a category and a rules query"""
+        if today is None:
+            today = datetime.now().date()
+
+        key, stats = await run_in_threadpool(
+            stats_cache.cache.lookup, user_id, "dashboard", (today,), DASHBOARD_ADAPTER
+        )
+        if stats is None:
+            statement = DashboardEngine.totals_statement(user_id, today)
+            totals = (await db.execute(statement)).one()
+            start_of_month = date(today.year, today.month, 1)
+            category_stats = await db.run_sync(
+                BudgetService.get_category_stats, user_id, start_of_month, today
+            )
+            projected = await db.run_sync(
+                DashboardEngine.month_projection, [user_id], today
+            )
+            stats = DashboardEngine.build(
+                totals, category_stats, projected.get(user_id, (0.0, 0.0))
+            )
+            await run_in_threadpool(
+                stats_cache.cache.store, key, stats, DASHBOARD_ADAPTER
+            )
+        return stats
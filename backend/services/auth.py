@@ -1,9 +1,253 @@
+import asyncio
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Optional, Tuple
+from fastapi import Depends, Header, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jose import JWTError, jwt
 from passlib.context import CryptContext
+from config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS
+)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
\ No newline at end of file
+    return pwd_context.hash(password)
+
+
+# Worker-process side: the cost travels with each call so the workers never
+# depend on how their configuration was inherited
+@lru_cache(maxsize=None)
+def _context(rounds: int) -> CryptContext:
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+
+def _hash(password: str, rounds: int) -> str:
+    return _context(rounds).hash(password)
+
+def _verify_and_update(password: str, hashed_password: Optional[str],
+                       rounds: int) -> Tuple[bool, Optional[str]]:
+    if hashed_password is None:
+        # Unknown account: spend the same time as a real check
+        _context(rounds).dummy_verify()
+        return False, None
+    return _context(rounds).verify_and_update(password, hashed_password)
+
+
+class PasswordHasher:
+    """Runs bcrypt on a dedicated process pool, off the event loop and threadpool
+
+    At most `workers` hashes run at once; up to `max_waiting` more may queue,
+    beyond that callers get a 503 instead of piling up. With workers=0 the
+    work runs on the threadpool, as the sync handlers used to.
+    """
+
+    def __init__(self, workers: int, max_waiting: int, rounds: int):
+        self.workers = workers
+        self.max_waiting = max_waiting
+        self.rounds = rounds
+        self.executor = None
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self.executor
+
+    async def _run(self, func, *args):
+        with self.lock:
+            if self.in_flight >= self.workers + self.max_waiting:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="Too many authentication requests, retry shortly"
+                )
+            self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            if self.workers > 0:
+                future = self._get_executor().submit(func, *args)
+                return await asyncio.wrap_future(future)
+            return await run_in_threadpool(func, *args)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.in_flight -= 1
+                self.completed += 1
+                self.total_seconds += elapsed
+                self.max_seconds = max(self.max_seconds, elapsed)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password, self.rounds)
+
+    async def verify_and_update(
+        self, password: str, hashed_password: Optional[str]
+    ) -> Tuple[bool, Optional[str]]:
+        """Check a password; also return a new hash when the stored cost is outdated"""
+        return await self._run(
+            _verify_and_update, password, hashed_password, self.rounds
+        )
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "workers": self.workers,
+                "max_waiting": self.max_waiting,
+                "rounds": self.rounds,
+                "in_flight": self.in_flight,
+                "waiting": max(self.in_flight - self.workers, 0),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "seconds_avg": (
+                    round(self.total_seconds / self.completed, 4)
+                    if self.completed else 0.0
+                ),
+                "seconds_max": round(self.max_seconds, 4),
+            }
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(cancel_futures=True)
+                self.executor = None
+
+
+password_hasher = PasswordHasher(
+    settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_WAITING,
+    settings.BCRYPT_ROUNDS
+)
+
+
+def _create_token(user_id: int, token_type: str, lifetime: timedelta) -> str:
+    now = datetime.now(timezone.utc)
+    claims = {
+        "sub": str(user_id), "type": token_type, "iat": now, "exp": now + lifetime
+    }
+    return jwt.encode(claims, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+def create_access_token(user_id: int) -> str:
+    lifetime = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    return _create_token(user_id, "access", lifetime)
+
+def create_refresh_token(user_id: int) -> str:
+    lifetime = timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    return _create_token(user_id, "refresh", lifetime)
+
+def issue_tokens(user_id: int) -> dict:
+    return {
+        "access_token": create_access_token(user_id),
+        "refresh_token": create_refresh_token(user_id),
+        "token_type": "bearer",
+        "expires_in": settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+
+def credentials_error(detail: str = "Could not validate credentials") -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"}
+    )
+
+def decode_token(token: str, token_type: str) -> Tuple[int, float]:
+    """Verify a token's signature, expiry and type; return its user id and expiry"""
+    try:
+        claims = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        raise credentials_error()
+    if claims.get("type") != token_type:
+        raise credentials_error()
+    try:
+        return int(claims["sub"]), claims["exp"]
+    except (KeyError, TypeError, ValueError):
+        raise credentials_error()
+
+
+class TokenClaimCache:
+    """Verified access tokens mapped to their user id until the token expires
+
+    A browser sends the same token on every request for its whole lifetime,
+    so most requests skip the signature check. Bounded by LRU eviction.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[int]:
+        with self.lock:
+            entry = self.entries.get(token)
+            if entry is not None and entry[1] > time.time():
+                self.entries.move_to_end(token)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self.entries[token]
+            self.misses += 1
+            return None
+
+    def put(self, token: str, user_id: int, expires_at: float):
+        if self.max_entries <= 0:
+            return
+        with self.lock:
+            self.entries[token] = (user_id, expires_at)
+            self.entries.move_to_end(token)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+token_claims = TokenClaimCache(settings.TOKEN_CLAIM_CACHE_SIZE)
+bearer_scheme = HTTPBearer(auto_error=False)
+
+async def get_current_user_id(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)
+) -> int:
+    """Authenticate the request from its bearer access token, without a DB lookup"""
+    if credentials is None:
+        raise credentials_error("Not authenticated")
+    token = credentials.credentials
+    user_id = token_claims.get(token)
+    if user_id is None:
+        user_id, expires_at = decode_token(token, "access")
+        token_claims.put(token, user_id, expires_at)
+    return user_id
+
+
+async def require_internal_access(
+    x_internal_token: Optional[str] = Header(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)
+):
+    """Admit operators holding INTERNAL_API_TOKEN; user access tokens do not qualify"""
+    expected = settings.INTERNAL_API_TOKEN.encode()
+    supplied = x_internal_token or (credentials.credentials if credentials else "")
+    if not expected or not secrets.compare_digest(supplied.encode(), expected):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Internal access required"
+        )
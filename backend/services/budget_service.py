@@ -1,38 +1,80 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func, extract
-from datetime import datetime, date
+from sqlalchemy import func
+from pydantic import TypeAdapter
+from datetime import datetime, date, timedelta
 from typing import List, Optional
 import models
 import schemas
+from services import recurring, rollup, stats_cache
+
+MAX_TIMESERIES_POINTS = 3660
+
+def _bucket_start(day: date, granularity: str) -> date:
+    """First day of the day, ISO week, month or year containing day"""
+    if granularity == "day":
+        return day
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return date(day.year, day.month, 1)
+    if granularity == "year":
+        return date(day.year, 1, 1)
+    raise ValueError(f"Unknown granularity {granularity!r}")
+
+def _next_bucket(bucket: date, granularity: str) -> date:
+    if granularity == "day":
+        return bucket + timedelta(days=1)
+    if granularity == "week":
+        return bucket + timedelta(days=7)
+    if granularity == "month":
+        if bucket.month == 12:
+            return date(bucket.year + 1, 1, 1)
+        return date(bucket.year, bucket.month + 1, 1)
+    return date(bucket.year + 1, 1, 1)
+
+def _bucket_label(bucket: date, granularity: str) -> str:
+    if granularity == "month":
+        return rollup.month_key(bucket)
+    if granularity == "year":
+        return str(bucket.year)
+    return bucket.isoformat()
+
+DASHBOARD_ADAPTER = TypeAdapter(schemas.DashboardStats)
 
 class BudgetService:
     @staticmethod
     def calculate_current_balance(db: Session, user_id: int) -> float:
         """Calculate current balance for a user"""
-        total_revenue = db.query(func.sum(models.Revenue.amount)).filter(
-            models.Revenue.user_id == user_id
-        ).scalar() or 0
-        
-        total_expenses = db.query(func.sum(models.Expense.amount)).filter(
-            models.Expense.user_id == user_id
-        ).scalar() or 0
+        total_revenue, total_expenses = db.query(
+            func.sum(models.MonthlyRollup.total_revenue),
+            func.sum(models.MonthlyRollup.total_expenses)
+        ).filter(
+            models.MonthlyRollup.user_id == user_id
+        ).one()
         
-        return float(total_revenue - total_expenses)
+        return float((total_revenue or 0) - (total_expenses or 0))
     
     @staticmethod
+    @stats_cache.cached("monthly", schemas.MonthlyStats)
     def get_monthly_stats(db: Session, user_id: int, year: int, month: int) -> schemas.MonthlyStats:
         """Get monthly statistics for a user"""
-        revenue_sum = db.query(func.sum(models.Revenue.amount)).filter(
-            models.Revenue.user_id == user_id,
-            extract('year', models.Revenue.date) == year,
-            extract('month', models.Revenue.date) == month
-        ).scalar() or 0
+        totals = db.query(
+            models.MonthlyRollup.total_revenue,
+            models.MonthlyRollup.total_expenses
+        ).filter(
+            models.MonthlyRollup.user_id == user_id,
+            models.MonthlyRollup.month == f"{year}-{month:02d}"
+        ).first()
         
-        expense_sum = db.query(func.sum(models.Expense.amount)).filter(
-            models.Expense.user_id == user_id,
-            extract('year', models.Expense.date) == year,
-            extract('month', models.Expense.date) == month
-        ).scalar() or 0
+        revenue_sum, expense_sum = totals if totals else (0, 0)
+
+        # Recurring occurrences not written to the ledger yet
+        first_day = date(year, month, 1)
+        last_day = _next_bucket(first_day, "month") - timedelta(days=1)
+        projected = recurring.projected_by_month(db, user_id, first_day, last_day)
+        for projected_revenue, projected_expenses in projected.values():
+            revenue_sum += projected_revenue
+            expense_sum += projected_expenses
         
         return schemas.MonthlyStats(
             month=f"{year}-{month:02d}",
@@ -42,68 +84,203 @@ class BudgetService:
         )
     
     @staticmethod
+    @stats_cache.cached("categories", List[schemas.CategoryStats])
     def get_category_stats(db: Session, user_id: int, start_date: Optional[date] = None, end_date: Optional[date] = None) -> List[schemas.CategoryStats]:
         """Get expense statistics by category"""
-        query = db.query(
-            models.Category.name,
-            func.sum(models.Expense.amount).label('total')
-        ).join(
-            models.Expense
-        ).filter(
-            models.Expense.user_id == user_id
-        )
-        
-        if start_date:
-            query = query.filter(models.Expense.date >= start_date)
-        if end_date:
-            query = query.filter(models.Expense.date <= end_date)
+        if rollup.covers_whole_months(start_date, end_date):
+            # Whole months can be answered from the per-category rollup
+            total = func.sum(models.CategoryRollup.total_amount)
+            query = db.query(
+                models.Category.name,
+                total.label('total'),
+                func.sum(models.CategoryRollup.expense_count).label('count')
+            ).join(
+                models.CategoryRollup,
+                models.CategoryRollup.category_id == models.Category.id
+            ).filter(
+                models.CategoryRollup.user_id == user_id
+            )
             
-        results = query.group_by(models.Category.name).all()
-        
+            month = models.CategoryRollup.month
+            if start_date:
+                query = query.filter(month >= rollup.month_key(start_date))
+            if end_date:
+                query = query.filter(month <= rollup.month_key(end_date))
+
+            query = query.group_by(models.Category.name).having(
+                func.abs(total) > rollup.TOLERANCE
+            )
+        else:
+            query = db.query(
+                models.Category.name,
+                func.sum(models.Expense.amount).label('total'),
+                func.count(models.Expense.id).label('count')
+            ).join(
+                models.Expense
+            ).filter(
+                models.Expense.user_id == user_id
+            )
+
+            if start_date:
+                query = query.filter(models.Expense.date >= start_date)
+            if end_date:
+                query = query.filter(models.Expense.date <= end_date)
+
+            query = query.group_by(models.Category.name)
+
+        return BudgetService.category_stats_from_rows(query.all())
+
+    @staticmethod
+    def category_stats_from_rows(results) -> List[schemas.CategoryStats]:
+        """CategoryStats from (name, total, count) rows of one user"""
         total_expenses = sum(result.total for result in results)
         
         return [
             schemas.CategoryStats(
                 category_name=result.name,
                 total_amount=float(result.total),
-                percentage=float((result.total / total_expenses) * 100) if total_expenses > 0 else 0
+                percentage=(
+                    float((result.total / total_expenses) * 100)
+                    if total_expenses > 0 else 0
+                ),
+                transaction_count=int(result.count)
             )
             for result in results
         ]
     
     @staticmethod
-    def get_dashboard_stats(db: Session, user_id: int) -> schemas.DashboardStats:
-        """Get comprehensive dashboard statistics"""
-        current_date = datetime.now()
-        current_month = f"{current_date.year}-{current_date.month:02d}"
+    def get_type_stats(db: Session, user_id: int, start_date: date,
+                       end_date: date) -> List[schemas.TypeStats]:
+        """Get expense statistics by expense type"""
+        results = db.query(
+            models.Expense.type,
+            func.sum(models.Expense.amount).label('total')
+        ).filter(
+            models.Expense.user_id == user_id,
+            models.Expense.date >= start_date,
+            models.Expense.date <= end_date
+        ).group_by(models.Expense.type).all()
         
-        # Get current month budget
-        budget = db.query(models.Budget).filter(
-            models.Budget.user_id == user_id,
-            models.Budget.month == current_month
-        ).first()
+        total_expenses = sum(result.total for result in results)
         
-        monthly_budget = float(budget.amount) if budget else 0.0
+        return [
+            schemas.TypeStats(
+                type=result.type or "",
+                total_amount=float(result.total),
+                percentage=(
+                    float((result.total / total_expenses) * 100)
+                    if total_expenses > 0 else 0
+                )
+            )
+            for result in results
+        ]
+
+    @staticmethod
+    @stats_cache.cached("monthly_series", List[schemas.MonthlyStats])
+    def get_monthly_series(db: Session, user_id: int, start_month: str,
+                           end_month: str) -> List[schemas.MonthlyStats]:
+        """Get monthly statistics for every month of an inclusive YYYY-MM range"""
+        rows = db.query(
+            models.MonthlyRollup.month,
+            models.MonthlyRollup.total_revenue,
+            models.MonthlyRollup.total_expenses
+        ).filter(
+            models.MonthlyRollup.user_id == user_id,
+            models.MonthlyRollup.month >= start_month,
+            models.MonthlyRollup.month <= end_month
+        ).all()
+        totals = {row.month: (row.total_revenue, row.total_expenses) for row in rows}
         
-        # Get monthly stats
-        monthly_stats = BudgetService.get_monthly_stats(
-            db, user_id, current_date.year, current_date.month
+        # Recurring occurrences not written to the ledger yet
+        end_year, end_month_number = (int(part) for part in end_month.split("-"))
+        first_day = date(*(int(part) for part in start_month.split("-")), 1)
+        next_month = _next_bucket(date(end_year, end_month_number, 1), "month")
+        projected = recurring.projected_by_month(
+            db, user_id, first_day, next_month - timedelta(days=1)
         )
         
-        # Get category stats for current month
-        start_of_month = date(current_date.year, current_date.month, 1)
-        category_stats = BudgetService.get_category_stats(
-            db, user_id, start_of_month, current_date.date()
-        )
+        series = []
+        for month in rollup.iter_months(start_month, end_month):
+            revenue_sum, expense_sum = totals.get(month, (0, 0))
+            projected_revenue, projected_expenses = projected.get(month, (0, 0))
+            revenue_sum += projected_revenue
+            expense_sum += projected_expenses
+            series.append(schemas.MonthlyStats(
+                month=month,
+                total_revenue=float(revenue_sum),
+                total_expenses=float(expense_sum),
+                balance=float(revenue_sum - expense_sum)
+            ))
+        return series
+
+    @staticmethod
+    def get_timeseries(db: Session, user_id: int, start_date: date, end_date: date,
+                       granularity: str = "month") -> List[schemas.TimeSeriesPoint]:
+        """Get revenue and expense totals per day, week, month or year of a range"""
+        first_bucket = _bucket_start(start_date, granularity)
+        buckets = {}
+        bucket = first_bucket
+        while bucket <= end_date:
+            buckets[bucket] = [0.0, 0.0]
+            if len(buckets) > MAX_TIMESERIES_POINTS:
+                raise ValueError(
+                    f"More than {MAX_TIMESERIES_POINTS} points, "
+                    "use a coarser granularity"
+                )
+            bucket = _next_bucket(bucket, granularity)
         
-        current_balance = BudgetService.calculate_current_balance(db, user_id)
-        budget_remaining = monthly_budget - monthly_stats.total_expenses
+        whole_months = rollup.covers_whole_months(start_date, end_date)
+        if granularity in ("month", "year") and whole_months:
+            # Whole months can be answered from the monthly rollup
+            rows = db.query(
+                models.MonthlyRollup.month,
+                models.MonthlyRollup.total_revenue,
+                models.MonthlyRollup.total_expenses
+            ).filter(
+                models.MonthlyRollup.user_id == user_id,
+                models.MonthlyRollup.month >= rollup.month_key(start_date),
+                models.MonthlyRollup.month <= rollup.month_key(end_date)
+            ).all()
+            for row in rows:
+                year, month = (int(part) for part in row.month.split("-"))
+                totals = buckets[_bucket_start(date(year, month, 1), granularity)]
+                totals[0] += row.total_revenue
+                totals[1] += row.total_expenses
+        else:
+            for index, model in enumerate((models.Revenue, models.Expense)):
+                rows = db.query(
+                    model.date,
+                    func.sum(model.amount).label('total')
+                ).filter(
+                    model.user_id == user_id,
+                    model.date >= start_date,
+                    model.date <= end_date
+                ).group_by(model.date).all()
+                for row in rows:
+                    start = _bucket_start(row.date, granularity)
+                    buckets[start][index] += row.total or 0
         
-        return schemas.DashboardStats(
-            current_balance=current_balance,
-            monthly_budget=monthly_budget,
-            budget_remaining=budget_remaining,
-            total_expenses_this_month=monthly_stats.total_expenses,
-            total_revenue_this_month=monthly_stats.total_revenue,
-            top_categories=category_stats[:5]  # Top 5 categories
-        )
\ No newline at end of file
+        return [
+            schemas.TimeSeriesPoint(
+                period=_bucket_label(bucket, granularity),
+                start_date=bucket,
+                total_revenue=float(revenue_sum),
+                total_expenses=float(expense_sum),
+                balance=float(revenue_sum - expense_sum)
+            )
+            for bucket, (revenue_sum, expense_sum) in buckets.items()
+        ]
+
+    @staticmethod
+    def get_dashboard_stats(db: Session, user_id: int,
+                            today: Optional[date] = None) -> schemas.DashboardStats:
+        """Get comprehensive dashboard statistics"""
+        # Imported here because the engine builds on get_category_stats
+        from services.dashboard_engine import DashboardEngine
+
+        if today is None:
+            today = datetime.now().date()
+        return stats_cache.cache.get_or_load(
+            user_id, "dashboard", (today,), DASHBOARD_ADAPTER,
+            lambda: DashboardEngine.get_dashboard_stats(db, user_id, today)
+        )
@@ -0,0 +1,123 @@
+import json
+from typing import AsyncIterator, Callable, Tuple, Any, Optional
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+import crud
+import schemas
+from config import settings
+
+NDJSON_TYPES = ("application/x-ndjson", "application/jsonl", "application/json-lines")
+
+
+class LineTooLong(ValueError):
+    """An NDJSON line over settings.BULK_IMPORT_MAX_LINE_BYTES"""
+
+
+async def iter_request_rows(
+    request: Request
+) -> AsyncIterator[Tuple[Any, Optional[str]]]:
+    """Yield (row, error) from a JSON array body or, as it arrives, an NDJSON stream"""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+
+    if content_type in NDJSON_TYPES:
+        limit = settings.BULK_IMPORT_MAX_LINE_BYTES
+        # Pieces of the line still missing its newline, joined once it arrives
+        tail, tail_size = [], 0
+        async for chunk in request.stream():
+            lines = chunk.split(b"\n")
+            if len(lines) > 1:
+                lines[0] = b"".join(tail) + lines[0]
+                tail, tail_size = [], 0
+            for line in lines[:-1]:
+                _check_length(len(line), limit)
+                if line.strip():
+                    yield _parse_line(line)
+            tail.append(lines[-1])
+            tail_size += len(lines[-1])
+            _check_length(tail_size, limit)
+        line = b"".join(tail)
+        if line.strip():
+            yield _parse_line(line)
+        return
+
+    try:
+        rows = json.loads(await request.body())
+    except ValueError as exc:
+        raise ValueError(f"Invalid JSON body: {exc}")
+    if not isinstance(rows, list):
+        raise ValueError("Expected a JSON array of rows")
+    for row in rows:
+        yield row, None
+
+
+def _check_length(size: int, limit: int):
+    if size > limit:
+        raise LineTooLong(f"NDJSON line over {limit} bytes")
+
+
+def _parse_line(line: bytes):
+    try:
+        return json.loads(line), None
+    except ValueError as exc:
+        return None, f"Invalid JSON: {exc}"
+
+
+def _location(loc) -> str:
+    return ".".join(str(part) for part in loc) or "row"
+
+
+async def import_rows(
+    request: Request,
+    db: Session,
+    schema: type,
+    writer: Callable,
+    user_id: int,
+    chunk_size: int = crud.BULK_CHUNK_SIZE
+) -> schemas.BulkImportResult:
+    """Validate request rows against schema and write them in chunks
+
+    Every chunk is written in the same transaction.
+    """
+    errors = []
+    inserted = 0
+    chunk, positions = [], []
+
+    async def flush():
+        nonlocal inserted
+        count, row_errors = await run_in_threadpool(
+            writer, db, chunk, user_id, commit=False
+        )
+        inserted += count
+        errors.extend(
+            schemas.BulkRowError(index=positions[p], error=e) for p, e in row_errors
+        )
+        chunk.clear()
+        positions.clear()
+
+    index = 0
+    try:
+        async for row, error in iter_request_rows(request):
+            if error is None:
+                try:
+                    chunk.append(schema.model_validate(row))
+                    positions.append(index)
+                except ValidationError as exc:
+                    error = "; ".join(
+                        f"{_location(e['loc'])}: {e['msg']}" for e in exc.errors()
+                    )
+            if error is not None:
+                errors.append(schemas.BulkRowError(index=index, error=error))
+            index += 1
+            if len(chunk) >= chunk_size:
+                await flush()
+        if chunk:
+            await flush()
+        await run_in_threadpool(db.commit)
+    except BaseException:
+        await run_in_threadpool(db.rollback)
+        raise
+
+    errors.sort(key=lambda e: e.index)
+    return schemas.BulkImportResult(inserted=inserted, errors=errors)
@@ -0,0 +1,338 @@
+"""End-of-month spending forecast per category.
+
+Variable expenses are projected day by day: an exponentially smoothed daily
+spend per category (FORECAST_ALPHA), shaped by the category's share of
+spend on each weekday over its whole history. Fixed expenses are projected
+per month from a smoothed monthly total (FORECAST_MONTHLY_ALPHA), less what
+was already paid this month, and never below the recurring transactions
+still scheduled in it.
+
+A ForecastModel holds the smoothed levels fitted through yesterday, over the
+ledger arrays of services.analytics. Asked again on a later day, it folds
+in only the days since; an expense written today does not touch the fit.
+The model keeps a hash of the expenses it has folded in, and a write dated
+on or before its last fitted day (a backdated expense, an edit, a delete)
+makes it refit from the first expense.
+"""
+import calendar
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict
+import numpy as np
+from sqlalchemy.orm import Session
+from config import settings
+import crud
+import schemas
+from services import analytics, recurring, reference_cache
+from services.rollup import month_key
+
+NO_CATEGORY = -1
+
+
+def _weekday(ordinals: np.ndarray) -> np.ndarray:
+    # date(1, 1, 1), ordinal 1, was a Monday
+    return (ordinals - 1) % 7
+
+
+def _smooth(level: np.ndarray, steps: int, rows: np.ndarray, columns: np.ndarray,
+            amounts: np.ndarray, alpha: float) -> np.ndarray:
+    """Exponential smoothing of level over steps rows, zero but for amounts
+
+    amounts[i] falls in row rows[i] and column columns[i]. Only the nonzero
+    cells are weighted, so a long history of empty days or months costs
+    nothing: no rows x columns matrix is built.
+    """
+    if not steps:
+        return level
+    smoothed = (1 - alpha) ** steps * level
+    weights = alpha * (1 - alpha) ** (steps - 1 - rows)
+    np.add.at(smoothed, columns, weights * amounts)
+    return smoothed
+
+
+def _debiased(level: np.ndarray, steps: int, alpha: float) -> np.ndarray:
+    # The levels start at zero: divide out the weight not yet given to real values
+    weight = 1 - (1 - alpha) ** max(steps, 0)
+    return level / weight if weight > 0 else np.zeros_like(level)
+
+
+def _positions(keys: list, values: np.ndarray) -> np.ndarray:
+    """Position in the sorted list keys of each of values, which all appear in it"""
+    return np.searchsorted(np.array(keys, dtype=np.int64), values)
+
+
+def _category_key(occurrence: schemas.RecurringOccurrence) -> int:
+    return NO_CATEGORY if occurrence.category_id is None else occurrence.category_id
+
+
+def _fingerprint(ledger: analytics.LedgerArrays, fixed: np.ndarray, count: int) -> str:
+    """Hash of the first count expenses, which are sorted by date and id"""
+    digest = hashlib.blake2b(digest_size=16)
+    for column in (ledger.expense_day, ledger.expense_amount, ledger.expense_category,
+                   fixed):
+        digest.update(column[:count].tobytes())
+    return digest.hexdigest()
+
+
+class ForecastModel:
+    """Smoothed spend levels of one user, fitted through the ordinal fitted_through"""
+
+    def __init__(self, first_day: int):
+        self.first_day = first_day
+        self.first_month = int(analytics._month_index(np.array([first_day]))[0])
+        self.fitted_through = first_day - 1
+        self.fitted_month = self.first_month - 1
+        # Category id: column of the level arrays
+        self.columns: Dict[int, int] = {}
+        self.daily_level = np.zeros(0)
+        self.weekday_totals = np.zeros((7, 0))
+        self.monthly_fixed_level = np.zeros(0)
+        self.expenses_seen = 0
+        self.fingerprint = ""
+        self.refitted = True
+
+    @classmethod
+    def fit(cls, ledger: analytics.LedgerArrays, through: int) -> "ForecastModel":
+        fixed = ledger.fixed_mask()
+        days = ledger.expense_day
+        model = cls(int(days[0]) if len(days) else through + 1)
+        model.fingerprint = _fingerprint(ledger, fixed, 0)
+        if through <= model.fitted_through:
+            return model
+        return model._folded(ledger, fixed, through, refitted=True)
+
+    def advanced(self, ledger: analytics.LedgerArrays, through: int) -> "ForecastModel":
+        """The model fitted through the ordinal through
+
+        Only the days since the last fit are folded in.
+        """
+        fixed = ledger.fixed_mask()
+        seen = int(
+            np.searchsorted(ledger.expense_day, self.fitted_through, side="right")
+        )
+        if (not self.expenses_seen or through < self.fitted_through
+                or seen != self.expenses_seen
+                or _fingerprint(ledger, fixed, seen) != self.fingerprint):
+            return ForecastModel.fit(ledger, through)
+        if through == self.fitted_through:
+            return self
+        return self._folded(ledger, fixed, through, refitted=False)
+
+    def _folded(self, ledger: analytics.LedgerArrays, fixed: np.ndarray, through: int,
+                refitted: bool) -> "ForecastModel":
+        """A copy of the model with the days after fitted_through, through through"""
+        start = self.expenses_seen
+        end = int(np.searchsorted(ledger.expense_day, through, side="right"))
+        model = ForecastModel(self.first_day)
+        model.refitted = refitted
+        model.columns = dict(self.columns)
+        for category in np.unique(ledger.expense_category[start:end]):
+            model.columns.setdefault(int(category), len(model.columns))
+        grow = len(model.columns) - len(self.columns)
+        model.daily_level = np.pad(self.daily_level, (0, grow))
+        model.weekday_totals = np.pad(self.weekday_totals, ((0, 0), (0, grow)))
+        model.monthly_fixed_level = np.pad(self.monthly_fixed_level, (0, grow))
+
+        keys = sorted(model.columns)
+        column_of_key = np.array([model.columns[key] for key in keys], dtype=np.int64)
+
+        def columns_of(categories):
+            return column_of_key[_positions(keys, categories)]
+
+        # Variable spend: one step per day since the last fit
+        rows, variable = slice(start, end), ~fixed[start:end]
+        days = ledger.expense_day[rows][variable]
+        amounts = ledger.expense_amount[rows][variable]
+        columns = columns_of(ledger.expense_category[rows][variable])
+        first = self.fitted_through + 1
+        model.daily_level = _smooth(
+            model.daily_level, through - first + 1, days - first, columns, amounts,
+            settings.FORECAST_ALPHA
+        )
+        np.add.at(model.weekday_totals, (_weekday(days), columns), amounts)
+
+        # Fixed spend: one step per month completed since the last fit
+        model.fitted_month = int(analytics._month_index(np.array([through + 1]))[0]) - 1
+        months = ledger.expense_month
+        month_rows = slice(
+            int(np.searchsorted(months, self.fitted_month, side="right")),
+            int(np.searchsorted(months, model.fitted_month, side="right")),
+        )
+        month_fixed = fixed[month_rows]
+        model.monthly_fixed_level = _smooth(
+            model.monthly_fixed_level,
+            max(model.fitted_month - self.fitted_month, 0),
+            ledger.expense_month[month_rows][month_fixed] - self.fitted_month - 1,
+            columns_of(ledger.expense_category[month_rows][month_fixed]),
+            ledger.expense_amount[month_rows][month_fixed],
+            settings.FORECAST_MONTHLY_ALPHA
+        )
+
+        model.fitted_through = through
+        model.expenses_seen = end
+        model.fingerprint = _fingerprint(ledger, fixed, end)
+        return model
+
+    def expected_daily(self) -> np.ndarray:
+        """Expected variable spend per weekday (rows) and column (columns)"""
+        level = _debiased(
+            self.daily_level, self.fitted_through - self.first_day + 1,
+            settings.FORECAST_ALPHA
+        )
+        totals = self.weekday_totals.sum(axis=0)
+        shares = np.divide(
+            7 * self.weekday_totals, totals,
+            out=np.ones_like(self.weekday_totals), where=totals > 0
+        )
+        return shares * level
+
+    def expected_monthly_fixed(self) -> np.ndarray:
+        return _debiased(
+            self.monthly_fixed_level, self.fitted_month - self.first_month + 1,
+            settings.FORECAST_MONTHLY_ALPHA
+        )
+
+
+class ForecastCache:
+    """LRU of fitted models by user; a model is replaced, never changed in place"""
+
+    def __init__(self, max_users: int):
+        self.max_users = max_users
+        self.models: "OrderedDict[int, ForecastModel]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.fits = 0
+        self.updates = 0
+
+    def get(self, ledger: analytics.LedgerArrays, user_id: int,
+            through: int) -> ForecastModel:
+        with self.lock:
+            model = self.models.get(user_id)
+        if model is None:
+            updated = ForecastModel.fit(ledger, through)
+        else:
+            updated = model.advanced(ledger, through)
+        with self.lock:
+            if updated is not model:
+                if updated.refitted:
+                    self.fits += 1
+                else:
+                    self.updates += 1
+            self.models[user_id] = updated
+            self.models.move_to_end(user_id)
+            while len(self.models) > self.max_users:
+                self.models.popitem(last=False)
+        return updated
+
+    def clear(self):
+        with self.lock:
+            self.models.clear()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "users": len(self.models),
+                "max_users": self.max_users,
+                "fits": self.fits,
+                "updates": self.updates,
+            }
+
+
+models_cache = ForecastCache(settings.FORECAST_CACHE_SIZE)
+
+
+def with_forecast(db: Session, stats: schemas.DashboardStats, user_id: int,
+                  today: date) -> schemas.DashboardStats:
+    """A copy of the dashboard stats carrying the forecast of the month in progress"""
+    projection = forecast_month(db, user_id, month_key(today), today)
+    return stats.model_copy(update={"forecast": projection})
+
+
+def forecast_month(db: Session, user_id: int, month: str,
+                   today: date) -> schemas.BudgetForecast:
+    """Spend to date and projected end-of-month spend, overall and by category"""
+    year, month_number = (int(part) for part in month.split("-"))
+    first_day = date(year, month_number, 1)
+    last_day = date(year, month_number, calendar.monthrange(year, month_number)[1])
+    ledger = analytics.ledgers.get(db, user_id)
+    model = models_cache.get(ledger, user_id, today.toordinal() - 1)
+
+    remaining_start = max(today + timedelta(days=1), first_day)
+    remaining_days = max((last_day - remaining_start).days + 1, 0)
+    scheduled_occurrences = (
+        recurring.project(db, user_id, remaining_start, last_day, kind="expense")
+        if remaining_days else []
+    )
+    fixed = ledger.fixed_mask()
+    spent_mask = ledger.expense_mask(first_day, min(today, last_day))
+    categories = sorted(
+        set(model.columns)
+        | {int(category) for category in ledger.expense_category[spent_mask]}
+        | {_category_key(occurrence) for occurrence in scheduled_occurrences}
+    )
+
+    spent_positions = _positions(categories, ledger.expense_category[spent_mask])
+    spent_amounts = ledger.expense_amount[spent_mask]
+    spent = np.bincount(
+        spent_positions, weights=spent_amounts, minlength=len(categories)
+    )
+    fixed_spent = np.bincount(
+        spent_positions, weights=spent_amounts * fixed[spent_mask],
+        minlength=len(categories)
+    )
+    # bincount returns integers when there is nothing to count
+    spent, fixed_spent = spent.astype(np.float64), fixed_spent.astype(np.float64)
+    projected = spent.copy()
+    if remaining_days:
+        scheduled = np.zeros(len(categories))
+        for occurrence in scheduled_occurrences:
+            scheduled[categories.index(_category_key(occurrence))] += occurrence.amount
+
+        # Model columns laid out in the order of categories
+        model_positions = _positions(
+            categories, np.array(sorted(model.columns, key=model.columns.get))
+        )
+        remaining = np.arange(remaining_start.toordinal(), last_day.toordinal() + 1)
+        weekday_counts = np.bincount(_weekday(remaining), minlength=7)
+        projected[model_positions] += weekday_counts @ model.expected_daily()
+        fixed_expected = np.zeros(len(categories))
+        fixed_expected[model_positions] = model.expected_monthly_fixed()
+        projected += np.maximum(fixed_expected - fixed_spent, scheduled)
+
+    budget = crud.get_budget_by_month(db, user_id, month)
+    monthly_budget = float(budget.amount) if budget else 0.0
+    spent_to_date = float(spent.sum())
+    projected_total = float(projected.sum())
+    elapsed_days = max((min(today, last_day) - first_day).days + 1, 0)
+
+    known = reference_cache.categories.resolve(
+        db, [c for c in categories if c != NO_CATEGORY]
+    )
+    names = {category.id: category.name for category in known}
+    by_category = [
+        schemas.CategoryForecast(
+            category_id=category if category != NO_CATEGORY else None,
+            category_name=names.get(category, ""),
+            spent_to_date=round(float(spent[position]), 2),
+            projected_total=round(float(projected[position]), 2),
+        )
+        for position, category in enumerate(categories)
+        if projected[position] > 0
+    ]
+    by_category.sort(key=lambda item: item.projected_total, reverse=True)
+    return schemas.BudgetForecast(
+        month=month,
+        as_of=today,
+        monthly_budget=monthly_budget,
+        spent_to_date=round(spent_to_date, 2),
+        projected_total=round(projected_total, 2),
+        projected_remaining=round(monthly_budget - projected_total, 2),
+        daily_burn_rate=round(spent_to_date / elapsed_days, 2) if elapsed_days else 0.0,
+        safe_daily_spend=(
+            round(max(monthly_budget - spent_to_date, 0.0) / remaining_days, 2)
+            if monthly_budget and remaining_days else None
+        ),
+        overspend_expected=bool(monthly_budget) and projected_total > monthly_budget,
+        categories=by_category,
+    )
@@ -0,0 +1,413 @@
+"""In-process background jobs backed by the jobs table.
+
+Work that should not hold a request open (statement imports, rollup
+rebuilds, alert sweeps, recurring transaction materialization) is enqueued
+as a models.Job row and answered with the job id; GET /jobs/{id} reports
+its progress.
+
+JobRunner is started by the application lifespan. It claims due jobs with
+a conditional UPDATE, so several API workers can share the table, and runs
+their handlers on its own thread pool, at most `concurrency` jobs at once
+per type. A failing job is retried with exponential backoff until it has
+used max_attempts. Running jobs hold a lease that their runner renews; a
+job whose process died is claimed again once its lease has expired.
+
+Handlers are registered with @job_type and called as handler(db, payload)
+in a fresh Session; what they return is stored as the job's JSON result.
+A handler raising JobFailed fails its job at once, without retries.
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+from config import settings
+import models
+import schemas
+from services import alerts, recurring, rollup, statement_import
+
+logger = logging.getLogger(__name__)
+
+SPOOL_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+class JobFailed(Exception):
+    """A failure that retrying cannot fix
+
+    E.g. a record deleted since the job was queued.
+    """
+
+
+class JobType:
+    """A registered handler with its concurrency limit and retry budget"""
+
+    def __init__(self, name: str, handler: Callable, concurrency: int,
+                 max_attempts: int, cleanup: Optional[Callable] = None):
+        self.name = name
+        self.handler = handler
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.cleanup = cleanup
+
+
+JOB_TYPES: Dict[str, JobType] = {}
+
+
+def job_type(name: str, concurrency: int = 1, max_attempts: int = 3,
+             cleanup: Optional[Callable] = None):
+    """Register handler(db, payload) as a job type
+
+    JOB_CONCURRENCY overrides the concurrency limit.
+    """
+    def decorator(handler):
+        limit = settings.JOB_CONCURRENCY.get(name, concurrency)
+        JOB_TYPES[name] = JobType(name, handler, limit, max_attempts, cleanup)
+        return handler
+    return decorator
+
+
+def enqueue(db: Session, name: str, payload: Optional[dict] = None,
+            user_id: Optional[int] = None) -> models.Job:
+    """Commit a queued job and wake the runner of this process"""
+    if name not in JOB_TYPES:
+        raise ValueError(f"Unknown job type {name}")
+    now = datetime.utcnow()
+    job = models.Job(
+        type=name, user_id=user_id, status="queued",
+        payload=json.dumps(payload or {}), attempts=0,
+        max_attempts=JOB_TYPES[name].max_attempts, run_after=now, created_at=now
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    runner.wake()
+    return job
+
+
+def enqueue_once(db: Session, name: str, payload: Optional[dict] = None,
+                 user_id: Optional[int] = None) -> models.Job:
+    """Enqueue, unless the user already has a queued or running job of this type
+
+    That job is returned instead, so repeated requests cannot pile up work.
+    """
+    pending = db.query(models.Job).filter(
+        models.Job.type == name,
+        models.Job.user_id == user_id,
+        models.Job.status.in_(("queued", "running"))
+    ).order_by(models.Job.id).first()
+    if pending is not None:
+        return pending
+    return enqueue(db, name, payload, user_id=user_id)
+
+
+def describe(job: models.Job) -> schemas.Job:
+    return schemas.Job(
+        id=job.id, type=job.type, user_id=job.user_id, status=job.status,
+        attempts=job.attempts, max_attempts=job.max_attempts,
+        result=json.loads(job.result) if job.result else None,
+        last_error=job.last_error,
+        run_after=job.run_after, created_at=job.created_at,
+        started_at=job.started_at, finished_at=job.finished_at
+    )
+
+
+def spool_upload(upload: BinaryIO) -> str:
+    """Copy an upload to JOB_SPOOL_DIR and return its spool id
+
+    The spooled copy outlives the request.
+    """
+    os.makedirs(settings.JOB_SPOOL_DIR, exist_ok=True)
+    spool_id = uuid.uuid4().hex
+    with open(spool_path(spool_id), "wb") as spooled:
+        shutil.copyfileobj(upload, spooled)
+    return spool_id
+
+
+def spool_path(spool_id) -> str:
+    """Path of a spooled upload; payloads carry ids, never paths"""
+    if not isinstance(spool_id, str) or not SPOOL_ID_PATTERN.match(spool_id):
+        raise JobFailed(f"Invalid spool id {spool_id!r}")
+    return os.path.join(settings.JOB_SPOOL_DIR, spool_id)
+
+
+def _due(now: datetime):
+    """Queued jobs whose retry time has come, and running jobs whose lease expired"""
+    return or_(
+        and_(models.Job.status == "queued", models.Job.run_after <= now),
+        and_(models.Job.status == "running", models.Job.lease_expires_at < now)
+    )
+
+
+class JobRunner:
+    """Claims due jobs from the table and runs them on a thread pool"""
+
+    def __init__(self, workers: int, poll_interval: float):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.session_factory = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.wakeup: Optional[asyncio.Event] = None
+        self.task: Optional[asyncio.Task] = None
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.running: Dict[int, str] = {}
+        self.tasks = set()
+        self.lock = threading.Lock()
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+        self.renewed_at = 0.0
+
+    async def start(self, session_factory):
+        self.session_factory = session_factory
+        self.loop = asyncio.get_running_loop()
+        self.wakeup = asyncio.Event()
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="job"
+        )
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self, grace: float = 10.0):
+        """Stop claiming and give running jobs grace seconds
+
+        Jobs still running afterwards resume elsewhere once their lease expires.
+        """
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        if self.tasks:
+            await asyncio.wait(set(self.tasks), timeout=grace)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.task = self.loop = self.wakeup = self.executor = None
+
+    def wake(self):
+        """Claim now rather than at the next poll; safe to call from any thread"""
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._set_wakeup)
+
+    def _set_wakeup(self):
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    async def _run(self):
+        while True:
+            self.wakeup.clear()
+            try:
+                await run_in_threadpool(self._renew_leases)
+                for job_id, name in await run_in_threadpool(self._claim):
+                    self._launch(job_id, name)
+            except Exception:
+                logger.exception("Job runner could not claim jobs")
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _claim(self) -> List[Tuple[int, str]]:
+        running = {}
+        for name in list(self.running.values()):
+            running[name] = running.get(name, 0) + 1
+        db = self.session_factory()
+        try:
+            claimed = []
+            for name, spec in JOB_TYPES.items():
+                free = spec.concurrency - running.get(name, 0)
+                if free <= 0:
+                    continue
+                now = datetime.utcnow()
+                candidates = db.query(models.Job.id).filter(
+                    models.Job.type == name, _due(now)
+                ).order_by(models.Job.id).limit(free).all()
+                for (job_id,) in candidates:
+                    # Another worker may have claimed it since the SELECT
+                    lease = timedelta(seconds=settings.JOB_LEASE_SECONDS)
+                    updated = db.query(models.Job).filter(
+                        models.Job.id == job_id, _due(now)
+                    ).update({
+                        models.Job.status: "running",
+                        models.Job.attempts: models.Job.attempts + 1,
+                        models.Job.started_at: now,
+                        models.Job.lease_expires_at: now + lease,
+                    }, synchronize_session=False)
+                    db.commit()
+                    if updated:
+                        claimed.append((job_id, name))
+            return claimed
+        finally:
+            db.close()
+
+    def _renew_leases(self):
+        job_ids = list(self.running)
+        since_renewal = time.monotonic() - self.renewed_at
+        if not job_ids or since_renewal < settings.JOB_LEASE_SECONDS / 3:
+            return
+        lease = timedelta(seconds=settings.JOB_LEASE_SECONDS)
+        db = self.session_factory()
+        try:
+            db.query(models.Job).filter(
+                models.Job.id.in_(job_ids), models.Job.status == "running"
+            ).update({
+                models.Job.lease_expires_at: datetime.utcnow() + lease
+            }, synchronize_session=False)
+            db.commit()
+            self.renewed_at = time.monotonic()
+        finally:
+            db.close()
+
+    def _launch(self, job_id: int, name: str):
+        self.running[job_id] = name
+        task = asyncio.create_task(self._execute(job_id, name))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _execute(self, job_id: int, name: str):
+        try:
+            await self.loop.run_in_executor(self.executor, self._perform, job_id, name)
+        except Exception:
+            logger.exception("Job %s could not be recorded", job_id)
+        finally:
+            self.running.pop(job_id, None)
+            # A slot of this type is free again
+            self.wakeup.set()
+
+    def _perform(self, job_id: int, name: str):
+        spec = JOB_TYPES[name]
+        db = self.session_factory()
+        try:
+            payload = json.loads(db.get(models.Job, job_id).payload or "{}")
+            try:
+                result = spec.handler(db, payload)
+            except Exception as exc:
+                logger.exception("Job %s (%s) failed", job_id, name)
+                db.rollback()
+                finished = self._record_failure(db.get(models.Job, job_id), exc)
+            else:
+                job = db.get(models.Job, job_id)
+                job.status = "succeeded"
+                if result is not None:
+                    job.result = json.dumps(result, default=str)
+                job.finished_at = datetime.utcnow()
+                job.lease_expires_at = None
+                with self.lock:
+                    self.succeeded += 1
+                finished = True
+            db.commit()
+            if finished and spec.cleanup:
+                spec.cleanup(payload)
+        finally:
+            db.close()
+
+    def _record_failure(self, job: models.Job, exc: Exception) -> bool:
+        """Requeue job with backoff or mark it failed
+
+        True when the job will not run again.
+        """
+        now = datetime.utcnow()
+        job.last_error = f"{type(exc).__name__}: {exc}"[:255]
+        job.lease_expires_at = None
+        if job.attempts < job.max_attempts and not isinstance(exc, JobFailed):
+            job.status = "queued"
+            backoff = settings.JOB_RETRY_BACKOFF * 2 ** (job.attempts - 1)
+            job.run_after = now + timedelta(seconds=backoff)
+            with self.lock:
+                self.retried += 1
+            return False
+        job.status = "failed"
+        job.finished_at = now
+        with self.lock:
+            self.failed += 1
+        return True
+
+    def stats(self) -> dict:
+        running = {}
+        for name in list(self.running.values()):
+            running[name] = running.get(name, 0) + 1
+        with self.lock:
+            return {
+                "started": self.task is not None,
+                "workers": self.workers,
+                "concurrency": {
+                    name: spec.concurrency for name, spec in JOB_TYPES.items()
+                },
+                "running": running,
+                "succeeded": self.succeeded,
+                "failed": self.failed,
+                "retried": self.retried,
+            }
+
+
+runner = JobRunner(settings.JOB_WORKERS, settings.JOB_POLL_INTERVAL)
+
+
+# Job types
+
+@job_type("rollup_rebuild", concurrency=1)
+def rebuild_rollups(db: Session, payload: dict) -> dict:
+    return {"rows": rollup.rebuild(db, payload.get("user_id"))}
+
+
+@job_type("alert_sweep", concurrency=1)
+def sweep_alerts(db: Session, payload: dict) -> dict:
+    return {"raised": alerts.sweep(db, payload.get("chunk_size"))}
+
+
+@job_type("recurring_materialize", concurrency=1)
+def materialize_recurring(db: Session, payload: dict) -> dict:
+    return {"written": recurring.materialize(db, user_id=payload.get("user_id"))}
+
+
+def schedule_rollup_backfill(db: Session) -> Optional[models.Job]:
+    """Queue a full rollup rebuild when an upgraded database has none yet
+
+    Statistics read the rollups only, so until the rebuild runs they show zeros.
+    Skipped when a rebuild is already queued, e.g. by another worker.
+    """
+    if not rollup.needs_backfill(db):
+        return None
+    pending = db.query(models.Job.id).filter(
+        models.Job.type == "rollup_rebuild",
+        models.Job.status.in_(("queued", "running"))
+    ).first()
+    if pending is not None:
+        return None
+    logger.warning(
+        "Rollup tables are empty but the ledger is not: queued a rollup_rebuild job. "
+        "Statistics read zero until it finishes; a worker with JOBS_ENABLED runs it, "
+        "or run 'python -m services.rollup rebuild' by hand"
+    )
+    return enqueue(db, "rollup_rebuild")
+
+
+def _remove_spooled_file(payload: dict):
+    try:
+        os.remove(spool_path(payload.get("spool_id")))
+    except (JobFailed, OSError):
+        pass
+
+
+@job_type("statement_import", concurrency=2, cleanup=_remove_spooled_file)
+def import_statement(db: Session, payload: dict) -> dict:
+    # A retry resumes after the last committed batch,
+    # see statement_import.run_import
+    record = db.get(models.StatementImport, payload.get("import_id"))
+    if record is None:
+        raise JobFailed(f"Statement import {payload.get('import_id')} not found")
+    if record.status != "completed":
+        spooled = open(spool_path(payload.get("spool_id")), "rb")
+        with statement_import.open_text(spooled) as stream:
+            statement_import.run_import(db, record, stream, payload["category_id"])
+    return statement_import.describe(record).model_dump(mode="json")
@@ -0,0 +1,94 @@
+"""Streaming CSV / NDJSON export of a user's ledger.
+
+Rows are read as plain column tuples through a server-side cursor
+(yield_per), never hydrated into ORM objects or Pydantic models, and encoded
+in chunks, so memory stays flat whatever the size of the ledger.
+"""
+import csv
+import io
+import json
+from datetime import date
+from typing import Iterator, Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+import models
+
+EXPORT_CHUNK_SIZE = 1000
+
+EXPENSE_COLUMNS = (
+    "id", "date", "amount", "description", "type", "category_id", "category"
+)
+REVENUE_COLUMNS = ("id", "date", "amount", "source")
+
+
+def expense_statement(user_id: int, start_date: Optional[date] = None,
+                      end_date: Optional[date] = None):
+    stmt = select(
+        models.Expense.id,
+        models.Expense.date,
+        models.Expense.amount,
+        models.Expense.description,
+        models.Expense.type,
+        models.Expense.category_id,
+        models.Category.name.label("category")
+    ).outerjoin(
+        models.Category, models.Category.id == models.Expense.category_id
+    ).where(models.Expense.user_id == user_id)
+    if start_date:
+        stmt = stmt.where(models.Expense.date >= start_date)
+    if end_date:
+        stmt = stmt.where(models.Expense.date <= end_date)
+    return stmt.order_by(models.Expense.date, models.Expense.id)
+
+
+def revenue_statement(user_id: int, start_date: Optional[date] = None,
+                      end_date: Optional[date] = None):
+    stmt = select(
+        models.Revenue.id,
+        models.Revenue.date,
+        models.Revenue.amount,
+        models.Revenue.source
+    ).where(models.Revenue.user_id == user_id)
+    if start_date:
+        stmt = stmt.where(models.Revenue.date >= start_date)
+    if end_date:
+        stmt = stmt.where(models.Revenue.date <= end_date)
+    return stmt.order_by(models.Revenue.date, models.Revenue.id)
+
+
+def iter_rows(db: Session, stmt) -> Iterator[tuple]:
+    """Stream result tuples from a server-side cursor, one chunk at a time"""
+    result = db.execute(stmt.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+    try:
+        for partition in result.partitions():
+            yield from partition
+    finally:
+        result.close()
+
+
+def encode_csv(rows: Iterator[tuple], columns) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count % EXPORT_CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def encode_ndjson(rows: Iterator[tuple], columns) -> Iterator[str]:
+    lines = []
+    for row in rows:
+        record = dict(zip(columns, row))
+        record["date"] = record["date"].isoformat() if record["date"] else None
+        lines.append(json.dumps(record))
+        if len(lines) == EXPORT_CHUNK_SIZE:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
@@ -0,0 +1,329 @@
+"""Per-route request timings and a slow-query log.
+
+InstrumentationMiddleware keeps a RequestMetrics in a context variable for
+the duration of each request. Engine-level cursor events add every SQL
+statement's time, and the rows it returned, to the current request, and
+log the statements slower than SLOW_QUERY_MS whether or not they run in a
+request (jobs, CLIs). Routes built with TimedRoute also record when their
+endpoint returned, which separates response serialization from the
+handler's own work.
+
+Totals are kept per method and route template and rendered in the
+Prometheus text format by GET /metrics. With SERVER_TIMING enabled, a
+request sending `X-Server-Timing: 1` gets them back in a Server-Timing
+response header.
+"""
+import functools
+import inspect
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of the request duration histogram
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_START_KEY = "metrics_query_start"
+MAX_LOGGED_PARAMETERS = 500
+DURATION = "budgetwise_request_duration_seconds"
+
+
+class RequestMetrics:
+    """What one request spent, filled in as it runs"""
+
+    __slots__ = (
+        "started", "db_seconds", "queries", "rows", "endpoint_returned",
+        "serialize_seconds",
+    )
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_seconds = 0.0
+        self.queries = 0
+        self.rows = 0
+        self.endpoint_returned: Optional[float] = None
+        self.serialize_seconds = 0.0
+
+    def server_timing(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        return (
+            f"db;dur={self.db_seconds * 1000:.1f};"
+            f'desc="{self.queries} queries, {self.rows} rows", '
+            f"serialize;dur={self.serialize_seconds * 1000:.1f}, "
+            f"app;dur={elapsed * 1000:.1f}"
+        )
+
+
+_current: ContextVar[Optional[RequestMetrics]] = ContextVar(
+    "request_metrics", default=None
+)
+
+
+class RouteStats:
+    """Totals of every request served by one route"""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.seconds = 0.0
+        self.db_seconds = 0.0
+        self.queries = 0
+        self.rows = 0
+        self.serialize_seconds = 0.0
+
+
+class MetricsRegistry:
+    """Per-route totals and slow-query count, rendered for Prometheus"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes: Dict[Tuple[str, str], RouteStats] = {}
+        self.slow_queries = 0
+
+    def observe(self, method: str, route: str, status: int, seconds: float,
+                request: RequestMetrics):
+        with self.lock:
+            stats = self.routes.get((method, route))
+            if stats is None:
+                stats = self.routes[(method, route)] = RouteStats()
+            stats.count += 1
+            if status >= 500:
+                stats.errors += 1
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    stats.buckets[index] += 1
+                    break
+            stats.seconds += seconds
+            stats.db_seconds += request.db_seconds
+            stats.queries += request.queries
+            stats.rows += request.rows
+            stats.serialize_seconds += request.serialize_seconds
+
+    def count_slow_query(self):
+        with self.lock:
+            self.slow_queries += 1
+
+    def reset(self):
+        with self.lock:
+            self.routes.clear()
+            self.slow_queries = 0
+
+    def render(self, gauges: Optional[Dict[str, float]] = None) -> str:
+        """Prometheus text exposition of the route totals, plus unlabelled gauges"""
+        with self.lock:
+            routes = sorted(self.routes.items())
+            lines: List[str] = [
+                f"# HELP {DURATION} Wall time of the requests, by route",
+                f"# TYPE {DURATION} histogram",
+            ]
+            for (method, route), stats in routes:
+                labels = f'method="{method}",route="{_escape(route)}"'
+                cumulative = 0
+                for bound, count in zip(DURATION_BUCKETS, stats.buckets):
+                    cumulative += count
+                    bucket = f'{labels},le="{bound}"'
+                    lines.append(f"{DURATION}_bucket{{{bucket}}} {cumulative}")
+                lines.append(f'{DURATION}_bucket{{{labels},le="+Inf"}} {stats.count}')
+                lines.append(f"{DURATION}_sum{{{labels}}} {stats.seconds:.6f}")
+                lines.append(f"{DURATION}_count{{{labels}}} {stats.count}")
+
+            counters = (
+                ("request_errors_total", "Requests answered with a 5xx status",
+                 "errors", "{}"),
+                ("request_db_seconds_total", "Time spent in SQL statements",
+                 "db_seconds", "{:.6f}"),
+                ("request_queries_total", "SQL statements executed",
+                 "queries", "{}"),
+                ("request_rows_total",
+                 "Rows returned by SQL statements, where the driver reports them",
+                 "rows", "{}"),
+                ("request_serialization_seconds_total",
+                 "Time spent serializing responses", "serialize_seconds", "{:.6f}"),
+            )
+            for name, help_text, attribute, number in counters:
+                lines.append(f"# HELP budgetwise_{name} {help_text}, by route")
+                lines.append(f"# TYPE budgetwise_{name} counter")
+                for (method, route), stats in routes:
+                    value = number.format(getattr(stats, attribute))
+                    labels = f'method="{method}",route="{_escape(route)}"'
+                    lines.append(f"budgetwise_{name}{{{labels}}} {value}")
+
+            lines.append(
+                "# HELP budgetwise_slow_queries_total "
+                f"SQL statements slower than {settings.SLOW_QUERY_MS} ms"
+            )
+            lines.append("# TYPE budgetwise_slow_queries_total counter")
+            lines.append(f"budgetwise_slow_queries_total {self.slow_queries}")
+
+        for name, value in (gauges or {}).items():
+            lines.append(f"# TYPE budgetwise_{name} gauge")
+            lines.append(f"budgetwise_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+registry = MetricsRegistry()
+
+
+# SQL statements, for every engine including the async engines' sync side
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault(QUERY_START_KEY, []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get(QUERY_START_KEY)
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+
+    request = _current.get()
+    if request is not None:
+        request.db_seconds += elapsed
+        request.queries += 1
+        # SQLite reports -1 for SELECTs; MySQL and PostgreSQL count the fetched rows
+        if cursor.description is not None and cursor.rowcount > 0:
+            request.rows += cursor.rowcount
+
+    if settings.SLOW_QUERY_MS and elapsed * 1000 >= settings.SLOW_QUERY_MS:
+        registry.count_slow_query()
+        logger.warning(
+            "Slow query (%.1f ms): %s parameters=%s",
+            elapsed * 1000, " ".join(statement.split()),
+            _loggable_parameters(parameters, executemany)
+        )
+
+
+def _parameter_types(parameters) -> str:
+    if isinstance(parameters, dict):
+        types = (f"{name}: {type(value).__name__}" for name, value in
+                 parameters.items())
+        return "{" + ", ".join(types) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(type(value).__name__ for value in parameters) + ")"
+    return type(parameters).__name__
+
+
+def _loggable_parameters(parameters, executemany: bool) -> str:
+    """The parameters with SLOW_QUERY_LOG_PARAMETERS, else only their count and types
+
+    Values are emails, password hashes and amounts, which do not belong in
+    logs by default.
+    """
+    if settings.SLOW_QUERY_LOG_PARAMETERS:
+        logged = repr(parameters)
+    elif executemany and parameters:
+        logged = f"{len(parameters)} rows of {_parameter_types(parameters[0])}"
+    else:
+        logged = _parameter_types(parameters)
+    return logged[:MAX_LOGGED_PARAMETERS]
+
+
+def _mark_endpoint_returned():
+    request = _current.get()
+    if request is not None:
+        request.endpoint_returned = time.perf_counter()
+
+
+def _timed_endpoint(endpoint):
+    if getattr(endpoint, "timed_endpoint", False):
+        return endpoint
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def timed(*args, **kwargs):
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                _mark_endpoint_returned()
+    else:
+        @functools.wraps(endpoint)
+        def timed(*args, **kwargs):
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                _mark_endpoint_returned()
+    timed.timed_endpoint = True
+    return timed
+
+
+class TimedRoute(APIRoute):
+    """APIRoute charging the time from its endpoint's return to serialization"""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        # Streaming endpoints serialize as they go, there is no single return to time
+        streaming = (
+            inspect.isgeneratorfunction(endpoint)
+            or inspect.isasyncgenfunction(endpoint)
+        )
+        if not streaming:
+            endpoint = _timed_endpoint(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            response = await handler(request)
+            metrics = _current.get()
+            if metrics is not None and metrics.endpoint_returned is not None:
+                returned = metrics.endpoint_returned
+                metrics.serialize_seconds += time.perf_counter() - returned
+            return response
+        return timed_handler
+
+
+def _route_label(scope) -> str:
+    # The template, not the raw path, so ids do not multiply the series
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class InstrumentationMiddleware:
+    """Pure ASGI middleware recording every HTTP request in the registry"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request = RequestMetrics()
+        token = _current.set(request)
+        status = [500]
+        server_timing = (
+            settings.SERVER_TIMING
+            and (b"x-server-timing", b"1") in scope.get("headers", [])
+        )
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                if server_timing:
+                    MutableHeaders(scope=message).append(
+                        "Server-Timing", request.server_timing()
+                    )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            registry.observe(
+                scope["method"], _route_label(scope), status[0],
+                time.perf_counter() - request.started, request
+            )
@@ -0,0 +1,302 @@
+"""Recurring expenses and revenues, expanded lazily.
+
+A models.RecurringTransaction rule (monthly on day N, or weekly on a
+weekday, every `interval` months or weeks) is never expanded up front.
+Occurrences up to the rule's materialized_through date are real expense or
+revenue rows, written through crud so the rollups and alerts follow; later
+occurrences are computed when they are read. The statistics add these
+projected occurrences to the rollup totals (projected_by_month) and
+GET /recurring/occurrences lists them (project).
+
+materialize() writes the occurrences that have become past-dated, a chunk
+of rules per transaction. It runs as the recurring_materialize job, or
+nightly from the backend directory:
+
+    python -m services.recurring materialize [--user-id ID]
+
+Runs may overlap (a job on each worker, the command line): each rule is
+claimed with a conditional UPDATE of its materialized_through before its
+rows are written, so only one run writes a given occurrence.
+"""
+import argparse
+import calendar
+import itertools
+import logging
+import sys
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+from config import settings
+import crud
+import models
+import schemas
+from services.rollup import month_key
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("expense", "revenue")
+FREQUENCIES = ("monthly", "weekly")
+# Occurrences one projection may expand, and one rule may write per run
+MAX_OCCURRENCES = 10000
+
+
+def validate(rule: schemas.RecurringTransactionCreate):
+    """Raise ValueError when rule cannot be expanded"""
+    if rule.kind not in KINDS:
+        raise ValueError(f"kind must be one of {', '.join(KINDS)}")
+    if rule.frequency not in FREQUENCIES:
+        raise ValueError(f"frequency must be one of {', '.join(FREQUENCIES)}")
+    if rule.interval < 1:
+        raise ValueError("interval must be at least 1")
+    if rule.frequency == "monthly" and not 1 <= rule.day <= 31:
+        raise ValueError("day must be a day of the month, 1 to 31")
+    if rule.frequency == "weekly" and not 0 <= rule.day <= 6:
+        raise ValueError("day must be a weekday, 0 (Monday) to 6")
+    if rule.kind == "expense" and rule.category_id is None:
+        raise ValueError("category_id is required for a recurring expense")
+    if rule.end_date and rule.end_date < rule.start_date:
+        raise ValueError("end_date is before start_date")
+
+
+def occurrences(rule: models.RecurringTransaction, start: date,
+                end: date) -> Iterator[date]:
+    """Dates on which rule occurs within the inclusive range [start, end]
+
+    Computed from the range itself, not by walking from the rule's start. A
+    monthly day past the end of a month falls on its last day.
+    """
+    start = max(start, rule.start_date)
+    if rule.end_date:
+        end = min(end, rule.end_date)
+    if end < start:
+        return
+    interval = rule.interval or 1
+
+    if rule.frequency == "weekly":
+        step = timedelta(weeks=interval)
+        offset = (rule.day - rule.start_date.weekday()) % 7
+        day = rule.start_date + timedelta(days=offset)
+        if day < start:
+            day += step * -(-(start - day).days // step.days)
+        while day <= end:
+            yield day
+            day += step
+        return
+
+    # Months are counted from the rule's first month, so every interval-th one is due
+    origin = rule.start_date.year * 12 + rule.start_date.month - 1
+    index = start.year * 12 + start.month - 1
+    index += (origin - index) % interval
+    while True:
+        year, month = divmod(index, 12)
+        last_day = calendar.monthrange(year, month + 1)[1]
+        day = date(year, month + 1, min(rule.day, last_day))
+        if day > end:
+            return
+        if day >= start:
+            yield day
+        index += interval
+
+
+def pending_start(rule: models.RecurringTransaction) -> date:
+    """First date whose occurrence is not in the ledger yet"""
+    if rule.materialized_through is None:
+        return rule.start_date
+    return rule.materialized_through + timedelta(days=1)
+
+
+def _rules(db: Session, user_id: int,
+           kind: Optional[str] = None) -> List[models.RecurringTransaction]:
+    query = db.query(models.RecurringTransaction).filter(
+        models.RecurringTransaction.user_id == user_id
+    )
+    if kind:
+        query = query.filter(models.RecurringTransaction.kind == kind)
+    return query.all()
+
+
+def _pending(rules: Iterable[models.RecurringTransaction], start: date,
+             end: date) -> Iterator[Tuple[models.RecurringTransaction, date]]:
+    """(rule, day) of the unmaterialized occurrences in [start, end]
+
+    Raises ValueError past MAX_OCCURRENCES, before expanding any further.
+    """
+    count = 0
+    for rule in rules:
+        for day in occurrences(rule, max(start, pending_start(rule)), end):
+            count += 1
+            if count > MAX_OCCURRENCES:
+                raise ValueError(
+                    f"More than {MAX_OCCURRENCES} recurring occurrences, "
+                    "shorten the range"
+                )
+            yield rule, day
+
+
+def project(db: Session, user_id: int, start: date, end: date,
+            kind: Optional[str] = None) -> List[schemas.RecurringOccurrence]:
+    """Occurrences in [start, end] that are not materialized yet, newest first"""
+    projected = [
+        schemas.RecurringOccurrence(
+            recurring_id=rule.id, kind=rule.kind, date=day, amount=rule.amount,
+            label=rule.label, category_id=rule.category_id, type=rule.type
+        )
+        for rule, day in _pending(_rules(db, user_id, kind), start, end)
+    ]
+    projected.sort(key=lambda o: (o.date, o.recurring_id), reverse=True)
+    return projected
+
+
+def projected_by_month(db: Session, user_id: int, start: date,
+                       end: date) -> Dict[str, List[float]]:
+    """[revenue, expenses] of the unmaterialized occurrences in [start, end]
+
+    Keyed by YYYY-MM month.
+    """
+    return projected_by_user(db, [user_id], start, end).get(user_id, {})
+
+
+def projected_by_user(db: Session, user_ids: List[int], start: date,
+                      end: date) -> Dict[int, Dict[str, List[float]]]:
+    """projected_by_month for several users, with one query for their rules"""
+    rules = db.query(models.RecurringTransaction).filter(
+        models.RecurringTransaction.user_id.in_(user_ids)
+    ).order_by(models.RecurringTransaction.id).all()
+    totals: Dict[int, Dict[str, List[float]]] = defaultdict(
+        lambda: defaultdict(lambda: [0.0, 0.0])
+    )
+    for rule, day in _pending(rules, start, end):
+        column = 0 if rule.kind == "revenue" else 1
+        totals[rule.user_id][month_key(day)][column] += rule.amount
+    return totals
+
+
+def _occurrence_rows(rule: models.RecurringTransaction, days: List[date]) -> list:
+    if rule.kind == "expense":
+        return [
+            schemas.ExpenseCreate(
+                amount=rule.amount, description=rule.label, date=day,
+                type=rule.type or "fixed", category_id=rule.category_id
+            )
+            for day in days
+        ]
+    return [
+        schemas.RevenueCreate(amount=rule.amount, source=rule.label, date=day)
+        for day in days
+    ]
+
+
+def materialize(db: Session, today: Optional[date] = None,
+                user_id: Optional[int] = None, chunk_size: int = None) -> int:
+    """Write every past occurrence not in the ledger yet; returns the rows written
+
+    Rules are read in id order, chunk_size at a time. Each rule is claimed
+    by moving its materialized_through from the value read to the last day
+    written, and skipped when another run got there first. The occurrences
+    of a chunk go through crud's bulk writers, one call per user and kind,
+    and commit together with the claims. A rule whose rows were rejected
+    gets its materialized_through back, so its occurrences stay projected
+    and are retried on the next run. A rule writes at most MAX_OCCURRENCES
+    rows per run, the next runs carry on from there.
+    """
+    today = today or date.today()
+    chunk_size = chunk_size or settings.RECURRING_MATERIALIZE_CHUNK_SIZE
+    written = 0
+    last_id = 0
+    while True:
+        query = db.query(models.RecurringTransaction).filter(
+            models.RecurringTransaction.id > last_id,
+            models.RecurringTransaction.start_date <= today,
+            or_(
+                models.RecurringTransaction.materialized_through.is_(None),
+                models.RecurringTransaction.materialized_through < today
+            )
+        )
+        if user_id is not None:
+            query = query.filter(models.RecurringTransaction.user_id == user_id)
+        rules = query.order_by(models.RecurringTransaction.id).limit(chunk_size).all()
+        if not rules:
+            return written
+
+        batches = defaultdict(list)
+        claimed = []
+        for rule in rules:
+            days = list(itertools.islice(
+                occurrences(rule, pending_start(rule), today), MAX_OCCURRENCES
+            ))
+            through = days[-1] if len(days) == MAX_OCCURRENCES else today
+            if not _claim(db, rule, through):
+                continue
+            claimed.append(rule)
+            batches[(rule.user_id, rule.kind)].extend(
+                (rule, row) for row in _occurrence_rows(rule, days)
+            )
+        failed = set()
+        for (owner_id, kind), entries in batches.items():
+            if kind == "expense":
+                writer = crud.bulk_create_expenses
+            else:
+                writer = crud.bulk_create_revenues
+            rows = [row for _, row in entries]
+            inserted, errors = writer(db, rows, owner_id, commit=False)
+            written += inserted
+            for position, error in errors:
+                rule, row = entries[position]
+                failed.add(rule.id)
+                logger.warning("Recurring %s %s of user %s on %s not written: %s",
+                               kind, rule.id, owner_id, row.date, error)
+        # The rows of a rule share its category, so they are rejected together
+        for rule in claimed:
+            if rule.id in failed:
+                # Back to the value read; other runs skip it until this commits
+                db.execute(
+                    update(models.RecurringTransaction).where(
+                        models.RecurringTransaction.id == rule.id
+                    ).values(materialized_through=rule.materialized_through)
+                    .execution_options(synchronize_session=False)
+                )
+        db.commit()
+        last_id = rules[-1].id
+
+
+def _claim(db: Session, rule: models.RecurringTransaction, through: date) -> bool:
+    """Move rule's materialized_through to through, unless another run moved it
+
+    The loaded rule keeps the value it was read with, which the UPDATE
+    compares against; it blocks on a concurrent claim until that commits.
+    """
+    rules = models.RecurringTransaction
+    if rule.materialized_through is None:
+        current = rules.materialized_through.is_(None)
+    else:
+        current = rules.materialized_through == rule.materialized_through
+    result = db.execute(
+        update(rules).where(rules.id == rule.id, current).values(
+            materialized_through=through
+        ).execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def main(argv=None):
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(
+        description="Write the recurring transactions that are now past-dated"
+    )
+    parser.add_argument("command", choices=["materialize"])
+    parser.add_argument("--user-id", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        print(f"Wrote {materialize(db, user_id=args.user_id)} occurrences")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""Process-wide snapshots of the categories and tags reference tables.
+
+Both tables are small, shared by every user and only change through
+crud.create_category / crud.create_tag, which invalidate the matching
+snapshot. Snapshots also expire after REFERENCE_CACHE_TTL seconds so that
+rows written by other worker processes show up without a restart, and an
+unknown id reloads a snapshot at most once every REFERENCE_CACHE_MIN_RELOAD
+seconds, so requests naming ids that do not exist cannot force a reload each.
+
+Snapshot rows are detached ORM instances loaded in a private session; the
+write path attaches them with Session.merge(load=False), which costs no
+SELECT.
+"""
+import hashlib
+import threading
+import time
+from typing import Dict, Iterable, List
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from config import settings
+import models
+import schemas
+
+
+class Snapshot:
+    def __init__(self, version: int, rows: list, schema):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.rows = rows
+        self.by_id: Dict[int, object] = {row.id: row for row in rows}
+        self.items = [schema.model_validate(row) for row in rows]
+        digest = hashlib.sha1(
+            "\n".join(f"{item.id}:{item.name}" for item in self.items).encode()
+        ).hexdigest()[:16]
+        self.digest = digest
+
+    def etag(self, *params) -> str:
+        # Derived from the content, so every worker process agrees on it
+        suffix = "-".join(str(param) for param in params)
+        return f'W/"{self.digest}-{suffix}"' if suffix else f'W/"{self.digest}"'
+
+
+class ReferenceTable:
+    """Versioned in-memory copy of one reference table"""
+
+    def __init__(self, model, schema, ttl: float, min_reload: float = 0):
+        self.model = model
+        self.schema = schema
+        self.ttl = ttl
+        self.min_reload = min_reload
+        self.version = 0
+        self.loads = 0
+        self._snapshot = None
+        self.lock = threading.Lock()
+
+    def _is_fresh(self, snapshot) -> bool:
+        return (
+            snapshot is not None
+            and snapshot.version == self.version
+            and time.monotonic() - snapshot.loaded_at < self.ttl
+        )
+
+    def snapshot(self, db: Session) -> Snapshot:
+        snapshot = self._snapshot
+        if self._is_fresh(snapshot):
+            return snapshot
+        with self.lock:
+            if not self._is_fresh(self._snapshot):
+                version = self.version
+                # A private session keeps the caller's identity map untouched
+                with Session(db.get_bind()) as loader:
+                    statement = select(self.model).order_by(self.model.id)
+                    rows = loader.scalars(statement).all()
+                self._snapshot = Snapshot(version, list(rows), self.schema)
+                self.loads += 1
+            return self._snapshot
+
+    def invalidate(self):
+        with self.lock:
+            self.version += 1
+            self._snapshot = None
+
+    def _reload_unless_recent(self, db: Session, seen: Snapshot) -> Snapshot:
+        """Reload if seen is still current and older than min_reload seconds"""
+        with self.lock:
+            age = time.monotonic() - seen.loaded_at
+            if self._snapshot is seen and age >= self.min_reload:
+                self.version += 1
+                self._snapshot = None
+        return self.snapshot(db)
+
+    def get(self, db: Session, row_id: int):
+        rows = self.resolve(db, [row_id])
+        return rows[0] if rows else None
+
+    def resolve(self, db: Session, ids: Iterable[int]) -> List:
+        """Detached rows for ids, reloading once if some were created elsewhere"""
+        ids = list(dict.fromkeys(ids))
+        snapshot = self.snapshot(db)
+        if any(row_id not in snapshot.by_id for row_id in ids):
+            snapshot = self._reload_unless_recent(db, snapshot)
+        return [snapshot.by_id[row_id] for row_id in ids if row_id in snapshot.by_id]
+
+
+categories = ReferenceTable(
+    models.Category, schemas.Category,
+    settings.REFERENCE_CACHE_TTL, settings.REFERENCE_CACHE_MIN_RELOAD
+)
+tags = ReferenceTable(
+    models.Tag, schemas.Tag,
+    settings.REFERENCE_CACHE_TTL, settings.REFERENCE_CACHE_MIN_RELOAD
+)
+
+CACHE_CONTROL = f"public, max-age={settings.REFERENCE_CACHE_MAX_AGE}"
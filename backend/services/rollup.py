@@ -0,0 +1,263 @@
+"""Per-user monthly ledger rollups.
+
+The monthly_rollups and category_rollups tables hold running revenue and
+expense totals per user and month (and per category for expenses). crud
+applies a RollupDelta in the same transaction as every revenue or expense
+write, so the statistics never need to re-sum the raw history.
+
+Rebuild or check the tables against the raw ledger from the backend directory:
+
+    python -m services.rollup verify
+    python -m services.rollup rebuild [--user-id ID]
+"""
+import argparse
+import sys
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import func, extract
+import models
+from database import upsert_adding
+from services import stats_cache
+
+# Totals are floats, so compare with a tolerance below one cent
+TOLERANCE = 0.005
+
+
+def month_key(day: date) -> str:
+    """Format a date as the YYYY-MM key used by budgets and rollups"""
+    return f"{day.year}-{day.month:02d}"
+
+
+def iter_months(start_month: str, end_month: str):
+    """Yield the YYYY-MM keys of an inclusive month range"""
+    year, month = (int(part) for part in start_month.split("-"))
+    end_year, end_month_number = (int(part) for part in end_month.split("-"))
+    while (year, month) <= (end_year, end_month_number):
+        yield f"{year}-{month:02d}"
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def covers_whole_months(start_date: Optional[date], end_date: Optional[date]) -> bool:
+    """Whether an inclusive date range starts and ends on month boundaries"""
+    starts_on_boundary = start_date is None or start_date.day == 1
+    ends_on_boundary = end_date is None or (end_date + timedelta(days=1)).day == 1
+    return starts_on_boundary and ends_on_boundary
+
+
+class RollupDelta:
+    """Accumulates rollup changes and applies them with one upsert per table"""
+
+    def __init__(self):
+        self.months = defaultdict(lambda: [0.0, 0.0])
+        self.categories = defaultdict(lambda: [0.0, 0])
+
+    def add_revenue(self, user_id: int, day: Optional[date], amount: Optional[float]):
+        if day is None or not amount:
+            return
+        self.months[(user_id, month_key(day))][0] += amount
+
+    def remove_revenue(self, user_id: int, day: Optional[date],
+                       amount: Optional[float]):
+        self.add_revenue(user_id, day, -(amount or 0))
+
+    def add_expense(self, user_id: int, day: Optional[date], category_id: Optional[int],
+                    amount: Optional[float], count: int = 1):
+        if day is None:
+            return
+        key = month_key(day)
+        self.months[(user_id, key)][1] += amount or 0
+        if category_id is not None:
+            totals = self.categories[(user_id, key, category_id)]
+            totals[0] += amount or 0
+            totals[1] += count
+
+    def remove_expense(self, user_id: int, day: Optional[date],
+                       category_id: Optional[int], amount: Optional[float]):
+        self.add_expense(user_id, day, category_id, -(amount or 0), count=-1)
+
+    def apply(self, db: Session) -> List[Tuple[int, str]]:
+        """Add the accumulated amounts to the rollup tables without committing
+
+        Returns the (user_id, month) keys whose expenses grew, for alerts.evaluate.
+        """
+        grown = [key for key, (_, expenses) in self.months.items() if expenses > 0]
+        for user_id, _ in self.months:
+            stats_cache.mark_dirty(db, user_id)
+        upsert_adding(
+            db, models.MonthlyRollup.__table__,
+            [
+                {"user_id": user_id, "month": month,
+                 "total_revenue": revenue, "total_expenses": expenses}
+                for (user_id, month), (revenue, expenses) in self.months.items()
+                if revenue or expenses
+            ],
+            ("user_id", "month"), ("total_revenue", "total_expenses")
+        )
+        upsert_adding(
+            db, models.CategoryRollup.__table__,
+            [
+                {"user_id": user_id, "month": month, "category_id": category_id,
+                 "total_amount": amount, "expense_count": count}
+                for (user_id, month, category_id), (amount, count)
+                in self.categories.items()
+                if amount or count
+            ],
+            ("user_id", "month", "category_id"), ("total_amount", "expense_count")
+        )
+
+        db.flush()
+        self.months.clear()
+        self.categories.clear()
+        return grown
+
+
+def _raw_totals(db: Session, user_id: Optional[int] = None):
+    """Aggregate the raw ledger into the same shape as the rollup tables"""
+    months: Dict[Tuple[int, str], List[float]] = defaultdict(lambda: [0.0, 0.0])
+    categories: Dict[Tuple[int, str, int], List[float]] = defaultdict(lambda: [0.0, 0])
+
+    def grouped(model, *extra):
+        year = extract("year", model.date).label("year")
+        month = extract("month", model.date).label("month")
+        query = db.query(
+            model.user_id, year, month, *extra,
+            func.sum(model.amount).label("total"), func.count().label("count")
+        ).filter(model.date.isnot(None))
+        if user_id is not None:
+            query = query.filter(model.user_id == user_id)
+        return query.group_by(model.user_id, year, month, *extra)
+
+    for row in grouped(models.Revenue):
+        key = f"{int(row.year)}-{int(row.month):02d}"
+        months[(row.user_id, key)][0] += row.total or 0.0
+    for row in grouped(models.Expense, models.Expense.category_id):
+        key = f"{int(row.year)}-{int(row.month):02d}"
+        months[(row.user_id, key)][1] += row.total or 0.0
+        if row.category_id is not None:
+            totals = categories[(row.user_id, key, row.category_id)]
+            totals[0] += row.total or 0.0
+            totals[1] += row.count
+
+    return months, categories
+
+
+def rebuild(db: Session, user_id: Optional[int] = None) -> int:
+    """Recompute the rollups from the raw ledger and commit, returning the row count"""
+    for model in (models.MonthlyRollup, models.CategoryRollup):
+        query = db.query(model)
+        if user_id is not None:
+            query = query.filter(model.user_id == user_id)
+        query.delete(synchronize_session=False)
+
+    months, categories = _raw_totals(db, user_id)
+    stats_cache.mark_dirty(db, user_id)
+    db.add_all(
+        models.MonthlyRollup(
+            user_id=uid, month=month, total_revenue=revenue, total_expenses=expenses
+        )
+        for (uid, month), (revenue, expenses) in months.items()
+    )
+    db.add_all(
+        models.CategoryRollup(
+            user_id=uid, month=month, category_id=category_id,
+            total_amount=amount, expense_count=count
+        )
+        for (uid, month, category_id), (amount, count) in categories.items()
+    )
+    db.commit()
+    return len(months) + len(categories)
+
+
+def needs_backfill(db: Session) -> bool:
+    """Whether the ledger has rows but the rollups are empty, as after an upgrade"""
+    if db.query(models.MonthlyRollup.user_id).first() is not None:
+        return False
+    return any(
+        db.query(model.id).filter(model.date.isnot(None)).first() is not None
+        for model in (models.Expense, models.Revenue)
+    )
+
+
+def verify(db: Session, user_id: Optional[int] = None) -> List[str]:
+    """Compare the rollups with the raw ledger and describe every mismatch"""
+    months, categories = _raw_totals(db, user_id)
+
+    stored_months = db.query(
+        models.MonthlyRollup.user_id,
+        models.MonthlyRollup.month,
+        models.MonthlyRollup.total_revenue,
+        models.MonthlyRollup.total_expenses
+    )
+    stored_categories = db.query(
+        models.CategoryRollup.user_id,
+        models.CategoryRollup.month,
+        models.CategoryRollup.category_id,
+        models.CategoryRollup.total_amount,
+        models.CategoryRollup.expense_count
+    )
+    if user_id is not None:
+        stored_months = stored_months.filter(
+            models.MonthlyRollup.user_id == user_id
+        )
+        stored_categories = stored_categories.filter(
+            models.CategoryRollup.user_id == user_id
+        )
+
+    rolled_months = {
+        (row.user_id, row.month): [row.total_revenue, row.total_expenses]
+        for row in stored_months
+    }
+    rolled_categories = {
+        (row.user_id, row.month, row.category_id): [row.total_amount, row.expense_count]
+        for row in stored_categories
+    }
+
+    problems = []
+    for key in sorted(set(months) | set(rolled_months)):
+        expected = months.get(key, [0.0, 0.0])
+        actual = rolled_months.get(key, [0.0, 0.0])
+        if any(abs(e - a) > TOLERANCE for e, a in zip(expected, actual)):
+            problems.append(
+                f"user {key[0]} month {key[1]}: revenue/expenses {actual} in rollup, "
+                f"{expected} in ledger"
+            )
+    for key in sorted(set(categories) | set(rolled_categories)):
+        expected = categories.get(key, [0.0, 0])
+        actual = rolled_categories.get(key, [0.0, 0])
+        if abs(expected[0] - actual[0]) > TOLERANCE or expected[1] != actual[1]:
+            problems.append(
+                f"user {key[0]} month {key[1]} category {key[2]}: "
+                f"amount/count {actual} in rollup, {expected} in ledger"
+            )
+    return problems
+
+
+def main(argv=None):
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Rebuild or verify the ledger rollups")
+    parser.add_argument("command", choices=["rebuild", "verify"])
+    parser.add_argument("--user-id", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.command == "rebuild":
+            print(f"Rebuilt {rebuild(db, args.user_id)} rollup rows")
+            return 0
+        problems = verify(db, args.user_id)
+        for problem in problems:
+            print(problem)
+        if problems:
+            print(f"{len(problems)} mismatches")
+        else:
+            print("Rollups match the ledger")
+        return 1 if problems else 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
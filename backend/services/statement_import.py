@@ -0,0 +1,379 @@
+"""Streaming import of bank statements (CSV or OFX).
+
+Statements are parsed line by line with generators and written in batches,
+so memory stays bounded whatever the file size. Each batch commits together
+with its models.StatementImport checkpoint: resuming an import skips every
+row up to the last committed line, and rows already present in the ledger
+are recognised by a content hash and skipped.
+
+Import a local file from the backend directory:
+
+    python -m services.statement_import releve.csv --user-id 1 --category-id 3
+"""
+import argparse
+import csv
+import hashlib
+import io
+import re
+import sys
+import time
+import unicodedata
+from collections import Counter
+from datetime import date, datetime
+from typing import Callable, Iterator, List, Optional, TextIO, Tuple, Union
+from sqlalchemy.orm import Session
+import crud
+import models
+import schemas
+
+BATCH_SIZE = 1000
+IMPORTED_EXPENSE_TYPE = "imported"
+
+HEADER_ALIASES = {
+    "date": ("date", "date operation", "date de l'operation", "date valeur",
+             "booking date"),
+    "amount": ("amount", "montant", "montant (eur)"),
+    "debit": ("debit",),
+    "credit": ("credit",),
+    "description": ("description", "libelle", "label", "memo", "name",
+                    "intitule"),
+}
+
+
+class StatementRow:
+    """One statement line; a positive amount is a revenue, a negative one an expense"""
+
+    __slots__ = ("date", "amount", "description")
+
+    def __init__(self, day: date, amount: float, description: str):
+        self.date = day
+        self.amount = amount
+        self.description = description
+
+
+# (position, row) where row is a StatementRow or the reason it could not be parsed
+ParsedRow = Tuple[int, Union[StatementRow, str]]
+
+
+def _normalize(header: str) -> str:
+    stripped = unicodedata.normalize("NFKD", header).encode("ascii", "ignore").decode()
+    return stripped.strip().lower()
+
+
+def parse_amount(text: str) -> float:
+    """Parse 1234.56, -12,30 or 1 234,56 style amounts"""
+    cleaned = re.sub(r"[\s\u00a0\u202f€]", "", text)
+    if "," in cleaned and "." in cleaned:
+        # The right-most separator is the decimal one
+        thousands = "." if cleaned.rfind(",") > cleaned.rfind(".") else ","
+        cleaned = cleaned.replace(thousands, "")
+    return float(cleaned.replace(",", "."))
+
+
+def parse_date(text: str) -> date:
+    """Parse ISO, DD/MM/YYYY and OFX (YYYYMMDD[hhmmss...]) dates"""
+    text = text.strip()
+    if re.match(r"^\d{8}", text):
+        return datetime.strptime(text[:8], "%Y%m%d").date()
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%d/%m/%y", "%d-%m-%Y", "%d.%m.%Y"):
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised date {text!r}")
+
+
+def iter_csv(stream: TextIO) -> Iterator[ParsedRow]:
+    """Yield the rows of a CSV statement, numbered from 1 after the header"""
+    header_line = stream.readline()
+    delimiter = ";" if header_line.count(";") > header_line.count(",") else ","
+    header_cells = next(csv.reader([header_line], delimiter=delimiter))
+    headers = [_normalize(h) for h in header_cells]
+
+    columns = {}
+    for field, aliases in HEADER_ALIASES.items():
+        for index, header in enumerate(headers):
+            if header in aliases:
+                columns[field] = index
+                break
+    has_amount = "amount" in columns or "debit" in columns or "credit" in columns
+    if "date" not in columns or not has_amount:
+        raise ValueError(
+            "The CSV header needs a date column and an amount (or debit/credit) column"
+        )
+
+    def cell(values, field):
+        index = columns.get(field)
+        if index is None or index >= len(values):
+            return ""
+        return values[index].strip()
+
+    for position, values in enumerate(csv.reader(stream, delimiter=delimiter), start=1):
+        if not any(value.strip() for value in values):
+            continue
+        try:
+            if cell(values, "amount"):
+                amount = parse_amount(cell(values, "amount"))
+            else:
+                credit = cell(values, "credit")
+                debit = cell(values, "debit")
+                amount = (parse_amount(credit) if credit else 0.0) - (
+                    abs(parse_amount(debit)) if debit else 0.0
+                )
+            yield position, StatementRow(
+                parse_date(cell(values, "date")), amount, cell(values, "description")
+            )
+        except ValueError as exc:
+            yield position, f"line {position + 1}: {exc}"
+
+
+def iter_ofx(stream: TextIO) -> Iterator[ParsedRow]:
+    """Yield the STMTTRN transactions of an OFX 1 (SGML) or OFX 2 (XML) statement"""
+    position = 0
+    transaction = None
+    for line in stream:
+        # SGML leaves elements unclosed and may put several on a line
+        for token in line.split("<")[1:]:
+            tag, _, value = token.partition(">")
+            tag = tag.strip().upper()
+            value = value.strip()
+            if tag == "STMTTRN":
+                transaction = {}
+            elif tag == "/STMTTRN" and transaction is not None:
+                position += 1
+                try:
+                    description = transaction.get("NAME") or transaction.get("MEMO", "")
+                    if transaction.get("MEMO") and transaction.get("NAME"):
+                        description = f"{transaction['NAME']} {transaction['MEMO']}"
+                    yield position, StatementRow(
+                        parse_date(transaction.get("DTPOSTED", "")),
+                        parse_amount(transaction.get("TRNAMT", "")),
+                        description
+                    )
+                except ValueError as exc:
+                    yield position, f"transaction {position}: {exc}"
+                transaction = None
+            elif transaction is not None and value and not tag.startswith("/"):
+                transaction[tag] = value
+
+
+def content_hash(kind: str, day: date, amount: float, description: str) -> str:
+    """Fingerprint of a ledger row used to recognise rows that were already imported"""
+    text = (description or "").strip().lower()
+    key = f"{kind}|{day.isoformat()}|{abs(amount):.2f}|{text}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def _existing_hashes(db: Session, user_id: int, start: date, end: date) -> Counter:
+    existing = Counter()
+    revenues = db.query(
+        models.Revenue.date, models.Revenue.amount, models.Revenue.source
+    ).filter(
+        models.Revenue.user_id == user_id,
+        models.Revenue.date >= start, models.Revenue.date <= end
+    )
+    for row in revenues:
+        existing[content_hash("revenue", row.date, row.amount or 0, row.source)] += 1
+    expenses = db.query(
+        models.Expense.date, models.Expense.amount, models.Expense.description
+    ).filter(
+        models.Expense.user_id == user_id,
+        models.Expense.date >= start, models.Expense.date <= end
+    )
+    for row in expenses:
+        digest = content_hash("expense", row.date, row.amount or 0, row.description)
+        existing[digest] += 1
+    return existing
+
+
+class DedupeWindow:
+    """Hash counts carried over from the previous batch
+
+    Identical rows split across a batch boundary would otherwise look like rows
+    already in the ledger. Only the previous batch is kept, so memory stays
+    bounded; statements are date-ordered, so that is where repeats land.
+    """
+
+    def __init__(self):
+        self.seen = Counter()
+        self.inserted = Counter()
+
+
+def _write_batch(db: Session, record: models.StatementImport,
+                 batch: List[ParsedRow], category_id: int, window: DedupeWindow):
+    """Dedupe and insert one batch, then commit it together with the checkpoint"""
+    rows = [(position, row) for position, row in batch if isinstance(row, StatementRow)]
+    failures = [row for _, row in batch if not isinstance(row, StatementRow)]
+
+    revenues, expenses = [], []
+    if rows:
+        days = [row.date for _, row in rows]
+        existing = _existing_hashes(db, record.user_id, min(days), max(days))
+        seen = Counter(window.seen)
+        inserted_here = Counter()
+        batch_digests = set()
+        for _, row in rows:
+            if row.amount >= 0:
+                item = schemas.RevenueCreate(
+                    amount=row.amount, source=row.description[:100], date=row.date
+                )
+                digest = content_hash("revenue", item.date, item.amount, item.source)
+                target = revenues
+            else:
+                item = schemas.ExpenseCreate(
+                    amount=-row.amount, description=row.description[:255],
+                    date=row.date, type=IMPORTED_EXPENSE_TYPE, category_id=category_id
+                )
+                digest = content_hash(
+                    "expense", item.date, item.amount, item.description
+                )
+                target = expenses
+            # The n-th copy of a row in the file is new only if the ledger held fewer
+            # than n copies before this import started
+            batch_digests.add(digest)
+            seen[digest] += 1
+            if seen[digest] <= existing[digest] - window.inserted[digest]:
+                record.duplicates += 1
+            else:
+                target.append(item)
+                inserted_here[digest] += 1
+
+        # Keep only this batch's hashes for the next one
+        window.seen = Counter({digest: seen[digest] for digest in batch_digests})
+        window.inserted = Counter({
+            digest: window.inserted[digest] + inserted_here[digest]
+            for digest in batch_digests
+        })
+
+    inserted, _ = crud.bulk_create_revenues(db, revenues, record.user_id, commit=False)
+    record.inserted += inserted
+    inserted, write_errors = crud.bulk_create_expenses(
+        db, expenses, record.user_id, commit=False
+    )
+    record.inserted += inserted
+    failures.extend(error for _, error in write_errors)
+
+    record.errors += len(failures)
+    if failures:
+        record.last_error = failures[-1][:255]
+    record.lines_read = batch[-1][0]
+    record.updated_at = datetime.utcnow()
+    db.commit()
+
+
+def start_import(db: Session, user_id: int, filename: Optional[str],
+                 fmt: str) -> models.StatementImport:
+    now = datetime.utcnow()
+    record = models.StatementImport(
+        user_id=user_id, filename=filename, format=fmt, status="running",
+        lines_read=0, inserted=0, duplicates=0, errors=0, started_at=now, updated_at=now
+    )
+    db.add(record)
+    db.commit()
+    db.refresh(record)
+    return record
+
+
+def run_import(
+    db: Session,
+    record: models.StatementImport,
+    stream: TextIO,
+    category_id: int,
+    batch_size: int = BATCH_SIZE,
+    on_progress: Optional[Callable[[schemas.StatementImport], None]] = None
+) -> models.StatementImport:
+    """Stream a statement into the ledger, resuming after record.lines_read"""
+    rows = iter_ofx(stream) if record.format == "ofx" else iter_csv(stream)
+    record.status = "running"
+    resume_after = record.lines_read or 0
+    batch: List[ParsedRow] = []
+    window = DedupeWindow()
+    try:
+        for position, row in rows:
+            if position <= resume_after:
+                continue
+            batch.append((position, row))
+            if len(batch) >= batch_size:
+                _write_batch(db, record, batch, category_id, window)
+                batch = []
+                if on_progress:
+                    on_progress(describe(record))
+        if batch:
+            _write_batch(db, record, batch, category_id, window)
+        record.status = "completed"
+    except Exception as exc:
+        db.rollback()
+        record.status = "failed"
+        record.last_error = str(exc)[:255]
+        raise
+    finally:
+        record.updated_at = datetime.utcnow()
+        db.commit()
+        if on_progress:
+            on_progress(describe(record))
+    return record
+
+
+def describe(record: models.StatementImport) -> schemas.StatementImport:
+    """Progress of an import, including its throughput in rows per second"""
+    progress = schemas.StatementImport.model_validate(record)
+    elapsed = (record.updated_at - record.started_at).total_seconds()
+    progress.rows_per_second = (
+        round(record.lines_read / elapsed, 1) if elapsed > 0 else 0.0
+    )
+    return progress
+
+
+def detect_format(filename: Optional[str]) -> str:
+    return "ofx" if filename and filename.lower().endswith((".ofx", ".qfx")) else "csv"
+
+
+def open_text(binary: io.RawIOBase) -> TextIO:
+    """Wrap a binary file for line-by-line decoding, dropping any UTF-8 BOM"""
+    return io.TextIOWrapper(binary, encoding="utf-8-sig", errors="replace", newline="")
+
+
+def main(argv=None):
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Import a CSV or OFX bank statement")
+    parser.add_argument("path")
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument(
+        "--category-id", type=int, required=True, help="category given to expenses"
+    )
+    parser.add_argument(
+        "--resume-id", type=int, default=None, help="statement import to resume"
+    )
+    args = parser.parse_args(argv)
+
+    def report(progress: schemas.StatementImport):
+        print(
+            f"\rline {progress.lines_read}: {progress.inserted} inserted, "
+            f"{progress.duplicates} duplicates, {progress.errors} errors, "
+            f"{progress.rows_per_second:.0f} rows/s",
+            end="", file=sys.stderr
+        )
+
+    db = SessionLocal()
+    try:
+        if args.resume_id:
+            record = db.get(models.StatementImport, args.resume_id)
+        else:
+            record = start_import(db, args.user_id, args.path, detect_format(args.path))
+        started = time.perf_counter()
+        with open(args.path, "rb") as binary:
+            run_import(
+                db, record, open_text(binary), args.category_id, on_progress=report
+            )
+        elapsed = time.perf_counter() - started
+        print(
+            f"\nImport {record.id} {record.status} in {elapsed:.1f}s", file=sys.stderr
+        )
+        return 0 if record.status == "completed" else 1
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
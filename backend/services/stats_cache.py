@@ -0,0 +1,301 @@
+"""Per-user read-through cache for the statistics served by BudgetService.
+
+Cache keys embed a per-user generation number. Invalidating a user bumps the
+generation, which orphans every entry they had in one operation; orphans then
+age out through the TTL or the LRU bound. Write paths never touch the cache
+directly. They call mark_dirty(db, user_id), and the users are invalidated
+once that session commits, so a reader can never re-cache pre-commit data.
+
+The same counters version each user's data for HTTP validators: see
+data_version and http_cache.conditional_get. Those are only sent with a shared
+backend, since a per-process counter would let another worker answer 304 to a
+copy that one worker already made stale.
+
+Backends:
+
+- InMemoryBackend (default): TTL plus LRU eviction, local to the process.
+  Only correct with a single worker process.
+- RedisBackend: wraps any client exposing get/set(ex=)/incr/mget, e.g.
+  redis.Redis.from_url(settings.REDIS_URL). Shared by all workers. Run Redis
+  with a volatile-* maxmemory policy: entries carry a TTL and the generation
+  counters do not, so only entries are ever evicted.
+"""
+import functools
+import inspect
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from pydantic import TypeAdapter
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from config import settings
+
+GLOBAL_GENERATION_KEY = "stats:gen"
+EPOCH_KEY = "stats:epoch"
+DIRTY_USERS_KEY = "stats_dirty_users"
+
+
+class InMemoryBackend:
+    """Thread-safe dict with a TTL per entry and least-recently-used eviction"""
+
+    # Generations are bumped by commits in this process only
+    shared = False
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        # Generation counters live apart from the entries so LRU never evicts them
+        self.counters: Dict[str, int] = {}
+        self.evictions = 0
+        # Counters restart at zero with the process, the epoch tells the runs apart
+        self.epoch_value = secrets.token_hex(4)
+        self.lock = threading.Lock()
+
+    def epoch(self) -> str:
+        return self.epoch_value
+
+    def get(self, key: str) -> Optional[Any]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: int):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_counters(self, keys: List[str]) -> List[Optional[int]]:
+        with self.lock:
+            return [self.counters.get(key) for key in keys]
+
+    def incr(self, key: str) -> int:
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+            return self.counters[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            # Bumped rather than reset, so no data version is ever handed out twice
+            generation = self.counters.get(GLOBAL_GENERATION_KEY, 0)
+            self.counters[GLOBAL_GENERATION_KEY] = generation + 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"entries": len(self.entries), "max_entries": self.max_entries,
+                    "evictions": self.evictions}
+
+
+class RedisBackend:
+    """Backend over a Redis client; values are stored as JSON"""
+
+    shared = True
+
+    def __init__(self, client, prefix: str = "budgetwise:"):
+        self.client = client
+        self.prefix = prefix
+
+    def epoch(self) -> str:
+        # Recreated if Redis loses its data, which also resets the counters
+        raw = self.client.get(self.prefix + EPOCH_KEY)
+        if raw is None:
+            self.client.set(self.prefix + EPOCH_KEY, secrets.token_hex(4), nx=True)
+            raw = self.client.get(self.prefix + EPOCH_KEY)
+        return raw.decode() if isinstance(raw, bytes) else raw
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self.client.get(self.prefix + key)
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: int):
+        self.client.set(self.prefix + key, json.dumps(value), ex=ttl)
+
+    def get_counters(self, keys: List[str]) -> List[Optional[int]]:
+        values = self.client.mget([self.prefix + key for key in keys])
+        return [None if raw is None else int(raw) for raw in values]
+
+    def incr(self, key: str) -> int:
+        return self.client.incr(self.prefix + key)
+
+    def clear(self):
+        # Orphans every entry of every user; they expire through their TTL
+        self.incr(GLOBAL_GENERATION_KEY)
+
+    def stats(self) -> dict:
+        return {"prefix": self.prefix}
+
+
+class StatsCache:
+    """Read-through cache keyed by user, statistic name and call parameters"""
+
+    def __init__(self, backend, ttl: int = 300):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    def _key(self, user_id: int, name: str, params: Iterable) -> str:
+        global_generation, user_generation = self.backend.get_counters(
+            [GLOBAL_GENERATION_KEY, f"stats:gen:{user_id}"]
+        )
+        rendered = ":".join(str(param) for param in params)
+        generations = f"{global_generation or 0}:{user_id}:{user_generation or 0}"
+        return f"stats:{generations}:{name}:{rendered}"
+
+    def data_version(self, user_id: int) -> str:
+        """Opaque token that changes whenever user_id's data is committed"""
+        global_generation, user_generation = self.backend.get_counters(
+            [GLOBAL_GENERATION_KEY, f"stats:gen:{user_id}"]
+        )
+        return f"{self.backend.epoch()}.{global_generation or 0}.{user_generation or 0}"
+
+    @property
+    def versions_shared(self) -> bool:
+        """Whether data_version agrees across worker processes"""
+        return self.backend.shared
+
+    def _count(self, hit: bool):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def lookup(self, user_id: int, name: str, params: Iterable, adapter: TypeAdapter):
+        """Return (key, cached value or None)"""
+        key = self._key(user_id, name, params)
+        raw = self.backend.get(key)
+        self._count(raw is not None)
+        return key, None if raw is None else adapter.validate_python(raw)
+
+    def store(self, key: str, value: Any, adapter: TypeAdapter):
+        self.backend.set(key, adapter.dump_python(value, mode="json"), self.ttl)
+
+    def get_or_load(self, user_id: int, name: str, params: Iterable,
+                    adapter: TypeAdapter, loader: Callable):
+        key, value = self.lookup(user_id, name, params, adapter)
+        if value is None:
+            value = loader()
+            self.store(key, value, adapter)
+        return value
+
+    def invalidate_user(self, user_id: int):
+        self.backend.incr(f"stats:gen:{user_id}")
+        with self.lock:
+            self.invalidations += 1
+
+    def invalidate_all(self):
+        self.backend.clear()
+        with self.lock:
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            counters = {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "ttl": self.ttl,
+            }
+        counters["backend"] = type(self.backend).__name__
+        counters.update(self.backend.stats())
+        return counters
+
+
+class NullCache(StatsCache):
+    """Cache that always misses, used when STATS_CACHE_BACKEND is none
+
+    It still keeps the per-user counters, which data_version relies on.
+    """
+
+    def __init__(self):
+        super().__init__(backend=InMemoryBackend(max_entries=0), ttl=0)
+
+    def get_or_load(self, user_id, name, params, adapter, loader):
+        self._count(False)
+        return loader()
+
+    def lookup(self, user_id, name, params, adapter):
+        self._count(False)
+        return None, None
+
+    def store(self, key, value, adapter):
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": "none", "hits": 0, "misses": self.misses}
+
+
+def create_cache() -> StatsCache:
+    backend = settings.STATS_CACHE_BACKEND
+    if backend == "none":
+        return NullCache()
+    if backend == "redis":
+        import redis
+
+        client = redis.Redis.from_url(settings.REDIS_URL)
+        return StatsCache(RedisBackend(client), settings.STATS_CACHE_TTL)
+    backend = InMemoryBackend(settings.STATS_CACHE_MAX_ENTRIES)
+    return StatsCache(backend, settings.STATS_CACHE_TTL)
+
+
+cache = create_cache()
+
+
+def cached(name: str, return_type):
+    """Cache a (db, user_id, *params) statistic through the module cache"""
+    adapter = TypeAdapter(return_type)
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(db, user_id, *args, **kwargs):
+            bound = signature.bind(db, user_id, *args, **kwargs)
+            bound.apply_defaults()
+            params = list(bound.arguments.values())[2:]
+            return cache.get_or_load(
+                user_id, name, params, adapter,
+                lambda: func(db, user_id, *args, **kwargs)
+            )
+        return wrapper
+    return decorator
+
+
+def mark_dirty(db: Session, user_id: Optional[int]):
+    """Invalidate user_id's statistics once db commits; None means every user"""
+    db.info.setdefault(DIRTY_USERS_KEY, set()).add(user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    dirty = session.info.pop(DIRTY_USERS_KEY, None)
+    if not dirty:
+        return
+    if None in dirty:
+        cache.invalidate_all()
+        return
+    for user_id in dirty:
+        cache.invalidate_user(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session):
+    session.info.pop(DIRTY_USERS_KEY, None)
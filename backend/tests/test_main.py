@@ -1,10 +1,14 @@
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from main import app
+from config import settings
 from database import get_db, Base
+from services.auth import create_access_token
 
+import json
 import os
+import pytest
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -27,6 +31,19 @@ app.dependency_overrides[get_db] = override_get_db
 
 client = TestClient(app)
 
+def auth(user):
+    return {"Authorization": f"Bearer {create_access_token(user['id'])}"}
+
+def register(name, email):
+    return client.post(
+        "/auth/register",
+        json={"name": name, "email": email, "password": "testpassword123"}
+    ).json()
+
+# Operator credentials for /internal and /metrics
+settings.INTERNAL_API_TOKEN = "test-internal-token"
+INTERNAL = {"X-Internal-Token": settings.INTERNAL_API_TOKEN}
+
 def test_read_root():
     response = client.get("/")
     assert response.status_code == 200
@@ -87,4 +104,863 @@ def test_get_categories():
 
 def test_unauthorized_access():
     response = client.get("/budgets/dashboard")
-    assert response.status_code == 401 or response.status_code == 422
\ No newline at end of file
+    assert response.status_code == 401 or response.status_code == 422
+def test_expense_cursor_pagination():
+    user = register("Pager", "pager@example.com")
+    category = client.post("/categories/", json={"name": "Pager Category"}).json()
+    for day in (1, 2, 2, 3, 4):
+        client.post("/expenses/", json={
+            "amount": 10.0, "description": f"Day {day}",
+            "date": f"2024-05-{day:02d}", "type": "variable",
+            "category_id": category["id"]
+        }, headers=auth(user))
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/expenses/", params=params, headers=auth(user))
+        assert response.status_code == 200
+        seen.extend(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    assert [e["date"] for e in seen] == [
+        "2024-05-04", "2024-05-03", "2024-05-02", "2024-05-02", "2024-05-01"
+    ]
+    assert len({e["id"] for e in seen}) == 5
+
+    filtered = client.get("/expenses/", params={
+        "start_date": "2024-05-02", "end_date": "2024-05-03", "limit": 10
+    }, headers=auth(user))
+    assert len(filtered.json()) == 3
+    assert "X-Next-Cursor" not in filtered.headers
+
+    bogus = client.get("/expenses/", params={"cursor": "bogus"}, headers=auth(user))
+    assert bogus.status_code == 400
+
+@pytest.mark.parametrize("fast_json", [False, True])
+def test_async_routes_match_sync(fast_json, monkeypatch):
+    from fastapi import FastAPI
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    from sqlalchemy.pool import NullPool
+    from database import async_url, create_async_db_engine, get_async_db
+    from routes import async_api
+
+    async_engine = create_async_db_engine(
+        async_url(SQLALCHEMY_DATABASE_URL), poolclass=NullPool
+    )
+    AsyncTestingSessionLocal = async_sessionmaker(
+        async_engine, expire_on_commit=False
+    )
+
+    async def override_get_async_db():
+        async with AsyncTestingSessionLocal() as db:
+            yield db
+
+    async_app = FastAPI()
+    async_app.include_router(async_api.router)
+    async_app.dependency_overrides[get_async_db] = override_get_async_db
+
+    from config import settings
+
+    user = register("Async", f"async-{fast_json}@example.com")
+    category = client.post(
+        "/categories/", json={"name": f"Async Category {fast_json}"}
+    ).json()
+    for day in (1, 2, 3):
+        client.post("/expenses/", json={
+            "amount": 7.5, "description": f"Day {day}", "date": f"2024-06-{day:02d}",
+            "type": "variable", "category_id": category["id"]
+        }, headers=auth(user))
+        client.post("/revenues/", json={
+            "amount": 100.0, "source": f"Day {day}", "date": f"2024-06-{day:02d}"
+        }, headers=auth(user))
+
+    monkeypatch.setattr(settings, "FAST_JSON_LISTINGS", fast_json)
+    with TestClient(async_app) as async_client:
+        for path, params in (
+            ("/expenses/", {"limit": 2}),
+            ("/revenues/", {"limit": 2}),
+            ("/budgets/dashboard", {}),
+            ("/budgets/dashboard", {"forecast": "true"}),
+        ):
+            expected = client.get(path, params=params, headers=auth(user))
+            response = async_client.get(path, params=params, headers=auth(user))
+            assert response.status_code == 200
+            assert response.json() == expected.json()
+            next_cursor = response.headers.get("X-Next-Cursor")
+            assert next_cursor == expected.headers.get("X-Next-Cursor")
+        for path in ("/expenses/", "/revenues/"):
+            for tested in (client, async_client):
+                response = tested.get(
+                    path, params={"cursor": "bad"}, headers=auth(user)
+                )
+                assert response.status_code == 400
+
+def count_statements(func):
+    statements = []
+
+    def listener(*args):
+        statements.append(args[2])
+
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        func()
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    return len(statements)
+
+def test_expense_listing_query_count_is_constant():
+    user = register("Loader", "loader@example.com")
+    categories = [
+        client.post("/categories/", json={"name": f"Loader {n}"}).json()
+        for n in range(3)
+    ]
+    tags = [
+        client.post("/tags/", json={"name": f"loader-{n}"}).json() for n in range(3)
+    ]
+    for n in range(30):
+        client.post("/expenses/", json={
+            "amount": 5.0, "description": f"Expense {n}", "date": "2024-06-01",
+            "type": "variable", "category_id": categories[n % 3]["id"],
+            "tag_ids": [tags[n % 3]["id"], tags[(n + 1) % 3]["id"]],
+        }, headers=auth(user))
+
+    def list_expenses(limit):
+        response = client.get(
+            "/expenses/", params={"limit": limit}, headers=auth(user)
+        )
+        assert len(response.json()) == limit
+        assert all(e["category"] and len(e["tags"]) == 2 for e in response.json())
+
+    few = count_statements(lambda: list_expenses(2))
+    assert few == count_statements(lambda: list_expenses(30))
+
+def test_bulk_expense_import():
+    user = register("Bulk", "bulk@example.com")
+    category = client.post("/categories/", json={"name": "Bulk Category"}).json()
+    tag = client.post("/tags/", json={"name": "bulk"}).json()
+    row = {"amount": 12.5, "description": "Imported", "date": "2023-01-15",
+           "type": "variable", "category_id": category["id"]}
+
+    ndjson = "\n".join([
+        json.dumps(row),
+        json.dumps({**row, "tag_ids": [tag["id"]]}),
+        "{not json",
+        json.dumps({**row, "amount": "abc"}),
+        json.dumps({**row, "category_id": 999999}),
+    ])
+    response = client.post(
+        "/expenses/bulk",
+        content=ndjson,
+        headers={"Content-Type": "application/x-ndjson", **auth(user)}
+    )
+    assert response.status_code == 200
+    result = response.json()
+    assert result["inserted"] == 2
+    assert [e["index"] for e in result["errors"]] == [2, 3, 4]
+
+    # Lines cut across the chunks of the stream
+    encoded = ndjson.encode()
+    response = client.post(
+        "/expenses/bulk",
+        content=(encoded[i:i + 7] for i in range(0, len(encoded), 7)),
+        headers={"Content-Type": "application/x-ndjson", **auth(user)}
+    )
+    assert response.json() == {**result, "inserted": 2}
+
+    # A line over BULK_IMPORT_MAX_LINE_BYTES aborts the whole import
+    too_long = json.dumps({**row, "description": "x" * 70000})
+    response = client.post(
+        "/expenses/bulk",
+        content=(json.dumps(row) + "\n" + too_long).encode(),
+        headers={"Content-Type": "application/x-ndjson", **auth(user)}
+    )
+    assert response.status_code == 413
+    response = client.post(
+        "/expenses/bulk",
+        content=(chunk for chunk in [b"[" * 40000] * 2),
+        headers={"Content-Type": "application/x-ndjson", **auth(user)}
+    )
+    assert response.status_code == 413
+
+    response = client.post("/revenues/bulk", json=[
+        {"amount": 100.0, "source": "Salary", "date": "2023-01-01"},
+        {"amount": 50.0, "source": "Gift", "date": "2023-01-02"},
+    ], headers=auth(user))
+    assert response.json() == {"inserted": 2, "errors": []}
+
+    expenses = client.get("/expenses/", headers=auth(user)).json()
+    assert sorted(len(e["tags"]) for e in expenses) == [0, 0, 1, 1]
+    dashboard = client.get("/stats/monthly", params={
+        "start_month": "2023-01", "end_month": "2023-01"
+    }, headers=auth(user)).json()
+    assert dashboard[0]["total_revenue"] == 150.0
+    assert dashboard[0]["total_expenses"] == 50.0
+
+def test_streaming_export():
+    user = register("Exporter", "exporter@example.com")
+    category = client.post("/categories/", json={"name": "Export Category"}).json()
+    client.post("/expenses/bulk", json=[
+        {"amount": 3.5, "description": f"Coffee, {n}", "date": f"2024-02-{n + 1:02d}",
+         "type": "variable", "category_id": category["id"]}
+        for n in range(3)
+    ], headers=auth(user))
+
+    response = client.get(
+        "/export/expenses", params={"format": "ndjson"}, headers=auth(user)
+    )
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["date"] for r in rows] == ["2024-02-01", "2024-02-02", "2024-02-03"]
+    assert rows[0]["category"] == "Export Category"
+
+    response = client.get(
+        "/export/expenses", params={"start_date": "2024-02-02"}, headers=auth(user)
+    )
+    lines = response.text.splitlines()
+    assert lines[0] == "id,date,amount,description,type,category_id,category"
+    assert len(lines) == 3
+    assert '"Coffee, 1"' in lines[1]
+
+def test_pool_metrics(tmp_path):
+    from database import create_db_engine, pool_status
+
+    pooled = create_db_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}", pool_size=2, max_overflow=1
+    )
+    with pooled.connect(), pooled.connect():
+        status = pool_status(pooled)
+        assert status["pool_class"] == "MeteredQueuePool"
+        assert status["checked_out"] == 2
+    status = pool_status(pooled)
+    assert status["checked_out"] == 0
+    assert status["checkouts"] == 2
+    assert status["timeouts"] == 0
+    pooled.dispose()
+
+    response = client.get("/internal/pool", headers=INTERNAL)
+    assert response.status_code == 200
+    assert "pool_class" in response.json()
+
+def test_reference_data_cache():
+    first = client.get("/tags/")
+    etag = first.headers["ETag"]
+    assert "max-age" in first.headers["Cache-Control"]
+    assert client.get("/tags/", headers={"If-None-Match": etag}).status_code == 304
+
+    tag = client.post("/tags/", json={"name": "cached"}).json()
+    refreshed = client.get("/tags/", headers={"If-None-Match": etag})
+    assert refreshed.status_code == 200
+    assert tag in refreshed.json()
+    assert client.get(f"/tags/{tag['id']}").json() == tag
+
+    user = register("Tagger", "tagger@example.com")
+    category = client.post("/categories/", json={"name": "Tagger Category"}).json()
+    client.get("/categories/")
+
+    statements = []
+
+    def listener(*args):
+        statements.append(args[2])
+
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        response = client.post("/expenses/", json={
+            "amount": 4.0, "description": "Tagged", "date": "2024-07-01",
+            "type": "variable", "category_id": category["id"], "tag_ids": [tag["id"]]
+        }, headers=auth(user))
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert [t["id"] for t in response.json()["tags"]] == [tag["id"]]
+    # Tags are resolved from the cache, not with a SELECT ... WHERE tags.id IN
+    assert not any("tags.id IN" in statement for statement in statements)
+
+def test_user_data_conditional_requests(monkeypatch):
+    from services import stats_cache
+
+    # Per-process counters cannot version data for several workers: no ETag
+    user = register("No Etag", "noetag@example.com")
+    response = client.get("/expenses/", headers=auth(user))
+    assert response.headers["Cache-Control"] == "private, no-cache"
+    assert "ETag" not in response.headers
+
+    # As with the redis backend, shared by every worker
+    monkeypatch.setattr(stats_cache.cache.backend, "shared", True)
+    user = register("Etag", "etag@example.com")
+    category = client.post("/categories/", json={"name": "Etag Category"}).json()
+    expense = {"amount": 9.0, "description": "Lunch", "date": "2024-08-01",
+               "type": "variable", "category_id": category["id"]}
+    client.post("/expenses/", json=expense, headers=auth(user))
+
+    paths = ["/expenses/", "/revenues/", "/budgets/", "/budgets/dashboard"]
+    etags = {}
+
+    def if_none_match(path):
+        return {"If-None-Match": etags[path], **auth(user)}
+
+    for path in paths:
+        response = client.get(path, headers=auth(user))
+        assert response.headers["Cache-Control"] == "private, no-cache"
+        etags[path] = response.headers["ETag"]
+
+        def revalidate():
+            cached = client.get(path, headers=if_none_match(path))
+            assert cached.status_code == 304
+            assert cached.content == b""
+
+        assert count_statements(revalidate) == 0
+
+    # Query parameters select another representation
+    response = client.get(
+        "/expenses/", params={"limit": 1}, headers=if_none_match("/expenses/")
+    )
+    assert response.status_code == 200
+
+    client.post("/expenses/", json=expense, headers=auth(user))
+    for path in paths:
+        response = client.get(path, headers=if_none_match(path))
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etags[path]
+
+def test_fast_json_listings_match_models(monkeypatch):
+    from config import settings
+    from services import stats_cache
+
+    monkeypatch.setattr(stats_cache.cache.backend, "shared", True)
+
+    user = register("Fast", "fast@example.com")
+    category = client.post("/categories/", json={"name": "Fast Category"}).json()
+    tags = [
+        client.post("/tags/", json={"name": f"fast-{n}"}).json() for n in range(2)
+    ]
+    for n in range(40):
+        day = f"2024-09-{n % 28 + 1:02d}"
+        client.post("/expenses/", json={
+            "amount": 1.25 * n, "description": f"Fast {n}", "date": day,
+            "type": "variable", "category_id": category["id"],
+            "tag_ids": [t["id"] for t in tags[:n % 3]]
+        }, headers=auth(user))
+        client.post("/revenues/", json={
+            "amount": 10.0 * n, "source": f"Fast {n}", "date": day
+        }, headers=auth(user))
+
+    for path in ("/expenses/", "/revenues/"):
+        params = {"limit": 15}
+        expected = client.get(path, params=params, headers=auth(user))
+        monkeypatch.setattr(settings, "FAST_JSON_LISTINGS", True)
+        fast = client.get(path, params=params, headers=auth(user))
+        monkeypatch.setattr(settings, "FAST_JSON_LISTINGS", False)
+
+        assert fast.json() == expected.json()
+        assert fast.headers["X-Next-Cursor"] == expected.headers["X-Next-Cursor"]
+        assert fast.headers["ETag"] == expected.headers["ETag"]
+
+    compressed = client.get(
+        "/expenses/", headers={"Accept-Encoding": "gzip", **auth(user)}
+    )
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert len(compressed.json()) == 40
+
+def test_login_rehashes_on_cost_change(monkeypatch):
+    import models
+    from services.auth import password_hasher
+
+    register("Rehash", "rehash@example.com")
+    credentials = {"email": "rehash@example.com", "password": "testpassword123"}
+
+    monkeypatch.setattr(password_hasher, "rounds", 5)
+    assert client.post("/auth/login", data=credentials).status_code == 200
+    db = TestingSessionLocal()
+    try:
+        stored = db.query(models.User.password_hash).filter(
+            models.User.email == credentials["email"]
+        ).scalar()
+    finally:
+        db.close()
+    assert stored.startswith("$2b$05$")
+
+    def login(**overrides):
+        return client.post("/auth/login", data={**credentials, **overrides})
+
+    assert login().status_code == 200
+    assert login(password="wrong").status_code == 401
+    assert login(email="nobody@example.com").status_code == 401
+
+    stats = client.get("/internal/password-hashing", headers=INTERNAL).json()
+    assert stats["completed"] >= 4
+    assert stats["in_flight"] == 0
+
+    # A full queue sheds load instead of growing
+    capacity = password_hasher.workers + password_hasher.max_waiting
+    monkeypatch.setattr(password_hasher, "in_flight", capacity)
+    assert login().status_code == 503
+
+def test_token_authentication():
+    from services.auth import token_claims
+
+    register("Bearer", "bearer@example.com")
+    other = register("Other", "other@example.com")
+    tokens = client.post(
+        "/auth/login",
+        data={"email": "bearer@example.com", "password": "testpassword123"}
+    ).json()
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+
+    budget = {"month": "2024-10", "amount": 500.0}
+    assert client.post("/budgets/", json=budget, headers=headers).status_code == 200
+    # The identity comes from the token, a user_id parameter cannot override it
+    budgets = client.get(
+        "/budgets/", params={"user_id": other["id"]}, headers=headers
+    ).json()
+    assert [b["user_id"] for b in budgets] == [tokens["user"]["id"]]
+
+    hits = token_claims.stats()["hits"]
+    assert client.get("/budgets/dashboard", headers=headers).status_code == 200
+    assert token_claims.stats()["hits"] == hits + 1
+
+    assert client.get("/budgets/").status_code == 401
+    garbage = {"Authorization": "Bearer garbage"}
+    assert client.get("/budgets/", headers=garbage).status_code == 401
+    refresh_as_access = {"Authorization": f"Bearer {tokens['refresh_token']}"}
+    assert client.get("/budgets/", headers=refresh_as_access).status_code == 401
+
+    def refresh(token):
+        return client.post("/auth/refresh", json={"refresh_token": token})
+
+    refreshed = refresh(tokens["refresh_token"])
+    assert refreshed.status_code == 200
+    access = {"Authorization": f"Bearer {refreshed.json()['access_token']}"}
+    assert client.get("/budgets/", headers=access).json() == budgets
+    assert refresh(tokens["access_token"]).status_code == 401
+
+def test_budget_alerts():
+    from datetime import date
+    from services import alerts
+    from services.rollup import month_key
+
+    user = register("Alerted", "alerted@example.com")
+    category = client.post("/categories/", json={"name": "Alert Category"}).json()
+    today = date.today()
+    month = month_key(today)
+    client.post("/budgets/", json={"month": month, "amount": 100.0}, headers=auth(user))
+
+    def spend(amount, day=today):
+        client.post("/expenses/", json={
+            "amount": amount, "description": "Spend", "date": day.isoformat(),
+            "type": "variable", "category_id": category["id"]
+        }, headers=auth(user))
+
+    def thresholds():
+        raised = client.get("/alerts/", headers=auth(user)).json()
+        return sorted(a["threshold"] for a in raised)
+
+    spend(70.0)
+    assert thresholds() == []
+    spend(15.0)
+    assert thresholds() == [80]
+    spend(5.0)
+    assert thresholds() == [80]
+    # Past months are backfill, they never alert
+    spend(500.0, date(2020, 1, 1))
+    client.post("/expenses/bulk", json=[
+        {"amount": 10.0, "description": "Bulk", "date": today.isoformat(),
+         "type": "variable", "category_id": category["id"]}
+    ], headers=auth(user))
+    assert thresholds() == [80, 100]
+
+    # Lowering the budget is checked too, and the nightly sweep finds nothing new
+    client.post("/budgets/", json={"month": month, "amount": 50.0}, headers=auth(user))
+    db = TestingSessionLocal()
+    try:
+        assert alerts.sweep(db, chunk_size=1) == 0
+    finally:
+        db.close()
+    assert thresholds() == [80, 100]
+
+def wait_for_job(test_client, path, headers=None, timeout=10.0):
+    import time
+
+    deadline = time.monotonic() + timeout
+    while True:
+        job = test_client.get(path, headers=headers).json()
+        if job["status"] in ("succeeded", "failed") or time.monotonic() > deadline:
+            return job
+        time.sleep(0.05)
+
+def test_background_jobs(monkeypatch):
+    import os
+    import threading
+    import time
+    from config import settings
+    from services import jobs
+
+    monkeypatch.setattr(settings, "JOB_RETRY_BACKOFF", 0)
+    attempts, active, lock = {}, [0, 0], threading.Lock()
+
+    @jobs.job_type("test_flaky", concurrency=1, max_attempts=2)
+    def flaky(db, payload):
+        with lock:
+            attempts[payload["n"]] = attempts.get(payload["n"], 0) + 1
+            active[0] += 1
+            active[1] = max(active)
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+        if payload["n"] == 0 and attempts[0] == 1:
+            raise RuntimeError("transient")
+        return {"n": payload["n"]}
+
+    user = register("Jobs", "jobs@example.com")
+    category = client.post("/categories/", json={"name": "Jobs Category"}).json()
+    statement = (
+        "Date;Libellé;Montant\n02/01/2023;Courses;-42,50\n03/01/2023;Salaire;1 500,00\n"
+    )
+
+    try:
+        with TestClient(app) as lifespan_client:
+            def job_status(path, headers):
+                return wait_for_job(lifespan_client, path, headers)["status"]
+
+            queued = lifespan_client.post(
+                "/imports/statement",
+                params={"category_id": category["id"], "background": True},
+                files={"file": ("releve.csv", statement.encode(), "text/csv")},
+                headers=auth(user)
+            ).json()
+            assert queued["status"] == "queued"
+            job = wait_for_job(
+                lifespan_client, f"/jobs/{queued['job_id']}", auth(user)
+            )
+            assert job["status"] == "succeeded"
+            result = job["result"]
+            assert (result["inserted"], result["status"]) == (2, "completed")
+            assert not os.listdir(settings.JOB_SPOOL_DIR)
+
+            rebuild = lifespan_client.post("/jobs/rollup-rebuild", headers=auth(user))
+            assert rebuild.status_code == 202
+            rebuild_path = f"/jobs/{rebuild.json()['id']}"
+            assert job_status(rebuild_path, auth(user)) == "succeeded"
+            assert lifespan_client.get(rebuild_path).status_code == 401
+
+            db = TestingSessionLocal()
+            try:
+                ids = [jobs.enqueue(db, "test_flaky", {"n": n}).id for n in range(3)]
+                missing = jobs.enqueue(
+                    db, "statement_import", {"import_id": 999999, "category_id": 1}
+                ).id
+            finally:
+                db.close()
+            # A missing import fails at once instead of being retried
+            failed = wait_for_job(
+                lifespan_client, f"/internal/jobs/{missing}", INTERNAL
+            )
+            assert (failed["status"], failed["attempts"]) == ("failed", 1)
+            assert failed["last_error"].startswith(
+                "JobFailed: Statement import 999999 not found"
+            )
+            results = [
+                wait_for_job(lifespan_client, f"/internal/jobs/{job_id}", INTERNAL)
+                for job_id in ids
+            ]
+            assert [r["status"] for r in results] == ["succeeded"] * 3
+            assert (results[0]["attempts"], results[0]["last_error"]) == (
+                2, "RuntimeError: transient"
+            )
+            assert results[1]["result"] == {"n": 1}
+            # concurrency=1: never two test_flaky jobs at once
+            assert active[1] == 1
+            queues = lifespan_client.get("/internal/jobs", headers=INTERNAL).json()
+            assert queues["queue"]["test_flaky"] == {"succeeded": 3}
+            # Only global jobs can be queued from /internal, with a validated payload
+            for job_type in ("unknown", "test_flaky", "statement_import"):
+                response = lifespan_client.post(
+                    f"/internal/jobs/{job_type}", headers=INTERNAL
+                )
+                assert response.status_code == 404
+            assert lifespan_client.post(
+                "/internal/jobs/rollup_rebuild", json={"path": "/tmp/x"},
+                headers=INTERNAL
+            ).status_code == 422
+            sweep = lifespan_client.post(
+                "/internal/jobs/alert_sweep", json={"chunk_size": 50}, headers=INTERNAL
+            )
+            assert sweep.status_code == 202
+            sweep_path = f"/internal/jobs/{sweep.json()['id']}"
+            assert job_status(sweep_path, INTERNAL) == "succeeded"
+    finally:
+        jobs.JOB_TYPES.pop("test_flaky")
+
+def test_rollup_rebuild_requests_are_deduplicated():
+    import models
+
+    user = register("Rebuild", "rebuild@example.com")
+    other = register("Rebuild Other", "rebuild.other@example.com")
+
+    def rebuild(who):
+        response = client.post("/jobs/rollup-rebuild", headers=auth(who))
+        assert response.status_code == 202
+        return response.json()["id"]
+
+    # Without the lifespan no runner claims the job, it stays queued
+    first = rebuild(user)
+    assert [rebuild(user) for _ in range(3)] == [first] * 3
+    assert rebuild(other) != first
+
+    db = TestingSessionLocal()
+    try:
+        queued = db.query(models.Job).filter(
+            models.Job.type == "rollup_rebuild",
+            models.Job.user_id.in_((user["id"], other["id"]))
+        )
+        assert queued.count() == 2
+        db.get(models.Job, first).status = "succeeded"
+        db.commit()
+        # Once finished, a new rebuild can be requested
+        again = rebuild(user)
+        assert again != first
+        # Leave no queued job behind for the runner of later tests
+        for job in queued.filter(models.Job.status == "queued"):
+            job.status = "succeeded"
+        db.commit()
+    finally:
+        db.close()
+
+def test_recurring_transactions():
+    from datetime import date, timedelta
+
+    user = register("Recurring", "recurring@example.com")
+    category = client.post("/categories/", json={"name": "Recurring Category"}).json()
+    today = date.today()
+    if today.month == 12:
+        start = date(today.year + 1, 1, 1)
+    else:
+        start = date(today.year, today.month + 1, 1)
+    rule = {
+        "kind": "expense", "amount": 30.0, "label": "Streaming",
+        "category_id": category["id"], "frequency": "monthly", "day": 31,
+        "start_date": start.isoformat()
+    }
+
+    def create(fields):
+        return client.post("/recurring/", json=fields, headers=auth(user))
+
+    assert create({**rule, "category_id": None}).status_code == 400
+    assert create({**rule, "day": 0}).status_code == 400
+    created = create(rule)
+    assert created.status_code == 200
+    assert (created.json()["user_id"], created.json()["materialized_through"]) == (
+        user["id"], None
+    )
+    rules = client.get("/recurring/", headers=auth(user)).json()
+    assert [r["id"] for r in rules] == [created.json()["id"]]
+
+    end = start + timedelta(days=95)
+    occurrences = client.get(
+        "/recurring/occurrences",
+        params={"start_date": start.isoformat(), "end_date": end.isoformat()},
+        headers=auth(user)
+    ).json()
+    assert len(occurrences) == 3
+    assert {o["amount"] for o in occurrences} == {30.0}
+    # Projected occurrences count in the statistics before they are written
+    first_month = start.strftime("%Y-%m")
+    series = client.get(
+        "/stats/monthly",
+        params={"start_month": first_month, "end_month": first_month},
+        headers=auth(user)
+    ).json()
+    assert series[0]["total_expenses"] == 30.0
+    # Expanding a rule is bounded, however long the range asked for
+    too_long = client.get(
+        "/recurring/occurrences",
+        params={"start_date": "0001-01-01", "end_date": "9999-12-31"},
+        headers=auth(user)
+    )
+    assert too_long.status_code == 400
+    too_long = client.get(
+        "/stats/monthly", params={"start_month": "0001-01", "end_month": "9999-12"},
+        headers=auth(user)
+    )
+    assert too_long.status_code == 400
+
+    other = register("Other", "recurring-other@example.com")
+    rule_path = f"/recurring/{created.json()['id']}"
+    assert client.delete(rule_path, headers=auth(other)).status_code == 404
+    assert client.delete(rule_path, headers=auth(user)).status_code == 200
+    assert client.get("/recurring/", headers=auth(user)).json() == []
+
+def test_request_metrics(monkeypatch, caplog):
+    from config import settings
+    from services import metrics
+
+    user = register("Metrics", "metrics@example.com")
+    metrics.registry.reset()
+
+    assert "Server-Timing" not in client.get("/expenses/", headers=auth(user)).headers
+    monkeypatch.setattr(settings, "SERVER_TIMING", True)
+    timed = client.get("/expenses/", headers={**auth(user), "X-Server-Timing": "1"})
+    assert timed.status_code == 200
+    assert timed.headers["Server-Timing"].startswith('db;dur=')
+    assert "serialize;dur=" in timed.headers["Server-Timing"]
+    assert client.get("/expenses/999999", headers=auth(user)).status_code == 404
+
+    monkeypatch.setattr(settings, "SLOW_QUERY_MS", 0.000001)
+    with caplog.at_level("WARNING", logger="services.metrics"):
+        client.get("/alerts/", headers=auth(user))
+    messages = [record.getMessage() for record in caplog.records]
+    slow = [message for message in messages if "FROM alerts" in message]
+    # Only the parameter types are logged unless values are asked for
+    assert slow and all("parameters=(int" in message for message in slow)
+    assert not any(f"({user['id']}," in message for message in slow)
+    caplog.clear()
+    monkeypatch.setattr(settings, "SLOW_QUERY_LOG_PARAMETERS", True)
+    with caplog.at_level("WARNING", logger="services.metrics"):
+        client.get("/alerts/", headers=auth(user))
+    messages = [record.getMessage() for record in caplog.records]
+    assert any(
+        "FROM alerts" in message and f"({user['id']}," in message
+        for message in messages
+    )
+
+    response = client.get("/metrics", headers=INTERNAL)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    lines = response.text.splitlines()
+    # Labelled by route template, so each expense id does not get its own series
+    count = "budgetwise_request_duration_seconds_count"
+    assert f'{count}{{method="GET",route="/expenses/"}} 2' in lines
+    assert f'{count}{{method="GET",route="/expenses/{{expense_id}}"}} 1' in lines
+
+    def value(prefix):
+        return next(line for line in lines if line.startswith(prefix)).split()[-1]
+
+    queries = 'budgetwise_request_queries_total{method="GET",route="/expenses/"}'
+    assert int(value(queries)) >= 2
+    assert int(value("budgetwise_slow_queries_total")) >= 1
+
+def test_analytics_endpoints():
+    user = register("Analytics", "analytics@example.com")
+    category = client.post("/categories/", json={"name": "Analytics Category"}).json()
+    for day, amount in (
+        ("2024-01-10", 20.0), ("2024-02-10", 30.0), ("2024-02-12", 50.0)
+    ):
+        client.post("/expenses/", json={
+            "amount": amount, "description": "Analytics", "date": day,
+            "type": "variable", "category_id": category["id"]
+        }, headers=auth(user))
+
+    def stats(path, **params):
+        return client.get(f"/stats/{path}", params=params, headers=auth(user))
+
+    changes = stats(
+        "month-over-month", start_month="2024-01", end_month="2024-02"
+    ).json()
+    assert [
+        (m["month"], m["total_expenses"], m["expenses_change_pct"]) for m in changes
+    ] == [("2024-01", 20.0, None), ("2024-02", 80.0, 300.0)]
+    distribution = stats(
+        "category-distribution", start_date="2024-01-01", end_date="2024-12-31",
+        percentiles=[0, 100]
+    ).json()
+    assert distribution[0]["percentiles"] == {"p0": 20.0, "p100": 50.0}
+    rolling = stats(
+        "rolling", start_date="2024-02-10", end_date="2024-02-12", window=3
+    ).json()
+    assert [p["rolling_average"] for p in rolling] == [10.0, 10.0, 80.0 / 3]
+    balance = stats(
+        "balance", start_date="2024-01-01", end_date="2024-02-29", granularity="month"
+    ).json()
+    assert [p["balance"] for p in balance] == [-20.0, -100.0]
+
+    assert stats(
+        "rolling", start_date="2024-01-01", end_date="2024-02-01", window=0
+    ).status_code == 422
+    assert stats(
+        "balance", start_date="2000-01-01", end_date="2024-12-31"
+    ).status_code == 400
+    assert stats(
+        "balance", start_date="0001-01-01", end_date="9999-12-31", granularity="month"
+    ).status_code == 400
+    assert stats(
+        "month-over-month", start_month="0001-01", end_month="9999-12"
+    ).status_code == 400
+    assert client.get("/internal/analytics", headers=INTERNAL).json()["users"] >= 1
+
+def test_budget_forecast():
+    from datetime import date
+
+    user = register("Forecast", "forecast@example.com")
+    category = client.post("/categories/", json={"name": "Forecast Category"}).json()
+    today = date.today()
+    month = today.strftime("%Y-%m")
+    client.post("/budgets/", json={"month": month, "amount": 100.0}, headers=auth(user))
+    client.post("/expenses/", json={
+        "amount": 60.0, "description": "Forecast", "date": today.isoformat(),
+        "type": "variable", "category_id": category["id"]
+    }, headers=auth(user))
+
+    projection = client.get("/budgets/forecast", headers=auth(user)).json()
+    assert (
+        projection["month"], projection["spent_to_date"], projection["monthly_budget"]
+    ) == (month, 60.0, 100.0)
+    assert projection["categories"][0]["category_id"] == category["id"]
+    invalid = client.get(
+        "/budgets/forecast", params={"month": "2024-13"}, headers=auth(user)
+    )
+    assert invalid.status_code == 422
+
+    dashboard = client.get("/budgets/dashboard", headers=auth(user)).json()
+    assert dashboard["forecast"] is None
+    dashboard = client.get(
+        "/budgets/dashboard", params={"forecast": "true"}, headers=auth(user)
+    ).json()
+    assert dashboard["forecast"] == projection
+
+def test_internal_dashboard_report():
+    user = register("Report", "report@example.com")
+    client.post("/revenues/", json={
+        "amount": 250.0, "source": "Report", "date": "2024-01-05"
+    }, headers=auth(user))
+
+    # Every user's balances: operators only
+    assert client.get("/internal/dashboards").status_code == 403
+    assert client.get("/internal/dashboards", headers=auth(user)).status_code == 403
+
+    response = client.get(
+        "/internal/dashboards", params={"user_id": [user["id"]]}, headers=INTERNAL
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    dashboard = client.get("/budgets/dashboard", headers=auth(user)).json()
+    dashboard.pop("forecast")
+    assert lines == [{"user_id": user["id"], **dashboard}]
+
+    report = client.get(
+        "/internal/dashboards", params={"chunk_size": 3}, headers=INTERNAL
+    )
+    every_user = [json.loads(line)["user_id"] for line in report.text.splitlines()]
+    assert user["id"] in every_user and every_user == sorted(every_user)
+
+def test_internal_endpoints_need_the_internal_token(monkeypatch):
+    user = register("Operator", "operator@example.com")
+
+    for path in ("/internal/pool", "/internal/cache", "/internal/jobs", "/metrics"):
+        assert client.get(path).status_code == 403
+        assert client.get(path, headers=auth(user)).status_code == 403
+        wrong = {"X-Internal-Token": "wrong"}
+        assert client.get(path, headers=wrong).status_code == 403
+        assert client.get(path, headers=INTERNAL).status_code == 200
+    bearer = {"Authorization": f"Bearer {settings.INTERNAL_API_TOKEN}"}
+    assert client.get("/metrics", headers=bearer).status_code == 200
+
+    # No token configured: closed to everyone
+    monkeypatch.setattr(settings, "INTERNAL_API_TOKEN", "")
+    empty = {"X-Internal-Token": ""}
+    assert client.get("/internal/pool", headers=empty).status_code == 403
@@ -20,9 +20,18 @@ function setCurrentUser(user) {
 // Clear current user
 function clearCurrentUser() {
     removeLocalStorage('currentUser');
+    removeLocalStorage('authTokens');
     updateNavigation();
 }
 
+// Store the access and refresh tokens issued by /auth/login and /auth/refresh
+function setAuthTokens(data) {
+    setLocalStorage('authTokens', {
+        accessToken: data.access_token,
+        refreshToken: data.refresh_token
+    });
+}
+
 // Update navigation based on auth status
 function updateNavigation() {
     const user = getCurrentUser();
@@ -68,14 +77,16 @@ async function handleLogin(e) {
     if (spinner) spinner.classList.remove('d-none');
     
     try {
-        const response = await fetch(`${API_BASE_URL}/auth/login?email=${encodeURIComponent(email)}&password=${encodeURIComponent(password)}`, {
-            method: 'POST'
+        const response = await fetch(`${API_BASE_URL}/auth/login`, {
+            method: 'POST',
+            body: new URLSearchParams({ email: email, password: password })
         });
         
         if (response.ok) {
             const data = await response.json();
             
-            // Store user data
+            // Store user data and tokens
+            setAuthTokens(data);
             setCurrentUser(data.user);
             
             showToast('Connexion réussie !', 'success');
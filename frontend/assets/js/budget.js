@@ -44,12 +44,12 @@ async function loadCurrentBudget() {
     
     try {
         // Get budget for current month
-        const budget = await apiRequest(`/budgets/month/${currentMonth}?user_id=${user.id}`);
+        const budget = await apiRequest(`/budgets/month/${currentMonth}`);
         
         // Get expenses for current month
         const startDate = `${currentMonth}-01`;
         const endDate = `${currentMonth}-31`;
-        const expenses = await apiRequest(`/expenses?user_id=${user.id}&start_date=${startDate}&end_date=${endDate}`);
+        const expenses = await apiRequestAllPages(`/expenses?start_date=${startDate}&end_date=${endDate}`);
         
         const totalExpenses = sumByProperty(expenses, 'amount');
         const remaining = budget.amount - totalExpenses;
@@ -112,7 +112,7 @@ async function loadBudgetHistory() {
     if (!user) return;
     
     try {
-        const budgets = await apiRequest(`/budgets?user_id=${user.id}`);
+        const budgets = await apiRequest(`/budgets`);
         budgetHistory = budgets;
         
         // Get expenses for each budget month
@@ -121,7 +121,7 @@ async function loadBudgetHistory() {
                 try {
                     const startDate = `${budget.month}-01`;
                     const endDate = `${budget.month}-31`;
-                    const expenses = await apiRequest(`/expenses?user_id=${user.id}&start_date=${startDate}&end_date=${endDate}`);
+                    const expenses = await apiRequestAllPages(`/expenses?start_date=${startDate}&end_date=${endDate}`);
                     const totalExpenses = sumByProperty(expenses, 'amount');
                     
                     return {
@@ -245,8 +245,7 @@ async function handleSetBudget(e) {
             method: 'POST',
             body: JSON.stringify({
                 month: month,
-                amount: amount,
-                user_id: user.id
+                amount: amount
             })
         });
         
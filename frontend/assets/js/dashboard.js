@@ -18,7 +18,7 @@ async function loadDashboardData() {
     if (!user) return;
     
     try {
-        const response = await apiRequest(`/budgets/dashboard?user_id=${user.id}`);
+        const response = await apiRequest(`/budgets/dashboard`);
         updateDashboardStats(response);
         await loadRecentTransactions();
         updateExpenseChart(response.top_categories);
@@ -68,8 +68,8 @@ async function loadRecentTransactions() {
     
     try {
         const [expensesResponse, revenuesResponse] = await Promise.all([
-            apiRequest(`/expenses?user_id=${user.id}&limit=5`),
-            apiRequest(`/revenues?user_id=${user.id}&limit=5`)
+            apiRequest(`/expenses?limit=5`),
+            apiRequest(`/revenues?limit=5`)
         ]);
         
         const allTransactions = [
@@ -58,15 +58,20 @@ async function loadStatistics() {
     const { startDate, endDate } = getSelectedPeriod();
     
     try {
-        // Load transactions for the selected period
-        const [expenses, revenues] = await Promise.all([
-            apiRequest(`/expenses?user_id=${user.id}&start_date=${startDate}&end_date=${endDate}`),
-            apiRequest(`/revenues?user_id=${user.id}&start_date=${startDate}&end_date=${endDate}`)
+        // Load pre-aggregated statistics for the selected period
+        const range = `start_date=${startDate}&end_date=${endDate}`;
+        const [timeseries, categories, types] = await Promise.all([
+            apiRequest(`/stats/timeseries?${range}&granularity=month`),
+            apiRequest(`/stats/categories?${range}`),
+            apiRequest(`/stats/types?${range}`)
         ]);
         
         statisticsData = {
-            expenses,
-            revenues,
+            timeseries,
+            categories,
+            types,
+            totalRevenue: sumByProperty(timeseries, 'total_revenue'),
+            totalExpenses: sumByProperty(timeseries, 'total_expenses'),
             startDate,
             endDate
         };
@@ -114,10 +119,8 @@ function getSelectedPeriod() {
 
 // Update summary cards
 function updateSummaryCards() {
-    const { expenses, revenues, startDate, endDate } = statisticsData;
+    const { totalRevenue, totalExpenses, startDate, endDate } = statisticsData;
     
-    const totalRevenue = sumByProperty(revenues, 'amount');
-    const totalExpenses = sumByProperty(expenses, 'amount');
     const netBalance = totalRevenue - totalExpenses;
     
     // Calculate average daily spending
@@ -156,10 +159,9 @@ function updateCategoryChart() {
     
     if (!ctx) return;
     
-    const { expenses } = statisticsData;
-    const categoryData = groupByProperty(expenses, 'category_id');
+    const { categories } = statisticsData;
     
-    if (Object.keys(categoryData).length === 0) {
+    if (categories.length === 0) {
         showElement('noCategoryData', true);
         if (charts.category) {
             charts.category.destroy();
@@ -174,15 +176,8 @@ function updateCategoryChart() {
         charts.category.destroy();
     }
     
-    const labels = [];
-    const data = [];
-    
-    Object.entries(categoryData).forEach(([categoryId, categoryExpenses]) => {
-        const categoryName = categoryExpenses[0]?.category?.name || 'Sans catégorie';
-        const total = sumByProperty(categoryExpenses, 'amount');
-        labels.push(categoryName);
-        data.push(total);
-    });
+    const labels = categories.map(category => category.category_name);
+    const data = categories.map(category => category.total_amount);
     
     const colors = generateColorPalette(data.length);
     
@@ -230,9 +225,9 @@ function updateMonthlyChart() {
     
     if (!ctx) return;
     
-    const { expenses, revenues } = statisticsData;
+    const { timeseries, totalRevenue, totalExpenses } = statisticsData;
     
-    if (expenses.length === 0 && revenues.length === 0) {
+    if (totalRevenue === 0 && totalExpenses === 0) {
         showElement('noMonthlyData', true);
         if (charts.monthly) {
             charts.monthly.destroy();
@@ -247,26 +242,10 @@ function updateMonthlyChart() {
         charts.monthly.destroy();
     }
     
-    // Group by month
-    const monthlyData = {};
-    
-    [...expenses, ...revenues].forEach(transaction => {
-        const month = transaction.date.substring(0, 7); // YYYY-MM
-        if (!monthlyData[month]) {
-            monthlyData[month] = { expenses: 0, revenues: 0 };
-        }
-        
-        if (transaction.hasOwnProperty('description')) {
-            monthlyData[month].expenses += transaction.amount;
-        } else {
-            monthlyData[month].revenues += transaction.amount;
-        }
-    });
-    
-    const sortedMonths = Object.keys(monthlyData).sort();
-    const labels = sortedMonths.map(month => getMonthName(month));
-    const expenseData = sortedMonths.map(month => monthlyData[month].expenses);
-    const revenueData = sortedMonths.map(month => monthlyData[month].revenues);
+    // One point per month, already summed by the server
+    const labels = timeseries.map(point => getMonthName(point.period));
+    const expenseData = timeseries.map(point => point.total_expenses);
+    const revenueData = timeseries.map(point => point.total_revenue);
     
     charts.monthly = new Chart(ctx, {
         type: 'line',
@@ -327,9 +306,9 @@ function updateTypeChart() {
     
     if (!ctx) return;
     
-    const { expenses } = statisticsData;
+    const { types } = statisticsData;
     
-    if (expenses.length === 0) {
+    if (types.length === 0) {
         showElement('noTypeData', true);
         if (charts.type) {
             charts.type.destroy();
@@ -344,9 +323,8 @@ function updateTypeChart() {
         charts.type.destroy();
     }
     
-    const typeData = groupByProperty(expenses, 'type');
-    const labels = Object.keys(typeData);
-    const data = labels.map(type => sumByProperty(typeData[type], 'amount'));
+    const labels = types.map(typeStats => typeStats.type);
+    const data = types.map(typeStats => typeStats.total_amount);
     const colors = generateColorPalette(data.length);
     
     charts.type = new Chart(ctx, {
@@ -396,9 +374,9 @@ function updateComparisonChart() {
     
     if (!ctx) return;
     
-    const { expenses, revenues } = statisticsData;
+    const { totalRevenue, totalExpenses } = statisticsData;
     
-    if (expenses.length === 0 && revenues.length === 0) {
+    if (totalRevenue === 0 && totalExpenses === 0) {
         showElement('noComparisonData', true);
         if (charts.comparison) {
             charts.comparison.destroy();
@@ -413,9 +391,6 @@ function updateComparisonChart() {
         charts.comparison.destroy();
     }
     
-    const totalRevenue = sumByProperty(revenues, 'amount');
-    const totalExpenses = sumByProperty(expenses, 'amount');
-    
     charts.comparison = new Chart(ctx, {
         type: 'bar',
         data: {
@@ -463,9 +438,9 @@ function updateTopCategoriesTable() {
     
     if (!tableBody) return;
     
-    const { expenses } = statisticsData;
+    const { categories, totalExpenses } = statisticsData;
     
-    if (expenses.length === 0) {
+    if (categories.length === 0) {
         tableBody.innerHTML = '';
         showElement('noTopCategories', true);
         return;
@@ -473,24 +448,15 @@ function updateTopCategoriesTable() {
     
     showElement('noTopCategories', false);
     
-    const categoryData = groupByProperty(expenses, 'category_id');
-    const categoryStats = Object.entries(categoryData).map(([categoryId, categoryExpenses]) => {
-        const categoryName = categoryExpenses[0]?.category?.name || 'Sans catégorie';
-        const total = sumByProperty(categoryExpenses, 'amount');
-        const count = categoryExpenses.length;
-        
-        return {
-            name: categoryName,
-            total: total,
-            count: count
-        };
-    });
+    const categoryStats = categories.map(category => ({
+        name: category.category_name,
+        total: category.total_amount,
+        count: category.transaction_count
+    }));
     
     // Sort by total amount (descending)
     categoryStats.sort((a, b) => b.total - a.total);
     
-    const totalExpenses = sumByProperty(expenses, 'amount');
-    
     tableBody.innerHTML = '';
     
     categoryStats.forEach((category, index) => {
@@ -526,8 +492,17 @@ function exportToPDF() {
 }
 
 // Export to CSV
-function exportToCSV() {
-    const { expenses, revenues } = statisticsData;
+async function exportStatisticsToCSV() {
+    const user = getCurrentUser();
+    if (!user) return;
+    
+    // The charts only hold aggregates, so fetch the transactions on demand
+    const { startDate, endDate } = statisticsData;
+    const range = `start_date=${startDate}&end_date=${endDate}`;
+    const [expenses, revenues] = await Promise.all([
+        apiRequestAllPages(`/expenses?${range}`),
+        apiRequestAllPages(`/revenues?${range}`)
+    ]);
     
     if (expenses.length === 0 && revenues.length === 0) {
         showToast('Aucune donnée à exporter', 'warning');
@@ -102,8 +102,8 @@ async function loadTransactions() {
     
     try {
         const [expenses, revenues] = await Promise.all([
-            apiRequest(`/expenses?user_id=${user.id}`),
-            apiRequest(`/revenues?user_id=${user.id}`)
+            apiRequest(`/expenses`),
+            apiRequest(`/revenues`)
         ]);
         
         allTransactions = [
@@ -235,8 +235,7 @@ async function handleAddRevenue(e) {
             body: JSON.stringify({
                 amount: amount,
                 source: source,
-                date: date,
-                user_id: user.id
+                date: date
             })
         });
         
@@ -303,8 +302,7 @@ async function handleAddExpense(e) {
                 description: description,
                 category_id: categoryId,
                 type: type,
-                date: date,
-                user_id: user.id
+                date: date
             })
         });
         
@@ -383,7 +381,7 @@ async function deleteTransaction(id, type) {
     
     try {
         const endpoint = type === 'expense' ? 'expenses' : 'revenues';
-        await apiRequest(`/${endpoint}/${id}?user_id=${user.id}`, {
+        await apiRequest(`/${endpoint}/${id}`, {
             method: 'DELETE'
         });
         
@@ -101,20 +101,59 @@ function showToast(message, type = 'info', duration = 5000) {
     });
 }
 
-// Make API request
-async function apiRequest(endpoint, options = {}) {
-    const url = `${API_BASE_URL}${endpoint}`;
+// Authorization header for the stored access token
+function authHeaders() {
+    const tokens = getLocalStorage('authTokens');
+    return tokens ? { 'Authorization': `Bearer ${tokens.accessToken}` } : {};
+}
+
+// Exchange the refresh token for new tokens; false when the session is over
+async function refreshAuthTokens() {
+    const tokens = getLocalStorage('authTokens');
+    if (!tokens) return false;
     
-    const defaultOptions = {
+    const response = await fetch(`${API_BASE_URL}/auth/refresh`, {
+        method: 'POST',
         headers: {
             'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ refresh_token: tokens.refreshToken })
+    });
+    if (!response.ok) return false;
+    
+    setAuthTokens(await response.json());
+    return true;
+}
+
+// Fetch with the access token, refreshing it once when it has expired
+async function authorizedFetch(url, options = {}) {
+    const send = () => fetch(url, {
+        ...options,
+        headers: {
+            'Content-Type': 'application/json',
+            ...authHeaders(),
+            ...(options.headers || {})
         }
-    };
+    });
     
-    const finalOptions = { ...defaultOptions, ...options };
+    let response = await send();
+    if (response.status === 401) {
+        if (await refreshAuthTokens()) {
+            response = await send();
+        } else {
+            clearCurrentUser();
+            window.location.href = 'login.html';
+        }
+    }
+    return response;
+}
+
+// Make API request
+async function apiRequest(endpoint, options = {}) {
+    const url = `${API_BASE_URL}${endpoint}`;
     
     try {
-        const response = await fetch(url, finalOptions);
+        const response = await authorizedFetch(url, options);
         
         if (!response.ok) {
             const errorData = await response.json().catch(() => ({}));
@@ -128,6 +167,32 @@ async function apiRequest(endpoint, options = {}) {
     }
 }
 
+// Fetch every page of a list endpoint by following its X-Next-Cursor header
+async function apiRequestAllPages(endpoint) {
+    const separator = endpoint.includes('?') ? '&' : '?';
+    const items = [];
+    let cursor = null;
+    
+    do {
+        let url = `${API_BASE_URL}${endpoint}${separator}limit=1000`;
+        if (cursor) {
+            url += `&cursor=${encodeURIComponent(cursor)}`;
+        }
+        
+        const response = await authorizedFetch(url);
+        
+        if (!response.ok) {
+            const errorData = await response.json().catch(() => ({}));
+            throw new Error(errorData.detail || `HTTP error! status: ${response.status}`);
+        }
+        
+        items.push(...await response.json());
+        cursor = response.headers.get('X-Next-Cursor');
+    } while (cursor);
+    
+    return items;
+}
+
 // Get query parameters
 function getQueryParams() {
     const params = new URLSearchParams(window.location.search);